@@ -0,0 +1,466 @@
+"""
+Module for keeping past runs in an archive with a (source, run time, valid time) index.
+
+Every converted run is moved into its own directory under ``archive/``, keeping only its
+compressed Zarr stores; the GRIB files it was decoded from are not needed any more. A JSON
+index lists the valid times of every run and source, so questions like "which runs forecast
+this valid time" are answered without opening any store.
+
+Run directories are versioned (``<YYYYMMDDHH>.v<N>``) and never written once they are in
+place. A new version of a run is completed next to the current one and committed by
+replacing the index, which is the only pointer readers follow. The previous version is kept
+until the one after it arrives, so a reader that opened it before the swap can finish
+undisturbed, and no version is deleted while a ``RunStores`` handle of this process still
+refers to it. Whatever a crash leaves half-written is not in the index and is removed on the
+next start. Runs are evicted by age and then least recently used first once the archive
+grows past its disk budget, except for the newest ones, which the pipeline may be showing.
+Stages running in other processes open the archive read-only and refresh the index to pick
+up new runs; only the converting process writes it.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+from regions import GLOBAL_SOURCE, REGIONAL_SOURCE
+
+# Constants
+ARCHIVE_DIR = "archive"
+INDEX_FILENAME = "index.json"
+INDEX_FORMAT = 1
+ARCHIVE_BUDGET_BYTES = 20 * 1024**3
+RETAINED_RUNS = 2  # Never evicted: the run being shown plus the one replacing it
+TMP_SUFFIX = ".tmp"
+VERSION_SEPARATOR = ".v"
+RUN_LABEL_FORMAT = "%Y%m%d%H"
+ACCESS_SAVE_SECONDS = 60.0  # Least time between index writes that only record access
+
+
+@dataclass(frozen=True)
+class RunStores:
+    """
+    Stores of one converted run, as passed between pipeline stages.
+
+    A handle, not a plain record: the archive keeps the run version's
+    directory while any handle to it is alive.
+    """
+
+    label: str
+    global_store: str
+    scandinavia_store: str
+
+
+class ArchivedField(NamedTuple):
+    """One forecast step of an archived run, as found in the index."""
+
+    source: str
+    run_time: datetime
+    valid_time: datetime
+    label: str
+    store: str
+    step: int  # Index along the store's step dimension
+
+
+def _timestamp(value: Any) -> datetime:
+    """Turn a datetime64 value or ISO string into a naive UTC datetime."""
+    return datetime.fromisoformat(str(np.datetime_as_string(np.datetime64(value, "s"))))
+
+
+def _run_dirs(label: str, run: Dict[str, Any]) -> List[str]:
+    """Return the directory names of a run's current and previous version."""
+    return [run.get("dir", label)] + ([run["previous"]] if run.get("previous") else [])
+
+
+def _dir_bytes(path: str) -> int:
+    """Return the total size of the files below a directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class RunArchive:
+    """
+    Directory of converted runs with a (source, run time, valid time) index.
+
+    Runs are identified by their label, the run time as YYYYMMDDHH. All
+    methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        root: str = ARCHIVE_DIR,
+        budget_bytes: int = ARCHIVE_BUDGET_BYTES,
+        max_age: Optional[timedelta] = None,
+        read_only: bool = False,
+    ) -> None:
+        """
+        Args:
+            root: Directory of the archive.
+            budget_bytes: Disk space the archived runs may use together.
+            max_age: Runs whose run time is older than this are evicted
+                regardless of the budget.
+            read_only: Only read the archive, e.g. in a render process while
+                another process converts runs into it. Nothing is cleaned
+                up, written or evicted; see ``refresh``.
+        """
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._index_mtime: Optional[int] = None
+        self._saved_at = 0.0
+        # Live RunStores handles per version directory, and the directories
+        # to remove once no handle refers to them
+        self._handles: Dict[str, int] = {}
+        self._released: Deque[str] = deque()
+        self._doomed: Set[str] = set()
+        self._fields: Dict[Tuple[str, datetime, datetime], ArchivedField] = {}
+        self._by_valid_time: Dict[datetime, List[ArchivedField]] = {}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # -------------------------------
+    # Index
+    # -------------------------------
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        """Return the run records of the index whose directories exist."""
+        try:
+            self._index_mtime = os.stat(self._index_path()).st_mtime_ns
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if index.get("format") != INDEX_FORMAT:
+            return {}
+        return {
+            label: run
+            for label, run in index["runs"].items()
+            if os.path.isdir(os.path.join(self.root, run.get("dir", label)))
+        }
+
+    def _load(self) -> None:
+        """Read the index and remove what an interrupted write left behind."""
+        self._runs = self._read_index()
+        if self.read_only:
+            self._rebuild()
+            return
+        indexed = {
+            name for label, run in self._runs.items() for name in _run_dirs(label, run)
+        }
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path) and name not in indexed:
+                shutil.rmtree(path, ignore_errors=True)
+                logging.info(f"Removed unindexed archive entry {name}")
+        self._rebuild()
+
+    def _save(self) -> None:
+        """Write the index atomically."""
+        path = self._index_path()
+        tmp_path = f"{path}{TMP_SUFFIX}"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": INDEX_FORMAT, "runs": self._runs}, f, indent=1)
+        os.replace(tmp_path, path)
+        self._index_mtime = os.stat(path).st_mtime_ns
+        self._saved_at = time.time()
+
+    def refresh(self) -> bool:
+        """
+        Re-read the index if another process has replaced it since.
+
+        Returns:
+            bool: Whether the index changed.
+        """
+        try:
+            mtime = os.stat(self._index_path()).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._index_mtime:
+            return False
+        with self._lock:
+            self._runs = self._read_index()
+            self._rebuild()
+        return True
+
+    def _rebuild(self) -> None:
+        """Rebuild the lookup tables from the run records."""
+        fields_by_key: Dict[Tuple[str, datetime, datetime], ArchivedField] = {}
+        by_valid_time: Dict[datetime, List[ArchivedField]] = {}
+        for label, run in self._runs.items():
+            run_time = _timestamp(run["run_time"])
+            for source, entry in run["sources"].items():
+                store = os.path.join(self.root, entry["store"])
+                for step, value in enumerate(entry["valid_times"]):
+                    valid_time = _timestamp(value)
+                    field = ArchivedField(
+                        source, run_time, valid_time, label, store, step
+                    )
+                    fields_by_key[(source, run_time, valid_time)] = field
+                    by_valid_time.setdefault(valid_time, []).append(field)
+        for fields in by_valid_time.values():
+            fields.sort(key=lambda field: (field.source, field.run_time), reverse=True)
+        # Swapped in whole, so lookups without the lock see either version
+        self._fields = fields_by_key
+        self._by_valid_time = by_valid_time
+
+    # -------------------------------
+    # Adding and opening runs
+    # -------------------------------
+
+    def add(self, label: str, global_store: str, scandinavia_store: str) -> RunStores:
+        """
+        Move a run's stores into the archive and index them.
+
+        A run that is already archived under the same label gets a new
+        version; the index is switched to it in one atomic write, and its
+        previous version stays on disk until the next one arrives. Nothing is
+        evicted here; see ``evict``.
+
+        Args:
+            label: Run label (YYYYMMDDHH).
+            global_store: Path of the run's global store.
+            scandinavia_store: Path of the run's Scandinavian store.
+
+        Returns:
+            RunStores: The run's stores at their archived paths.
+        """
+        # Only the converting process adds runs; the decoding modules are
+        # not loaded by the others
+        from converting import open_store
+
+        if self.read_only:
+            raise RuntimeError(f"Archive {self.root} is open read-only")
+        with self._lock:
+            previous = self._runs.get(label)
+            version = previous.get("version", 0) + 1 if previous else 1
+        name = f"{label}{VERSION_SEPARATOR}{version}"
+        run_dir = os.path.join(self.root, name)
+        tmp_dir = f"{run_dir}{TMP_SUFFIX}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        sources = {}
+        for source, store in (
+            (GLOBAL_SOURCE, global_store),
+            (REGIONAL_SOURCE, scandinavia_store),
+        ):
+            with open_store(store) as ds:
+                valid_times = [
+                    str(np.datetime_as_string(value, unit="s"))
+                    for value in ds["valid_time"].values
+                ]
+            store_name = os.path.basename(store)
+            shutil.move(store, os.path.join(tmp_dir, store_name))
+            sources[source] = {
+                "store": os.path.join(name, store_name),
+                "valid_times": valid_times,
+            }
+        os.replace(tmp_dir, run_dir)
+
+        with self._lock:
+            previous = self._runs.get(label)
+            kept = [previous.get("dir", label)] if previous else []
+            n_bytes = sum(_dir_bytes(os.path.join(self.root, d)) for d in [name] + kept)
+            self._runs[label] = {
+                "run_time": datetime.strptime(label, RUN_LABEL_FORMAT).isoformat(),
+                "version": version,
+                "dir": name,
+                "previous": kept[0] if kept else None,
+                "bytes": n_bytes,
+                "last_access": time.time(),
+                "sources": sources,
+            }
+            # The swap: readers opening the run from now on get the new version
+            self._save()
+            self._rebuild()
+            stores = self._stores(label)
+            # Double buffering: only the version before the previous one is removed
+            if previous and previous.get("previous"):
+                self._doomed.add(previous["previous"])
+            unused = self._collect()
+        self._remove_dirs(unused)
+        logging.info(f"Archived run {label} version {version} ({n_bytes / 1e6:.0f} MB)")
+        return stores
+
+    def _stores(self, label: str) -> RunStores:
+        """Return a new handle to a run's current version; call with the lock held."""
+        run = self._runs[label]
+        sources = run["sources"]
+        stores = RunStores(
+            label,
+            os.path.join(self.root, sources[GLOBAL_SOURCE]["store"]),
+            os.path.join(self.root, sources[REGIONAL_SOURCE]["store"]),
+        )
+        name = run.get("dir", label)
+        self._handles[name] = self._handles.get(name, 0) + 1
+        # Runs whenever the handle is collected, possibly while the lock is
+        # held, so it only queues the release
+        weakref.finalize(stores, self._released.append, name)
+        return stores
+
+    def _collect(self) -> List[str]:
+        """
+        Count released handles and return the doomed directories no handle
+        refers to any more, forgetting them; call with the lock held.
+        """
+        while self._released:
+            name = self._released.popleft()
+            self._handles[name] -= 1
+            if not self._handles[name]:
+                del self._handles[name]
+        unused = [name for name in self._doomed if name not in self._handles]
+        self._doomed.difference_update(unused)
+        return unused
+
+    def _remove_dirs(self, names: List[str]) -> None:
+        """Delete run version directories."""
+        for name in names:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def is_current(self, run: RunStores) -> bool:
+        """Return whether a handle refers to its run's current version."""
+        current = self._runs.get(run.label)
+        return current is not None and os.path.join(
+            self.root, current["sources"][GLOBAL_SOURCE]["store"]
+        ) == run.global_store
+
+    def get(self, label: str) -> RunStores:
+        """
+        Return the stores of an archived run and mark it as recently used.
+
+        The access time is written to the index at most every
+        ``ACCESS_SAVE_SECONDS``, and with the next change of the index.
+
+        Args:
+            label: Run label (YYYYMMDDHH).
+
+        Raises:
+            KeyError: If the run is not archived.
+        """
+        with self._lock:
+            if label not in self._runs:
+                raise KeyError(f"Run {label} is not archived; have {self.labels()}")
+            now = time.time()
+            self._runs[label]["last_access"] = now
+            if not self.read_only and now - self._saved_at >= ACCESS_SAVE_SECONDS:
+                self._save()
+            return self._stores(label)
+
+    def latest(self) -> Optional[RunStores]:
+        """Return the stores of the newest archived run, or None."""
+        labels = self.labels()
+        return self.get(labels[0]) if labels else None
+
+    def labels(self) -> List[str]:
+        """Return the labels of all archived runs, newest first."""
+        return sorted(self._runs, reverse=True)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._runs
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+
+    def lookup(
+        self, source: str, run_time: datetime, valid_time: datetime
+    ) -> Optional[ArchivedField]:
+        """
+        Return the archived step of a source's run for a valid time, or None.
+
+        Args:
+            source: ``"ECMWF"`` or ``"FMI"``.
+            run_time: Model run time (naive UTC).
+            valid_time: Valid time (naive UTC).
+        """
+        return self._fields.get((source, run_time, valid_time))
+
+    def runs_for_valid_time(
+        self, valid_time: datetime, source: Optional[str] = None
+    ) -> List[ArchivedField]:
+        """
+        Return every archived run that forecasts a valid time.
+
+        Answered from the index alone, without opening any store.
+
+        Args:
+            valid_time: Valid time (naive UTC).
+            source: Only return runs of this source.
+
+        Returns:
+            List[ArchivedField]: Matching steps, newest run first.
+        """
+        fields = self._by_valid_time.get(valid_time, [])
+        return [field for field in fields if source in (None, field.source)]
+
+    # -------------------------------
+    # Eviction
+    # -------------------------------
+
+    def total_bytes(self) -> int:
+        """Return the disk space used by the archived runs."""
+        return sum(run["bytes"] for run in self._runs.values())
+
+    def evict(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Remove runs that are too old, then least recently used runs until
+        the archive fits its budget.
+
+        The ``RETAINED_RUNS`` newest runs are always kept, and a read-only
+        archive evicts nothing. The directories of an evicted run are
+        removed once no handle refers to them; a later ``add`` or ``evict``
+        removes those whose handles are released in between.
+
+        Args:
+            now: Current time (naive UTC); defaults to the system clock.
+
+        Returns:
+            List[str]: Labels of the removed runs.
+        """
+        if self.read_only:
+            return []
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        removed = []
+        with self._lock:
+            unused = self._collect()
+            candidates = sorted(self._runs, reverse=True)[RETAINED_RUNS:]
+            if self.max_age is not None:
+                for label in list(candidates):
+                    if now - _timestamp(self._runs[label]["run_time"]) > self.max_age:
+                        candidates.remove(label)
+                        removed.append(label)
+            used = self.total_bytes()
+            used -= sum(self._runs[label]["bytes"] for label in removed)
+            # Least recently used first
+            candidates.sort(key=lambda label: self._runs[label]["last_access"])
+            for label in candidates:
+                if used <= self.budget_bytes:
+                    break
+                used -= self._runs[label]["bytes"]
+                removed.append(label)
+            if removed:
+                removed_runs = [(label, self._runs.pop(label)) for label in removed]
+                # Unindex first, so a crash cannot leave an index entry without data
+                self._save()
+                self._rebuild()
+                for label, run in removed_runs:
+                    self._doomed.update(_run_dirs(label, run))
+                    logging.info(f"Evicted run {label} from the archive")
+                unused += self._collect()
+        self._remove_dirs(unused)
+        return removed
@@ -0,0 +1,114 @@
+"""
+Module for caching the static map decoration (coastlines and borders).
+
+Cartopy reads, clips and projects the Natural Earth geometries again for every new axes. Here
+they are clipped to the panel's extent, projected and simplified to its pixel size once, and
+kept as matplotlib paths keyed by (projection, extent, panel size). Later panels with the same
+key only wrap the cached paths in a new collection.
+"""
+
+from typing import Any, Dict, List, Tuple
+import cartopy.feature as cfeature
+import shapely.geometry as sgeom
+from cartopy.mpl.path import shapely_to_path
+from matplotlib.collections import PathCollection
+from caching import LRUCache
+from metrics import register_cache
+
+# Constants
+BASEMAP_CACHE_BYTES = 64 * 1024 * 1024
+BASEMAP_FEATURES = [cfeature.COASTLINE, cfeature.BORDERS]
+BASEMAP_ZORDER = 1.5  # Same as cartopy's feature artists
+EXTENT_MARGIN = 0.02  # Fraction of the extent added on each side before clipping
+SIMPLIFY_PIXELS = 0.5  # Vertices closer than this on screen are merged
+
+_basemaps = LRUCache(BASEMAP_CACHE_BYTES)
+register_cache("basemap", _basemaps)
+
+
+def basemap_key(ax: Any) -> Tuple:
+    """
+    Return the cache key of an axes' basemap: projection, extent and size.
+
+    Args:
+        ax: Cartopy GeoAxes; its aspect ratio is applied before measuring.
+    """
+    ax.apply_aspect()
+    return (
+        ax.projection.proj4_init,
+        tuple(round(value, 4) for value in ax.get_extent()),
+        (int(ax.bbox.width), int(ax.bbox.height)),
+    )
+
+
+def _feature_paths(ax: Any, feature: cfeature.Feature) -> List[Any]:
+    """Clip, project and simplify one feature's geometries into paths."""
+    projection = ax.projection
+    x0, x1, y0, y1 = ax.get_extent()
+    dx, dy = (x1 - x0) * EXTENT_MARGIN, (y1 - y0) * EXTENT_MARGIN
+    clip_box = sgeom.box(x0 - dx, y0 - dy, x1 + dx, y1 + dy)
+    tolerance = SIMPLIFY_PIXELS * min(
+        (x1 - x0) / max(ax.bbox.width, 1), (y1 - y0) / max(ax.bbox.height, 1)
+    )
+
+    paths = []
+    for geom in feature.intersecting_geometries(ax.get_extent(feature.crs)):
+        if projection != feature.crs:
+            geom = projection.project_geometry(geom, feature.crs)
+        geom = geom.intersection(clip_box)
+        if geom.is_empty:
+            continue
+        geom = geom.simplify(tolerance, preserve_topology=False)
+        if not geom.is_empty:
+            paths.append(shapely_to_path(geom))
+    return paths
+
+
+def basemap_paths(ax: Any) -> Tuple[Tuple, List[Tuple[Dict[str, Any], List[Any]]]]:
+    """
+    Return the cached decoration paths for an axes, building them on a miss.
+
+    Args:
+        ax: Cartopy GeoAxes with its final extent.
+
+    Returns:
+        Tuple: The cache key, and the style and projected paths of every
+            feature in ``BASEMAP_FEATURES``.
+    """
+    key = basemap_key(ax)
+    layers = _basemaps.get(key)
+    if layers is None:
+        layers = [
+            (feature.kwargs, _feature_paths(ax, feature))
+            for feature in BASEMAP_FEATURES
+        ]
+        nbytes = sum(path.vertices.nbytes for _, paths in layers for path in paths)
+        _basemaps.put(key, layers, nbytes)
+    return key, layers
+
+
+def add_basemap(ax: Any) -> Tuple[Tuple, List[Any]]:
+    """
+    Draw the coastlines and borders on an axes from the basemap cache.
+
+    Args:
+        ax: Cartopy GeoAxes with its final extent.
+
+    Returns:
+        Tuple: The cache key the artists were built for, and one collection
+            per feature, already added to the axes.
+    """
+    key, layers = basemap_paths(ax)
+    artists = []
+    for style, paths in layers:
+        collection = PathCollection(
+            paths,
+            facecolor="none",
+            edgecolor=style.get("edgecolor", "black"),
+            transform=ax.transData,
+            zorder=BASEMAP_ZORDER,
+        )
+        collection.set_clip_path(ax.patch)
+        ax.add_collection(collection, autolim=False)
+        artists.append(collection)
+    return key, artists
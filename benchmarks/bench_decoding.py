@@ -0,0 +1,48 @@
+"""
+Benchmarks for decoding the GRIB downloads.
+"""
+
+import glob
+import shutil
+from typing import Dict
+import xarray as xr
+from grib_index import INDEX_DIR_SUFFIX
+from scandinavia_split import split_datasets
+
+# Constants
+ROUNDS = 5
+
+
+def _remove_indexes(filename: str) -> None:
+    """Delete the message index and subsets cached next to a GRIB file."""
+    for path in glob.glob(f"{glob.escape(filename)}.*{INDEX_DIR_SUFFIX}"):
+        shutil.rmtree(path)
+
+
+def test_split_datasets_cold(benchmark, grib_files: Dict[str, str]) -> None:
+    """First split of a new download: scan, extract subsets and decode."""
+    filename = grib_files["FMI"]
+    benchmark.pedantic(
+        split_datasets,
+        args=(filename,),
+        setup=lambda: _remove_indexes(filename),
+        rounds=ROUNDS,
+    )
+
+
+def test_split_datasets_warm(benchmark, grib_files: Dict[str, str]) -> None:
+    """Split of a file whose index and subsets are already on disk."""
+    filename = grib_files["FMI"]
+    split_datasets(filename)
+    benchmark.pedantic(split_datasets, args=(filename,), rounds=ROUNDS)
+
+
+def test_merge_split_datasets(benchmark, grib_files: Dict[str, str]) -> None:
+    """Merge of the split parameters into one dataset, as in ``convert_run``."""
+    parts = split_datasets(grib_files["FMI"])
+    merged = benchmark.pedantic(
+        xr.merge, args=(parts,), kwargs={"compat": "override"}, rounds=ROUNDS
+    )
+    assert {"rain_con", "u10", "v10", "tcc", "t2m", "i10fg", "msl"} <= set(
+        merged.data_vars
+    )
@@ -0,0 +1,49 @@
+"""
+Benchmarks for downloading a run from the local forecast server.
+"""
+
+import filecmp
+import glob
+import os
+from typing import Dict
+import ingesting
+
+# Constants
+ROUNDS = 3
+
+
+def _remove_downloads(targets: Dict[str, str]) -> None:
+    """Delete the targets with their metadata, so the next download is a new one."""
+    for target in targets.values():
+        for path in glob.glob(f"{glob.escape(target)}*"):
+            os.remove(path)
+
+
+def _download(targets: Dict[str, str]) -> tuple:
+    return ingesting.download_latest_run(targets["global"], targets["scandinavia"])
+
+
+def test_download_new_run(
+    benchmark, local_sources: str, download_targets: Dict[str, str], grib_files
+) -> None:
+    """Probe both sources and download a run that is not on disk yet."""
+    date_str, _, new_data, _ = benchmark.pedantic(
+        _download,
+        args=(download_targets,),
+        setup=lambda: _remove_downloads(download_targets),
+        rounds=ROUNDS,
+    )
+    assert date_str is not None and new_data
+    assert filecmp.cmp(download_targets["scandinavia"], grib_files["FMI"], False)
+    assert filecmp.cmp(download_targets["global"], grib_files["ECMWF"], False)
+
+
+def test_download_unchanged_run(
+    benchmark, local_sources: str, download_targets: Dict[str, str]
+) -> None:
+    """Probe both sources and re-request a run that is already on disk."""
+    _download(download_targets)
+    _, _, new_data, _ = benchmark.pedantic(
+        _download, args=(download_targets,), rounds=ROUNDS
+    )
+    assert not new_data
@@ -0,0 +1,56 @@
+"""
+Benchmarks for packing cached steps into 16 bits.
+
+Every packable variable of a region's store is packed and unpacked one step at a time, as the
+step cache does on a miss and on every hit, and checked against the variable's precision.
+"""
+
+from typing import Dict
+import numpy as np
+import pytest
+import xarray as xr
+from packing import pack
+from parameters import variable_packing
+
+# Constants
+ROUNDS = 20
+STEP = 4
+
+
+def _step_fields(ds: xr.Dataset) -> Dict[str, np.ndarray]:
+    """Return one step of every packable variable of a dataset."""
+    return {
+        name: ds[name].isel(step=STEP).values
+        for name in variable_packing()
+        if name in ds and "step" in ds[name].dims
+    }
+
+
+@pytest.mark.parametrize("region", ["Global", "Scandinavia"])
+def test_pack_step(benchmark, datasets: Dict[str, xr.Dataset], region: str) -> None:
+    """Packing of one step of every packable variable."""
+    fields = _step_fields(datasets[region])
+    packings = variable_packing()
+    packed = benchmark.pedantic(
+        lambda: {name: pack(values, *packings[name]) for name, values in fields.items()},
+        rounds=ROUNDS,
+    )
+    for name, values in fields.items():
+        assert packed[name] is not None
+        assert packed[name].nbytes * 2 == values.nbytes
+        error = np.nanmax(np.abs(packed[name].unpack() - values))
+        assert error <= packings[name][1]
+
+
+@pytest.mark.parametrize("region", ["Global", "Scandinavia"])
+def test_unpack_step(benchmark, datasets: Dict[str, xr.Dataset], region: str) -> None:
+    """Unpacking of one step of every packable variable, as on a cache hit."""
+    packings = variable_packing()
+    packed = [
+        pack(values, *packings[name])
+        for name, values in _step_fields(datasets[region]).items()
+    ]
+    unpacked = benchmark.pedantic(
+        lambda: [field.unpack() for field in packed], rounds=ROUNDS
+    )
+    assert all(not values.flags.writeable for values in unpacked)
@@ -0,0 +1,96 @@
+"""
+Benchmarks for drawing the map panels.
+
+A cold redraw builds a new figure and panel with the basemap and arrow grid caches emptied;
+a warm redraw loads the next step into an existing panel, as the time slider does. Besides
+the default regions, a Nordic crop of the global field shows what a cropped region costs.
+"""
+
+import itertools
+from typing import Any, Dict, Iterator
+import pytest
+import xarray as xr
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import basemap
+import plotting
+from parameters import parameter_names, parameter_variables
+from plotting import create_panel, region_view, update_panel
+from regions import DEFAULT_REGIONS, GLOBAL_SOURCE, Region, regions, set_regions
+from rendering import RENDER_DPI, panel_figsize
+
+# Constants
+COLD_ROUNDS = 3
+WARM_ROUNDS = 10
+BENCH_REGIONS = DEFAULT_REGIONS + [Region("Nordic", GLOBAL_SOURCE, (4, 32, 54, 72))]
+
+# Every parameter in every region whose source has it
+COMBINATIONS = pytest.mark.parametrize(
+    "parameter, region",
+    [
+        (parameter, region.name)
+        for parameter, region in itertools.product(parameter_names(), BENCH_REGIONS)
+        if parameter_variables(parameter, region.source) is not None
+    ],
+)
+
+
+@pytest.fixture(autouse=True)
+def bench_regions() -> Iterator[None]:
+    """Register the benchmarked regions, restoring the previous ones afterwards."""
+    previous = regions()
+    set_regions(BENCH_REGIONS)
+    yield
+    set_regions(previous)
+
+
+def _draw_panel(
+    parameter: str, region: str, datasets: Dict[str, xr.Dataset]
+) -> Dict[str, Any]:
+    """Build a single-panel figure like the headless renderer and draw it."""
+    ds, extent, levels = region_view(
+        region, datasets["Global"], datasets["Scandinavia"]
+    )
+    fig = Figure(figsize=panel_figsize(region), dpi=RENDER_DPI)
+    FigureCanvasAgg(fig)
+    gs = fig.add_gridspec(1, 1, left=0.05, right=0.9, top=0.88, bottom=0.05)
+    panel = create_panel(
+        fig, gs[0, 0], parameter, region, ds, 0, [], extent=extent, levels=levels
+    )
+    fig.canvas.draw()
+    return panel
+
+
+def _clear_caches() -> None:
+    basemap._basemaps.clear()
+    plotting._quiver_grids.clear()
+
+
+@COMBINATIONS
+def test_plot_cold(
+    benchmark, datasets: Dict[str, xr.Dataset], parameter: str, region: str
+) -> None:
+    """New panel with empty caches."""
+    benchmark.pedantic(
+        _draw_panel,
+        args=(parameter, region, datasets),
+        setup=_clear_caches,
+        rounds=COLD_ROUNDS,
+        warmup_rounds=1,
+    )
+
+
+@COMBINATIONS
+def test_plot_warm(
+    benchmark, datasets: Dict[str, xr.Dataset], parameter: str, region: str
+) -> None:
+    """Step change on an existing panel."""
+    panel = _draw_panel(parameter, region, datasets)
+    canvas = panel["ax"].figure.canvas
+    steps = itertools.cycle(range(1, panel["ds"].sizes["step"]))
+
+    def redraw() -> None:
+        update_panel(panel, next(steps))
+        canvas.draw()
+
+    benchmark.pedantic(redraw, rounds=WARM_ROUNDS, warmup_rounds=1)
@@ -0,0 +1,33 @@
+"""
+Benchmarks for point-forecast queries.
+
+Every variable and step is read at many random sites of a region's grid, by nearest
+neighbour and by bilinear interpolation, with the grid index and the steps already cached.
+"""
+
+from typing import Dict
+import numpy as np
+import pytest
+import xarray as xr
+from points import METHODS, query_points
+
+# Constants
+ROUNDS = 10
+N_POINTS = 10_000
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("region", ["Global", "Scandinavia"])
+def test_query_points(
+    benchmark, datasets: Dict[str, xr.Dataset], region: str, method: str
+) -> None:
+    """Query of every variable and step at random sites on the region's grid."""
+    ds = datasets[region]
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(ds["latitude"].min(), ds["latitude"].max(), N_POINTS)
+    longitudes = rng.uniform(ds["longitude"].min(), ds["longitude"].max(), N_POINTS)
+    query_points(ds, latitudes, longitudes, method)
+    result = benchmark.pedantic(
+        query_points, args=(ds, latitudes, longitudes, method), rounds=ROUNDS
+    )
+    assert result.sizes == {"step": ds.sizes["step"], "point": N_POINTS}
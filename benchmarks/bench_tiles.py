@@ -0,0 +1,36 @@
+"""
+Benchmarks for rendering map tiles.
+
+Tiles are rendered in the benchmark process, as a tile server worker would, with the stores
+already open: a whole-world tile drawn from a pyramid level and a tile over Scandinavia that
+combines the FMI and ECMWF fields.
+"""
+
+from typing import Any, Dict
+import pytest
+import xarray as xr
+from archive import RunStores
+from tiles import _render_tile, layers
+
+# Constants
+ROUNDS = 10
+# (z, x, y) of the benchmarked tiles
+TILES = {"world": (0, 0, 0), "scandinavia": (4, 9, 4)}
+
+
+@pytest.mark.parametrize("layer", layers())
+@pytest.mark.parametrize("tile", list(TILES))
+def test_render_tile(
+    benchmark, datasets: Dict[str, xr.Dataset], tmp_path: Any, layer: str, tile: str
+) -> None:
+    """Render of one tile from stores opened by an earlier tile."""
+    run = RunStores(
+        "bench",
+        datasets["Global"].encoding["source"],
+        datasets["Scandinavia"].encoding["source"],
+    )
+    valid_time = datasets["Global"]["valid_time"].values[1]
+    args = (run, layer, valid_time, *TILES[tile], str(tmp_path / "tile.png"))
+    _render_tile(*args)
+    data = benchmark.pedantic(_render_tile, args=args, rounds=ROUNDS)
+    assert data.startswith(b"\x89PNG")
@@ -0,0 +1,288 @@
+"""
+Fixtures for the benchmark suite.
+
+Synthetic GRIB files shaped like the FMI HARMONIE and ECMWF AIFS downloads are written once
+per session. Downloads are benchmarked against a local HTTP server that stands in for both
+FMI and the ECMWF open data site, and a client that fetches from it instead of ECMWF.
+"""
+
+import hashlib
+import http.server
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import eccodes
+import numpy as np
+import pytest
+import xarray as xr
+from ecmwf.opendata import Client
+import ingesting
+from converting import convert_run, open_store
+
+# Constants
+STEPS = list(range(0, 49, 6))
+RUN_DATE = 20260101
+# (west, east, south, north, increment in degrees) of each source's grid
+FMI_GRID = (5.0, 31.0, 54.0, 72.0, 0.05)
+ECMWF_GRID = (-180.0, 179.75, -90.0, 90.0, 0.25)
+# (shortName, typeOfLevel, level) of every message per step
+FMI_MESSAGES = [
+    ("rain_con", "surface", None),
+    ("10u", "heightAboveGround", 10),
+    ("10v", "heightAboveGround", 10),
+    ("tcc", "entireAtmosphere", None),
+    ("2t", "heightAboveGround", 2),
+    ("i10fg", "heightAboveGround", 10),
+    ("msl", "meanSea", None),
+]
+ECMWF_MESSAGES = [
+    ("tp", "surface", None),
+    ("10u", "heightAboveGround", 10),
+    ("10v", "heightAboveGround", 10),
+    ("tcc", "entireAtmosphere", None),
+    ("2t", "heightAboveGround", 2),
+    ("msl", "meanSea", None),
+]
+ACCUMULATED = {"tp", "rain_con"}
+SERVER_CHUNK_SIZE = 1024 * 1024
+# Step in the ECMWF open data file names, e.g. 20260101000000-48h-oper-fc.grib2
+ECMWF_STEP_PATTERN = re.compile(r"-(\d+)h-")
+
+
+def _synthetic_field(short_name: str, shape: Tuple[int, int], rng: Any) -> np.ndarray:
+    """Return one step of random values in the parameter's usual range."""
+    if short_name in ACCUMULATED:
+        return rng.gamma(0.3, 0.002, shape)
+    if short_name == "tcc":
+        return rng.uniform(0, 100, shape)
+    if short_name == "2t":
+        return rng.normal(280, 10, shape)
+    if short_name == "msl":
+        return rng.normal(101300, 1000, shape)
+    if short_name == "i10fg":
+        return rng.gamma(2, 5, shape)
+    return rng.normal(0, 6, shape)
+
+
+def write_synthetic_grib(
+    path: str,
+    messages: List[Tuple[str, str, Optional[int]]],
+    grid: Tuple[float, float, float, float, float],
+    steps: List[int] = STEPS,
+) -> str:
+    """
+    Write a GRIB2 file with random fields on a regular latitude/longitude grid.
+
+    Accumulated parameters grow monotonically over the steps, like the
+    real downloads.
+
+    Args:
+        path (str): Target file.
+        messages (List[Tuple[str, str, Optional[int]]]): shortName,
+            typeOfLevel and level of every message per step.
+        grid (Tuple[float, float, float, float, float]): West, east, south
+            and north bounds and the grid increment in degrees.
+        steps (List[int]): Forecast steps in hours.
+
+    Returns:
+        str: ``path``.
+    """
+    west, east, south, north, increment = grid
+    ni = int(round((east - west) / increment)) + 1
+    nj = int(round((north - south) / increment)) + 1
+    grid_keys = {
+        "dataDate": RUN_DATE,
+        "dataTime": 0,
+        "Ni": ni,
+        "Nj": nj,
+        "latitudeOfFirstGridPointInDegrees": north,
+        "latitudeOfLastGridPointInDegrees": south,
+        "longitudeOfFirstGridPointInDegrees": west,
+        "longitudeOfLastGridPointInDegrees": east,
+        "iDirectionIncrementInDegrees": increment,
+        "jDirectionIncrementInDegrees": increment,
+    }
+    rng = np.random.default_rng(0)
+    totals: Dict[str, np.ndarray] = {}
+
+    with open(path, "wb") as f:
+        for step in steps:
+            for short_name, type_of_level, level in messages:
+                values = _synthetic_field(short_name, (nj, ni), rng)
+                keys = {**grid_keys, "typeOfLevel": type_of_level}
+                if level is not None:
+                    keys["level"] = level
+                keys["shortName"] = short_name
+                if short_name in ACCUMULATED:
+                    values = totals[short_name] = totals.get(short_name, 0) + values
+                    keys.update(stepType="accum", startStep=0, endStep=step)
+                else:
+                    keys["step"] = step
+
+                handle = eccodes.codes_grib_new_from_samples("regular_ll_sfc_grib2")
+                try:
+                    # Set one by one: later keys depend on the earlier ones
+                    for key, value in keys.items():
+                        eccodes.codes_set(handle, key, value)
+                    eccodes.codes_set_values(handle, values.ravel())
+                    eccodes.codes_write(handle, f)
+                finally:
+                    eccodes.codes_release(handle)
+    return path
+
+
+@pytest.fixture(scope="session")
+def grib_files(tmp_path_factory: pytest.TempPathFactory) -> Dict[str, str]:
+    """Synthetic FMI and ECMWF GRIB files, written once per session."""
+    directory = tmp_path_factory.mktemp("grib")
+    return {
+        "FMI": write_synthetic_grib(
+            str(directory / "forecast_scandinavia.grib"), FMI_MESSAGES, FMI_GRID
+        ),
+        "ECMWF": write_synthetic_grib(
+            str(directory / "forecast_global.grib"), ECMWF_MESSAGES, ECMWF_GRID
+        ),
+    }
+
+
+@pytest.fixture(scope="session")
+def datasets(
+    grib_files: Dict[str, str], tmp_path_factory: pytest.TempPathFactory
+) -> Iterator[Dict[str, xr.Dataset]]:
+    """Stores converted from the synthetic files, opened like the viewer does."""
+    directory = tmp_path_factory.mktemp("run")
+    copies = [
+        shutil.copy(grib_files[source], directory)
+        for source in ("ECMWF", "FMI")
+    ]
+    global_store, scandinavia_store = convert_run(*copies)
+    with open_store(global_store) as global_dataset, open_store(
+        scandinavia_store
+    ) as scandinavian_dataset:
+        yield {"Global": global_dataset, "Scandinavia": scandinavian_dataset}
+
+
+def _messages_by_step(path: str) -> Dict[str, bytes]:
+    """Return the encoded messages of a GRIB file grouped by step, as one file each."""
+    steps: Dict[str, bytes] = {}
+    with open(path, "rb") as f:
+        while True:
+            handle = eccodes.codes_grib_new_from_file(f)
+            if handle is None:
+                break
+            try:
+                step = str(eccodes.codes_get(handle, "endStep"))
+                steps[step] = steps.get(step, b"") + eccodes.codes_get_message(handle)
+            finally:
+                eccodes.codes_release(handle)
+    return steps
+
+
+def _forecast_handler(files: Dict[str, bytes]) -> type:
+    """
+    Build a request handler serving the FMI file under ``/download`` and the
+    ECMWF step files under the open data file names, with ETags like the
+    real servers.
+    """
+    etags = {
+        name: f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        for name, data in files.items()
+    }
+
+    class ForecastHandler(http.server.BaseHTTPRequestHandler):
+        def _respond(self, send_body: bool) -> None:
+            if self.path.startswith("/download"):
+                name = "FMI"
+            else:
+                match = ECMWF_STEP_PATTERN.search(self.path)
+                name = match.group(1) if match else ""
+            if name not in files:
+                self.send_error(404)
+                return
+            data, etag = files[name], etags[name]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if send_body:
+                for start in range(0, len(data), SERVER_CHUNK_SIZE):
+                    self.wfile.write(data[start : start + SERVER_CHUNK_SIZE])
+
+        def do_GET(self) -> None:
+            try:
+                self._respond(send_body=True)
+            except (BrokenPipeError, ConnectionResetError):
+                # Probes close the connection after the first bytes
+                pass
+
+        def do_HEAD(self) -> None:
+            self._respond(send_body=False)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    return ForecastHandler
+
+
+class LocalClient(Client):
+    """ECMWF open data client that fetches from the local forecast server."""
+
+    def __init__(self, base_url: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.source.url = base_url
+
+    def retrieve(self, target: str, **params: Any) -> None:
+        urls = self._get_urls(use_index=False, **params).urls
+        with open(target, "wb") as f:
+            for url in urls:
+                with ingesting._get_session().get(url, stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(SERVER_CHUNK_SIZE):
+                        f.write(chunk)
+
+
+@pytest.fixture(scope="session")
+def forecast_server(grib_files: Dict[str, str]) -> Iterator[str]:
+    """Local HTTP server standing in for FMI and ECMWF; yields its base URL."""
+    files = _messages_by_step(grib_files["ECMWF"])
+    with open(grib_files["FMI"], "rb") as f:
+        files["FMI"] = f.read()
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), _forecast_handler(files)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def local_sources(
+    forecast_server: str, monkeypatch: pytest.MonkeyPatch
+) -> str:
+    """Point the ingest functions at the local forecast server."""
+    monkeypatch.setattr(
+        ingesting, "FMI_DOWNLOAD_URL", f"{forecast_server}/download"
+    )
+    monkeypatch.setattr(
+        ingesting,
+        "Client",
+        lambda **kwargs: LocalClient(forecast_server, **kwargs),
+    )
+    return forecast_server
+
+
+@pytest.fixture
+def download_targets(tmp_path: Any) -> Dict[str, str]:
+    """Download targets in a fresh directory."""
+    return {
+        "global": os.path.join(tmp_path, "forecast_global.grib"),
+        "scandinavia": os.path.join(tmp_path, "forecast_scandinavia.grib"),
+    }
@@ -0,0 +1,108 @@
+"""
+Module with the in-memory caches shared by the plotting and loading code.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by a total size in bytes.
+
+    Every entry is stored with the number of bytes it occupies. When a new
+    entry pushes the total over ``max_bytes``, the least recently used
+    entries are evicted until it fits again.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """
+        Args:
+            max_bytes: Memory budget for all entries together.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Return a cached value and mark it as most recently used.
+
+        Args:
+            key: Cache key.
+            default: Value returned when the key is not cached.
+
+        Returns:
+            The cached value, or ``default``.
+        """
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        """
+        Store a value, evicting least recently used entries if needed.
+
+        Values larger than the whole budget are not cached.
+
+        Args:
+            key: Cache key.
+            value: Value to store.
+            nbytes: Size of the value in bytes.
+        """
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._sizes.pop(key)
+                del self._items[key]
+            self._items[key] = value
+            self._sizes[key] = nbytes
+            self.current_bytes += nbytes
+            self._evict()
+
+    def resize(self, max_bytes: int) -> None:
+        """
+        Change the memory budget, evicting least recently used entries if needed.
+
+        Args:
+            max_bytes: New memory budget for all entries together.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.current_bytes > self.max_bytes:
+            old_key, _ = self._items.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(old_key)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
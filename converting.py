@@ -0,0 +1,201 @@
+"""
+Module for converting downloaded GRIB runs into chunked Zarr stores.
+
+Each variable is stored with one chunk per forecast step, so the plotting code can open the
+stores lazily and read a single step's slice from disk instead of decoding GRIB again.
+"""
+
+import logging
+import os
+import shutil
+from typing import List, Optional, Tuple
+import dask
+import xarray as xr
+import zarr
+from zarr.codecs import BloscCodec
+from derived import add_derived_fields
+from digests import file_digest
+from grib_index import open_merged_dataset
+from loading import conversion_batch_steps
+from metrics import timed
+from parameters import source_fields
+from pyramid import PYRAMID_ATTR, PYRAMID_FACTORS, build_pyramid, level_group
+from regions import GLOBAL_SOURCE
+from scandinavia_split import split_datasets
+
+# Constants
+STORE_SUFFIX = ".zarr"
+STEP_CHUNKS = {"step": 1, "latitude": -1, "longitude": -1}
+# Byte-shuffled zstd: smaller than the zarr default for GRIB-packed values, and faster
+# to read because blosc decompresses with several threads
+STORE_COMPRESSORS = [BloscCodec(cname="zstd", clevel=5, shuffle="shuffle")]
+SOURCE_DIGEST_ATTR = "source_sha256"
+# Bumped when the store layout changes, so older stores are converted again
+STORE_FORMAT_ATTR = "store_format"
+STORE_FORMAT = 2
+
+
+def store_path_for(grib_path: str) -> str:
+    """Return the Zarr store path that belongs to a GRIB file."""
+    return os.path.splitext(grib_path)[0] + STORE_SUFFIX
+
+
+def store_is_current(store_path: str, digest: str) -> bool:
+    """
+    Return True if the store was converted from a file with the given hash
+    by the current store format.
+    """
+    if not os.path.exists(store_path):
+        return False
+    try:
+        with open_store(store_path) as ds:
+            return (
+                ds.attrs.get(SOURCE_DIGEST_ATTR) == digest
+                and ds.attrs.get(STORE_FORMAT_ATTR) == STORE_FORMAT
+            )
+    except Exception:
+        return False
+
+
+def _chunked(ds: xr.Dataset) -> xr.Dataset:
+    """
+    Rechunk a dataset to one chunk per step and replace its cfgrib encodings
+    with the store compression.
+    """
+    chunked = ds.chunk({dim: STEP_CHUNKS[dim] for dim in ds.dims if dim in STEP_CHUNKS})
+    for name in chunked.variables:
+        chunked[name].encoding = {}
+    for name in chunked.data_vars:
+        chunked[name].encoding = {"compressors": STORE_COMPRESSORS}
+    return chunked
+
+
+def _write_step_batches(ds: xr.Dataset, store_path: str, batch_steps: int) -> None:
+    """
+    Write a dataset a batch of steps at a time.
+
+    Only the steps of one batch are decoded and held in memory at once,
+    however many steps and variables the run has.
+    """
+    # Metadata and the variables without a step dimension first
+    ds.to_zarr(store_path, mode="w", compute=False, consolidated=True)
+    stepless = [name for name, var in ds.variables.items() if "step" not in var.dims]
+    for start in range(0, ds.sizes["step"], batch_steps):
+        region = {"step": slice(start, min(start + batch_steps, ds.sizes["step"]))}
+        ds.isel(region).drop_vars(stepless).to_zarr(store_path, region=region)
+
+
+def _write_levels(store_path: str, factors: List[int]) -> None:
+    """Add pyramid levels coarsened from a store's own data to the store."""
+    with open_store(store_path) as written:
+        for factor, level in build_pyramid(written, factors).items():
+            level.attrs.pop(PYRAMID_ATTR, None)
+            _chunked(level).to_zarr(
+                store_path, group=level_group(factor), mode="w", consolidated=True
+            )
+    # Include the level groups in the root's consolidated metadata
+    zarr.consolidate_metadata(store_path)
+
+
+def write_store(
+    ds: xr.Dataset, store_path: str, pyramid_factors: Optional[List[int]] = None
+) -> str:
+    """
+    Write a dataset to a Zarr store with one chunk per step and variable.
+
+    The store is written next to its final location and then moved into
+    place, so a reader never sees a half-written store. Under a memory
+    budget, dask-backed data is decoded and written in batches of
+    ``loading.conversion_batch_steps`` steps.
+
+    Args:
+        ds (xr.Dataset): Dataset to write.
+        store_path (str): Destination path of the store.
+        pyramid_factors (List[int], optional): Coarsening factors of the
+            pyramid levels to store in groups next to the full resolution
+            data. The levels are computed from the written data, so the
+            source is not decoded again.
+
+    Returns:
+        str: Path of the written store.
+    """
+    tmp_path = f"{store_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    if pyramid_factors:
+        ds = ds.assign_attrs({PYRAMID_ATTR: sorted(pyramid_factors)})
+    chunked = _chunked(ds)
+    batch_steps = conversion_batch_steps(chunked)
+    workers = min(batch_steps, os.cpu_count() or 1)
+    with timed("store_write_seconds", store=os.path.basename(store_path)):
+        with dask.config.set(scheduler="threads", num_workers=workers):
+            if batch_steps < chunked.sizes.get("step", 1):
+                _write_step_batches(chunked, tmp_path, batch_steps)
+            else:
+                chunked.to_zarr(tmp_path, mode="w", consolidated=True)
+            if pyramid_factors:
+                _write_levels(tmp_path, pyramid_factors)
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def open_store(store_path: str) -> xr.Dataset:
+    """
+    Open a Zarr store lazily.
+
+    Args:
+        store_path (str): Path of the store.
+
+    Returns:
+        xr.Dataset: Dask-backed dataset; data is read one chunk at a time.
+    """
+    return xr.open_zarr(store_path, consolidated=True, decode_timedelta=True)
+
+
+def convert_run(global_file: str, scandinavia_file: str) -> Tuple[str, str]:
+    """
+    Convert the global and Scandinavian GRIB files of a run to Zarr stores.
+
+    A store that was already converted from the same file contents is kept
+    as it is.
+
+    Args:
+        global_file (str): Path to the global forecast GRIB file.
+        scandinavia_file (str): Path to the Scandinavian forecast GRIB file.
+
+    Returns:
+        Tuple[str, str]: Paths of the global and Scandinavian stores.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    global_store = store_path_for(global_file)
+    global_digest = file_digest(global_file)
+    if store_is_current(global_store, global_digest):
+        logging.info(f"Global store is up to date: {global_store}")
+    else:
+        filters = [field.filter_by_keys for field in source_fields(GLOBAL_SOURCE)]
+        with timed("convert_seconds", region="Global"), open_merged_dataset(
+            global_file, filters
+        ) as global_dataset:
+            global_dataset = add_derived_fields(global_dataset)
+            global_dataset.attrs[SOURCE_DIGEST_ATTR] = global_digest
+            global_dataset.attrs[STORE_FORMAT_ATTR] = STORE_FORMAT
+            write_store(global_dataset, global_store, pyramid_factors=PYRAMID_FACTORS)
+        logging.info(f"Global data converted: {global_store}")
+
+    scandinavia_store = store_path_for(scandinavia_file)
+    scandinavia_digest = file_digest(scandinavia_file)
+    if store_is_current(scandinavia_store, scandinavia_digest):
+        logging.info(f"Scandinavian store is up to date: {scandinavia_store}")
+    else:
+        with timed("convert_seconds", region="Scandinavia"):
+            parts = split_datasets(scandinavia_file)
+            with timed("merge_seconds", file=os.path.basename(scandinavia_file)):
+                scandinavian_dataset = xr.merge(parts, compat="override")
+            scandinavian_dataset = add_derived_fields(scandinavian_dataset)
+            scandinavian_dataset.attrs[SOURCE_DIGEST_ATTR] = scandinavia_digest
+            scandinavian_dataset.attrs[STORE_FORMAT_ATTR] = STORE_FORMAT
+            write_store(scandinavian_dataset, scandinavia_store)
+        logging.info(f"Scandinavian data converted: {scandinavia_store}")
+
+    return global_store, scandinavia_store
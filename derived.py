@@ -0,0 +1,113 @@
+"""
+Module for computing derived fields once per run.
+
+Wind speed and direction and the 6-hourly precipitation intervals are computed for all steps
+at once with batched NumPy when a run is converted, and stored next to the source fields. The
+plotting code then only indexes these arrays.
+"""
+
+import logging
+from typing import TYPE_CHECKING, Dict, Tuple
+import numpy as np
+
+if TYPE_CHECKING:
+    # Only annotations use xarray, which the ingest command never loads
+    import xarray as xr
+
+# Constants
+WIND_SPEED = "wind_speed"
+WIND_DIRECTION = "wind_direction"
+# Accumulated precipitation variables and the names of their interval fields
+ACCUMULATED_VARIABLES: Dict[str, str] = {"tp": "tp_6h", "rain_con": "rain_con_6h"}
+QUIVER_SPACING_PX = 30  # Distance between wind arrows on screen
+
+
+def wind_speed_direction(
+    u: np.ndarray, v: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute wind speed and the direction the wind blows from.
+
+    Args:
+        u (np.ndarray): Eastward wind component (NumPy or dask array).
+        v (np.ndarray): Northward wind component.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Speed in the units of ``u`` and
+            ``v``, and meteorological direction in degrees (0 = from north,
+            90 = from east).
+    """
+    speed = np.hypot(u, v)
+    direction = np.mod(270.0 - np.degrees(np.arctan2(v, u)), 360.0)
+    return speed, direction.astype(u.dtype, copy=False)
+
+
+def deaccumulate(accumulated: np.ndarray) -> np.ndarray:
+    """
+    Turn a field accumulated since the run start into per-step intervals.
+
+    Args:
+        accumulated (np.ndarray): Accumulated values with steps on axis 0
+            (NumPy or dask array).
+
+    Returns:
+        np.ndarray: Amount within each step's interval; the first step keeps
+            its accumulated value. Small negative differences from packing
+            are clipped to zero.
+    """
+    intervals = np.diff(accumulated, axis=0, prepend=np.zeros_like(accumulated[:1]))
+    return np.clip(intervals, 0, None)
+
+
+def add_derived_fields(ds: "xr.Dataset") -> "xr.Dataset":
+    """
+    Add wind speed/direction and de-accumulated precipitation to a run.
+
+    Args:
+        ds (xr.Dataset): Run with ``u10``/``v10`` and an accumulated
+            precipitation variable over all steps.
+
+    Returns:
+        xr.Dataset: The dataset with the derived variables added.
+    """
+    derived = {}
+    if "u10" in ds and "v10" in ds:
+        # NumPy or dask arrays; dask ones stay lazy until the store is written
+        speed, direction = wind_speed_direction(ds["u10"].data, ds["v10"].data)
+        derived[WIND_SPEED] = (ds["u10"].dims, speed, {"units": "m s**-1"})
+        derived[WIND_DIRECTION] = (ds["u10"].dims, direction, {"units": "degrees"})
+
+    for name, interval_name in ACCUMULATED_VARIABLES.items():
+        if name in ds and "step" in ds[name].dims:
+            values = ds[name].transpose("step", ...)
+            derived[interval_name] = (
+                values.dims,
+                deaccumulate(values.data),
+                {**ds[name].attrs, "long_name": f"{name} in the preceding interval"},
+            )
+
+    logging.info(f"Derived fields computed: {', '.join(derived)}")
+    return ds.assign(derived)
+
+
+def thinning_slice(
+    coords: np.ndarray, lower: float, upper: float, n_pixels: float
+) -> slice:
+    """
+    Return the slice of grid points to draw arrows at along one axis.
+
+    Only points inside [lower, upper] are kept, with a stride that puts
+    arrows about ``QUIVER_SPACING_PX`` pixels apart.
+
+    Args:
+        coords (np.ndarray): Monotonic grid coordinates.
+        lower (float): Lower bound of the visible range.
+        upper (float): Upper bound of the visible range.
+        n_pixels (float): Axes size in pixels along this axis.
+    """
+    inside = np.nonzero((coords >= lower) & (coords <= upper))[0]
+    if len(inside) == 0:
+        return slice(0, 0)
+    n_arrows = max(1.0, n_pixels / QUIVER_SPACING_PX)
+    stride = max(1, int(round(len(inside) / n_arrows)))
+    return slice(int(inside[0]), int(inside[-1]) + 1, stride)
@@ -0,0 +1,25 @@
+"""
+Module for the content hashes that identify downloaded files and the stores decoded from them.
+"""
+
+import hashlib
+
+# Constants
+HASH_CHUNK_SIZE = 4 * 1024 * 1024  # 4 MiB
+
+
+def file_digest(filename: str) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+
+    Args:
+        filename (str): Path to the file.
+
+    Returns:
+        str: Hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,323 @@
+"""
+Module for indexing GRIB files so that each parameter can be decoded without rescanning the file.
+
+A single pass over the file records the byte offset of every message together with its
+shortName, typeOfLevel and step. The index is stored next to the GRIB file, keyed by the
+file's content hash, and the messages of each requested parameter are copied into a small
+subset file that cfgrib can open on its own.
+"""
+
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import eccodes
+import xarray as xr
+from digests import file_digest
+from loading import grib_chunks
+from metrics import observe, timed
+
+# Constants
+INDEX_KEYS = ["shortName", "typeOfLevel", "level", "stepType", "step"]
+INDEX_DIR_SUFFIX = ".msgidx"
+INDEX_FILENAME = "index.json"
+DECODE_PROCESSES = os.cpu_count() or 1
+
+# Process pool decoding independent parameters, started on first use
+_decode_pool: Optional[ProcessPoolExecutor] = None
+_decode_pool_lock = threading.Lock()
+
+
+def build_index(filename: str) -> List[Dict[str, Any]]:
+    """
+    Scan a GRIB file once and record the location of every message.
+
+    Args:
+        filename (str): Path to the GRIB file.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per message with the ``INDEX_KEYS``
+            plus ``offset`` and ``length`` in bytes.
+    """
+    messages = []
+    with open(filename, "rb") as f:
+        while True:
+            handle = eccodes.codes_grib_new_from_file(f)
+            if handle is None:
+                break
+            try:
+                entry = {
+                    key: eccodes.codes_get(handle, key)
+                    if eccodes.codes_is_defined(handle, key)
+                    else None
+                    for key in INDEX_KEYS
+                }
+                entry["offset"] = eccodes.codes_get_message_offset(handle)
+                entry["length"] = eccodes.codes_get_message_size(handle)
+                messages.append(entry)
+            finally:
+                eccodes.codes_release(handle)
+    return messages
+
+
+def _index_dir(filename: str, digest: str) -> str:
+    """Return the sidecar directory holding the index for a given file hash."""
+    return f"{filename}.{digest[:16]}{INDEX_DIR_SUFFIX}"
+
+
+def _remove_stale_indexes(filename: str, current_dir: str) -> None:
+    """Delete index directories left behind by earlier versions of the file."""
+    for path in glob.glob(f"{glob.escape(filename)}.*{INDEX_DIR_SUFFIX}"):
+        if path != current_dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_index(filename: str) -> Dict[str, Any]:
+    """
+    Load the message index for a GRIB file, building it on first use.
+
+    Args:
+        filename (str): Path to the GRIB file.
+
+    Returns:
+        Dict[str, Any]: Index with the file ``digest``, the sidecar
+            ``directory`` and the list of ``messages``.
+    """
+    digest = file_digest(filename)
+    directory = _index_dir(filename, digest)
+    index_path = os.path.join(directory, INDEX_FILENAME)
+
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        logging.info(f"Reusing GRIB index for {filename}")
+        return index
+
+    _remove_stale_indexes(filename, directory)
+    os.makedirs(directory, exist_ok=True)
+    index = {
+        "filename": os.path.abspath(filename),
+        "digest": digest,
+        "directory": directory,
+        "messages": build_index(filename),
+    }
+
+    # Write atomically so that a crash never leaves a truncated index behind
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    logging.info(
+        f"Indexed {len(index['messages'])} GRIB messages from {filename}"
+    )
+    return index
+
+
+def select_messages(
+    index: Dict[str, Any], filter_by_keys: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    Return the index entries matching all of the given keys.
+
+    Args:
+        index (Dict[str, Any]): Index returned by ``load_index``.
+        filter_by_keys (Dict[str, Any]): GRIB keys and values to match.
+
+    Returns:
+        List[Dict[str, Any]]: Matching message entries in file order.
+    """
+    unknown = set(filter_by_keys) - set(INDEX_KEYS)
+    if unknown:
+        raise ValueError(f"Keys not in GRIB index: {sorted(unknown)}")
+    return [
+        message
+        for message in index["messages"]
+        if all(message[key] == value for key, value in filter_by_keys.items())
+    ]
+
+
+def _subset_path(index: Dict[str, Any], filter_by_keys: Dict[str, Any]) -> str:
+    """Return the path of the subset file for a filter."""
+    name = ",".join(f"{key}={value}" for key, value in sorted(filter_by_keys.items()))
+    return os.path.join(index["directory"], f"{name}.grib")
+
+
+def extract_subset(
+    filename: str, index: Dict[str, Any], filter_by_keys: Dict[str, Any]
+) -> str:
+    """
+    Copy the messages matching a filter into their own GRIB file.
+
+    The subset is only written once per file hash; later calls return the
+    existing path.
+
+    Args:
+        filename (str): Path to the original GRIB file.
+        index (Dict[str, Any]): Index returned by ``load_index``.
+        filter_by_keys (Dict[str, Any]): GRIB keys and values to match.
+
+    Returns:
+        str: Path to the subset GRIB file.
+    """
+    subset_path = _subset_path(index, filter_by_keys)
+    if os.path.exists(subset_path):
+        return subset_path
+
+    messages = select_messages(index, filter_by_keys)
+    if not messages:
+        raise ValueError(f"No GRIB messages in {filename} match {filter_by_keys}")
+
+    # A temp file of its own, so processes extracting the same subset never share one
+    fd, tmp_path = tempfile.mkstemp(
+        suffix=".tmp", dir=index["directory"], prefix=os.path.basename(subset_path)
+    )
+    with open(filename, "rb") as src, os.fdopen(fd, "wb") as dst:
+        for message in messages:
+            src.seek(message["offset"])
+            dst.write(src.read(message["length"]))
+    os.replace(tmp_path, subset_path)
+    return subset_path
+
+
+def _decode_subset(subset_path: str) -> Tuple[xr.Dataset, float]:
+    """Decode a subset file into memory, returning it and the seconds it took."""
+    start = time.perf_counter()
+    with xr.open_dataset(
+        subset_path,
+        engine="cfgrib",
+        decode_timedelta=True,
+        backend_kwargs={"indexpath": ""},
+    ) as ds:
+        loaded = ds.load()
+    return loaded, time.perf_counter() - start
+
+
+def _get_decode_pool() -> ProcessPoolExecutor:
+    """Return the decoding process pool, starting it on first use."""
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is None:
+            _decode_pool = ProcessPoolExecutor(
+                max_workers=DECODE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _decode_pool
+
+
+def open_indexed_dataset(
+    filename: str,
+    filter_by_keys: Dict[str, Any],
+    index: Optional[Dict[str, Any]] = None,
+) -> xr.Dataset:
+    """
+    Open the messages of a GRIB file matching a filter as an xarray dataset.
+
+    Args:
+        filename (str): Path to the GRIB file.
+        filter_by_keys (Dict[str, Any]): GRIB keys and values to match.
+        index (Dict[str, Any], optional): Index returned by ``load_index``.
+            Loaded (or built) when not given.
+
+    Returns:
+        xr.Dataset: Dataset containing only the matching messages. Without a
+            memory budget it is decoded into memory, so later steps do not
+            decode it again; with one it is opened lazily with one dask
+            chunk per step.
+    """
+    if index is None:
+        index = load_index(filename)
+    subset_path = extract_subset(filename, index, filter_by_keys)
+    chunks = grib_chunks()
+    labels = {
+        "file": os.path.basename(filename),
+        "variable": filter_by_keys.get("shortName", ""),
+    }
+    if chunks is not None:
+        # Decoded chunk by chunk when the store is written
+        with timed("grib_open_seconds", **labels):
+            return xr.open_dataset(
+                subset_path,
+                engine="cfgrib",
+                chunks=chunks,
+                decode_timedelta=True,
+                backend_kwargs={"indexpath": ""},
+            )
+    ds, seconds = _decode_subset(subset_path)
+    observe("grib_decode_seconds", seconds, **labels)
+    return ds
+
+
+def open_indexed_datasets(
+    filename: str,
+    filters: List[Dict[str, Any]],
+    index: Optional[Dict[str, Any]] = None,
+) -> List[xr.Dataset]:
+    """
+    Open several parameters of a GRIB file, decoding them in parallel.
+
+    Without a memory budget the parameters are decoded at the same time in
+    the decoding process pool, so the time grows with the number of
+    parameters per core rather than with the number of parameters. With a
+    budget they are opened lazily as in ``open_indexed_dataset``.
+
+    Args:
+        filename (str): Path to the GRIB file.
+        filters (List[Dict[str, Any]]): One ``filter_by_keys`` per parameter.
+            Filters without messages in the file are skipped with a warning.
+        index (Dict[str, Any], optional): Index returned by ``load_index``.
+
+    Returns:
+        List[xr.Dataset]: One dataset per parameter found, in filter order.
+    """
+    if index is None:
+        index = load_index(filename)
+    found = []
+    for keys in filters:
+        if select_messages(index, keys):
+            found.append(keys)
+        else:
+            logging.warning(f"No GRIB messages in {filename} match {keys}; skipped")
+    if grib_chunks() is not None or len(found) < 2 or DECODE_PROCESSES < 2:
+        return [open_indexed_dataset(filename, keys, index) for keys in found]
+
+    pool = _get_decode_pool()
+    futures = [
+        pool.submit(_decode_subset, extract_subset(filename, index, keys))
+        for keys in found
+    ]
+    datasets = []
+    for keys, future in zip(found, futures):
+        ds, seconds = future.result()
+        observe(
+            "grib_decode_seconds",
+            seconds,
+            file=os.path.basename(filename),
+            variable=keys.get("shortName", ""),
+        )
+        datasets.append(ds)
+    return datasets
+
+
+def open_merged_dataset(
+    filename: str, filters: List[Dict[str, Any]]
+) -> xr.Dataset:
+    """
+    Open several parameters of a GRIB file from one index and merge them.
+
+    Args:
+        filename (str): Path to the GRIB file.
+        filters (List[Dict[str, Any]]): One ``filter_by_keys`` per parameter.
+
+    Returns:
+        xr.Dataset: Merged dataset with one variable per parameter found.
+    """
+    datasets = open_indexed_datasets(filename, filters)
+    with timed("merge_seconds", file=os.path.basename(filename)):
+        return xr.merge(datasets, compat="override")
@@ -2,20 +2,378 @@
 Module for downloading the latest weather forecast data for global and Scandinavian regions.
 """
 
+import glob
+import json
 import logging
-from datetime import datetime, timedelta, timezone
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import requests
+from requests.adapters import HTTPAdapter
 from ecmwf.opendata import Client
-from typing import Optional
+from ecmwf.opendata.client import HOURLY_PATTERN
+from typing import Any, Dict, List, Optional, Tuple
+from digests import file_digest
+from metrics import observe, set_gauge, timed
+from parameters import request_parameters
+from regions import GLOBAL_SOURCE, REGIONAL_SOURCE, download_bbox
+from scheduling import CYCLE_INTERVAL, cycle_start
+
+# Constants
+FMI_DOWNLOAD_URL = "https://opendata.fmi.fi/download"
+REQUEST_TIMEOUT = (10, 300)  # (connect, read) seconds
+ECMWF_MAX_RETRIES = 3  # The client default (500 x 120 s) can stall for hours
+ECMWF_RETRY_AFTER_SECONDS = 10
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+PROBE_TIMEOUT = (5, 10)  # (connect, read) seconds for availability probes
+PROBE_CYCLES = 5  # Newest cycles checked for availability
+# A single parameter over a tiny area is enough to tell whether a run exists
+FMI_PROBE_PARAMETERS = "totalcloudcover"
+FMI_PROBE_BBOX = "24,60,25,61"
+ECMWF_STEPS = list(range(0, 49, 6))  # forecasts every 6h up to +48h
+
+_session: Optional[requests.Session] = None
+
+
+def _get_session() -> requests.Session:
+    """
+    Return the shared HTTP session, creating it on first use.
+
+    The session keeps a connection pool open between iterations so that
+    repeated FMI requests reuse TCP/TLS connections.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def fmi_bbox() -> str:
+    """
+    Return the FMI download box: the union of the boxes of all FMI regions.
+
+    One request covers every FMI region, however many there are.
+    """
+    lon_min, lon_max, lat_min, lat_max = download_bbox(REGIONAL_SOURCE)
+    return f"{lon_min:g},{lat_min:g},{lon_max:g},{lat_max:g}"
+
+
+def _fmi_url(
+    origin_datetime: datetime, param: Optional[str] = None, bbox: Optional[str] = None
+) -> str:
+    """
+    Build the FMI HARMONIE download URL for the given run.
+
+    By default every FMI parameter of the catalog is requested over the box
+    of all FMI regions.
+    """
+    param = param or ",".join(request_parameters(REGIONAL_SOURCE))
+    bbox = bbox or fmi_bbox()
+    return (
+        f"{FMI_DOWNLOAD_URL}?"
+        "producer=harmonie_scandinavia_surface&"
+        f"param={param}&"
+        f"origintime={origin_datetime:%Y-%m-%dT%H:%M:%S}Z&"
+        f"bbox={bbox}&"
+        "projection=EPSG:4326&"
+        "format=grib2&"
+        "timestep=360&"  # 6 hours
+        "timesteps=9"  # 48 hours
+    )
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    """Read a JSON sidecar file, returning an empty dict if it is missing or corrupt."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    """Write a JSON sidecar file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _commit_download(part_path: str, target: str, extra: Dict[str, Any]) -> bool:
+    """
+    Move a finished download into place and record its content hash.
+
+    Args:
+        part_path (str): Path of the completed partial file.
+        target (str): Final path of the file.
+        extra (Dict[str, Any]): Additional metadata to store (URL, validators).
+
+    Returns:
+        bool: True if the content differs from the previous download.
+    """
+    meta_path = f"{target}.meta.json"
+    previous = _read_json(meta_path)
+    digest = file_digest(part_path)
+    changed = digest != previous.get("sha256") or not os.path.exists(target)
+    os.replace(part_path, target)
+    _write_json(
+        meta_path, {**extra, "sha256": digest, "size": os.path.getsize(target)}
+    )
+    return changed
+
+
+def _download_fmi(origin_datetime: datetime, target: str) -> Tuple[int, float, bool]:
+    """
+    Stream the FMI GRIB for the given run to disk in chunks.
+
+    The request is conditional on the ETag/Last-Modified of the previous
+    download of the same URL, and an interrupted download is resumed with
+    a Range request. Data is written to ``<target>.part`` and only moved to
+    ``target`` once complete.
+
+    Args:
+        origin_datetime (datetime): Model run time.
+        target (str): Path to save the GRIB file.
+
+    Returns:
+        Tuple[int, float, bool]: Number of bytes transferred, elapsed
+            seconds, and whether the file content changed.
+    """
+    url = _fmi_url(origin_datetime)
+    # One partial file per run, so trying another run does not discard it
+    part_path = f"{target}.{origin_datetime:%Y%m%d%H}.part"
+    part_meta_path = f"{part_path}.json"
+    meta = _read_json(f"{target}.meta.json")
+    headers = {}
+
+    # Ask the server whether the file we already have is still current
+    if os.path.exists(target) and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    # Resume an interrupted download of the same URL
+    offset = 0
+    part_meta = _read_json(part_meta_path)
+    if os.path.exists(part_path) and part_meta.get("url") == url:
+        offset = os.path.getsize(part_path)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = part_meta.get("etag") or part_meta.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+
+    start = time.perf_counter()
+    n_bytes = 0
+    with _get_session().get(
+        url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+    ) as response:
+        if response.status_code == 304:
+            logging.info(f"FMI data not modified: {target}")
+            return 0, time.perf_counter() - start, False
+        if response.status_code == 416:
+            # The partial file does not match the resource any more
+            os.remove(part_path)
+            raise RuntimeError("Partial Scandinavian download is no longer valid")
+        response.raise_for_status()
+
+        validators = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if response.status_code == 206:
+            mode = "ab"
+            logging.info(f"Resuming FMI download at byte {offset}")
+        else:
+            mode = "wb"
+            offset = 0
+        _write_json(part_meta_path, validators)
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                n_bytes += len(chunk)
+
+    if offset + n_bytes == 0:
+        os.remove(part_path)
+        raise RuntimeError("No Scandinavian GRIB data returned!")
+    changed = _commit_download(part_path, target, validators)
+    os.remove(part_meta_path)
+    _remove_stale_parts(target, f"{origin_datetime:%Y%m%d%H}")
+    return n_bytes, time.perf_counter() - start, changed
+
+
+def _remove_stale_parts(target: str, run_stamp: str) -> None:
+    """Remove the partial downloads of runs older than ``run_stamp``."""
+    for stale_path in glob.glob(f"{glob.escape(target)}.*.part*"):
+        if stale_path[len(target) + 1 :].split(".")[0] < run_stamp:
+            os.remove(stale_path)
+
+
+def _download_ecmwf(
+    client: Client, params: Dict[str, Any]
+) -> Tuple[int, float, bool]:
+    """
+    Retrieve the ECMWF GRIB described by ``params``.
+
+    The data is retrieved into a partial file of its own run,
+    ``<target>.<YYYYMMDDHH>.part``, and moved into place when complete, so
+    the target only ever holds a whole run.
+
+    Returns:
+        Tuple[int, float, bool]: Number of bytes written, elapsed seconds,
+            and whether the file content changed.
+    """
+    target = params["target"]
+    run_stamp = f"{params['date']}{params['time']:02d}"
+    part_path = f"{target}.{run_stamp}.part"
+    start = time.perf_counter()
+    client.retrieve(**{**params, "target": part_path})
+    n_bytes = os.path.getsize(part_path)
+    changed = _commit_download(
+        part_path, target, {"time": params["time"], "step": params["step"]}
+    )
+    _remove_stale_parts(target, run_stamp)
+    return n_bytes, time.perf_counter() - start, changed
+
+
+def _ecmwf_params(cycle: datetime) -> Dict[str, Any]:
+    """Build the ECMWF retrieve request for the given run."""
+    return {
+        "type": "fc",  # forecast
+        "stream": "oper",  # operational stream
+        "step": ECMWF_STEPS,
+        "param": request_parameters(GLOBAL_SOURCE),
+        "date": cycle.strftime("%Y%m%d"),
+        "time": cycle.hour,
+    }
+
+
+def candidate_cycles(now: datetime, count: int = PROBE_CYCLES) -> List[datetime]:
+    """Return the ``count`` newest cycle times at or before ``now``, newest first."""
+    newest = cycle_start(now)
+    return [newest - i * CYCLE_INTERVAL for i in range(count)]
+
+
+def _probe_fmi(cycle: datetime) -> bool:
+    """
+    Check whether FMI has published the given run.
+
+    Only a single parameter over a tiny area is requested, and the response
+    is closed after its first bytes.
+    """
+    url = _fmi_url(cycle, param=FMI_PROBE_PARAMETERS, bbox=FMI_PROBE_BBOX)
+    with _get_session().get(url, stream=True, timeout=PROBE_TIMEOUT) as response:
+        if response.status_code != 200:
+            return False
+        return bool(next(response.iter_content(chunk_size=1024), b""))
+
+
+def _ecmwf_url(client: Client, cycle: datetime, step: int) -> str:
+    """
+    Return the URL of one step's file of an ECMWF run.
+
+    The URL is built from the client's public file name pattern and base URL.
+    AIFS files keep the requested stream at every run time.
+    """
+    params = _ecmwf_params(cycle)
+    return HOURLY_PATTERN.format(
+        _url=client.url,
+        _yyyymmdd=f"{cycle:%Y%m%d}",
+        _H=f"{cycle:%H}",
+        _yyyymmddHHMMSS=f"{cycle:%Y%m%d%H%M%S}",
+        _stream=params["stream"],
+        _extension="grib2",
+        model=client.model,
+        resol=client.resol,
+        step=step,
+        type=params["type"],
+    )
+
+
+def _probe_ecmwf(client: Client, cycle: datetime) -> bool:
+    """
+    Check whether ECMWF has published the given run up to its last step.
+
+    The steps are published in order, so a HEAD request for the last step's
+    file is enough.
+    """
+    url = _ecmwf_url(client, cycle, ECMWF_STEPS[-1])
+    return _get_session().head(url, timeout=PROBE_TIMEOUT).status_code == 200
+
+
+def probe_available_cycles(
+    client: Client, cycles: List[datetime]
+) -> Dict[str, List[datetime]]:
+    """
+    Check all candidate runs of both sources at once.
+
+    Every probe runs in its own thread with a short timeout; a probe that
+    fails or times out counts as not available.
+
+    Args:
+        client (Client): ECMWF open data client.
+        cycles (List[datetime]): Candidate run times.
+
+    Returns:
+        Dict[str, List[datetime]]: Available runs per source, newest first.
+    """
+    probes = {"FMI": _probe_fmi, "ECMWF": lambda cycle: _probe_ecmwf(client, cycle)}
+    with timed("probe_seconds"), ThreadPoolExecutor(
+        max_workers=len(probes) * len(cycles), thread_name_prefix="probe"
+    ) as executor:
+        futures = {
+            (source, cycle): executor.submit(probe, cycle)
+            for source, probe in probes.items()
+            for cycle in cycles
+        }
+
+    available: Dict[str, List[datetime]] = {source: [] for source in probes}
+    for (source, cycle), future in futures.items():
+        try:
+            if future.result():
+                available[source].append(cycle)
+        except Exception as exc:
+            logging.debug(f"{source} probe for {cycle:%Y-%m-%d %H} UTC failed: {exc}")
+    for source, found in available.items():
+        found.sort(reverse=True)
+        newest = f"{found[0]:%Y-%m-%d %H} UTC" if found else "none"
+        logging.info(f"{source}: newest available run {newest}")
+    return available
+
+
+def _log_transfer(source: str, n_bytes: int, elapsed: float) -> None:
+    """Log and record size, duration and throughput of a finished download."""
+    observe("download_seconds", elapsed, source=source)
+    observe("download_bytes", n_bytes, source=source)
+    if elapsed > 0:
+        set_gauge(
+            "download_throughput_bytes_per_second", n_bytes / elapsed, source=source
+        )
+    rate = n_bytes / elapsed / 1e6 if elapsed > 0 else float("inf")
+    logging.info(
+        f"{source}: {n_bytes / 1e6:.1f} MB in {elapsed:.1f} s ({rate:.2f} MB/s)"
+    )
+
 
 def download_latest_run(
     target_global: str, 
     target_scandinavia: str,
     last_date_str: Optional[str] = None,
     last_hour: Optional[int] = None,
-) -> tuple[str, int, bool]:
+) -> Tuple[Optional[str], Optional[int], bool, Dict[str, Optional[datetime]]]:
     """
-    Download the latest available weather forecast data for global and Scandinavian regions.
+    Download the latest weather forecast run available for both regions.
+
+    The candidate runs are first probed for both sources at once with short
+    timeouts. Only the newest run that both FMI and ECMWF have published is
+    then downloaded, with both downloads running at the same time.
 
     Args:
         target_global (str): Path to save the global forecast GRIB file.
@@ -24,73 +382,78 @@ def download_latest_run(
         last_hour (int, optional): Previously downloaded hour (UTC).
 
     Returns:
-        tuple[str, int, bool]: The date string, hour, and a flag indicating if new data was downloaded.
+        Tuple[Optional[str], Optional[int], bool, Dict[str, Optional[datetime]]]:
+            The date string and hour of the run (the previous run, or None if
+            there is none, when no common run is available), a flag indicating
+            if new data was downloaded, and the newest run found per source
+            (None for a source whose download failed).
+            The flag is False when the downloaded bytes are identical to the
+            previous files.
     """
     logging.basicConfig(level=logging.INFO)
-    client = Client(model="aifs-single", source="ecmwf", resol="0p25")
+    client = Client(
+        model="aifs-single",
+        source="ecmwf",
+        resol="0p25",
+        maximum_retries=ECMWF_MAX_RETRIES,
+        retry_after=ECMWF_RETRY_AFTER_SECONDS,
+    )
     now = datetime.now(timezone.utc)
-    date_str = now.strftime("%Y%m%d")
-    date_only = now.date()
-    valid_hours = [18, 12, 6, 0]  # Try these hours for the latest available run
+    available = probe_available_cycles(client, candidate_cycles(now))
+    latest = {
+        source: cycles[0] if cycles else None for source, cycles in available.items()
+    }
+
+    common = sorted(set(available["FMI"]) & set(available["ECMWF"]), reverse=True)
+    if not common:
+        logging.warning("No run is available from both FMI and ECMWF.")
+        return last_date_str, last_hour, False, latest
 
-    for hour in valid_hours:
-        origin_datetime = datetime.combine(date_only, datetime.min.time()) + timedelta(
-            hours=hour
+    cycle = common[0]
+    date_str, hour = cycle.strftime("%Y%m%d"), cycle.hour
+    # Skip if this run was already downloaded (but only if it's not the first time)
+    if (date_str, hour) == (last_date_str, last_hour):
+        logging.info(
+            f"No new run available ({date_str} {hour:02d} UTC). Skipping download."
         )
+        return date_str, hour, False, latest
 
-        # Skip if this run was already downloaded (but only if it's not the first time)
-        if last_date_str is not None and last_hour is not None:
-            if (date_str, hour) == (last_date_str, last_hour):
-                logging.info(
-                    f"No new run available ({date_str} {hour:02d} UTC). Skipping download."
+    # Start both downloads at once
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="download") as executor:
+        fmi_future = executor.submit(_download_fmi, cycle, target_scandinavia)
+        ecmwf_future = executor.submit(
+            _download_ecmwf, client, {**_ecmwf_params(cycle), "target": target_global}
+        )
+        # Wait for both, so neither target path is reused while still written
+        failed = []
+        for source, future in (("FMI", fmi_future), ("ECMWF", ecmwf_future)):
+            try:
+                future.result()
+            except Exception as exc:
+                logging.warning(
+                    f"{source} run {date_str} {hour:02d} UTC download failed: {exc}"
                 )
-                return date_str, hour, False
-        try:
-            # Download Scandinavian regional data
-            url = (
-                "https://opendata.fmi.fi/download?"
-                "producer=harmonie_scandinavia_surface&"
-                "param=PrecipitationAmount,windums,windvms,totalcloudcover&"
-                f"origintime={origin_datetime.isoformat()}Z&"
-                "bbox=5,54,31,72&"
-                "projection=EPSG:4326&"
-                "format=grib2&"
-                "timestep=360&"  # 6 hours
-                "timesteps=9"  # 48 hours
-            )
-            response = requests.get(url)
-
-            if not response.content:
-                raise RuntimeError("No Scandinavian GRIB data returned!")
-
-            with open(target_scandinavia, "wb") as f:
-                f.write(response.content)
-            logging.info(f"Latest available for FMI run found: {date_str} {hour:02d} UTC")
-            logging.info(f"Scandinavian data saved: {target_scandinavia}")
-
-            # Download global data
-            params = {
-                "type": "fc",  # forecast
-                "stream": "oper",  # operational stream
-                "step": list(range(0, 49, 6)),  # forecasts every 6h up to +48h
-                "param": ["tp", "10u", "10v", "tcc"],
-                "time": hour,
-                "target": target_global,
-            }
-            client.retrieve(**params)
-            logging.info(f"Latest available for ECMWF run found: {date_str} {hour:02d} UTC")
-            logging.info(f"Global data saved: {target_global}")
-            return date_str, hour, True
-        except Exception as exc:
-            logging.warning(f"Run {date_str} {hour:02d} UTC not available: {exc}")
-            continue
+                failed.append(source)
+    if failed:
+        # A failed source has not delivered its run yet, so it is retried soon
+        # instead of waiting for its next publication window
+        return (
+            last_date_str,
+            last_hour,
+            False,
+            {source: None if source in failed else latest[source] for source in latest},
+        )
 
-    # If none found, try yesterday 18UTC
-    yesterday = (now - timedelta(days=1)).strftime("%Y%m%d")
-    logging.warning(
-        "No available runs found for today. Falling back to yesterday 18 UTC."
-    )
-    if (yesterday, 18) == (last_date_str, last_hour):
-        logging.info(f"No new run available ({yesterday} 18 UTC). Skipping download.")
-        return yesterday, 18, False
-    return yesterday, 18, True
+    fmi_bytes, fmi_elapsed, fmi_changed = fmi_future.result()
+    logging.info(f"Scandinavian data saved: {target_scandinavia}")
+    _log_transfer("FMI", fmi_bytes, fmi_elapsed)
+    ecmwf_bytes, ecmwf_elapsed, ecmwf_changed = ecmwf_future.result()
+    logging.info(f"Global data saved: {target_global}")
+    _log_transfer("ECMWF", ecmwf_bytes, ecmwf_elapsed)
+
+    if not (fmi_changed or ecmwf_changed):
+        logging.info(
+            f"Run {date_str} {hour:02d} UTC is unchanged. Skipping processing."
+        )
+        return date_str, hour, False, latest
+    return date_str, hour, True, latest
@@ -0,0 +1,192 @@
+"""
+Module for loading forecast fields within a memory budget.
+
+Without a budget, conversion decodes every parameter of a run into memory at once. With a
+budget, the GRIB subsets are opened as dask arrays with one chunk per step, and the run is
+written a batch of steps at a time, with only as many steps per batch as fit into the
+budget. The viewer keeps the steps it has read in an LRU cache bounded by the same budget,
+so scrubbing back to a recent step does not read it again while older steps are evicted.
+With field packing on, the cache keeps each step packed into 16 bits within the precision of
+its parameter and unpacks it when it is read, so about twice as many steps (or runs) fit.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+import numpy as np
+import xarray as xr
+from caching import LRUCache
+from metrics import observe, register_cache
+from packing import PackedField, pack
+from parameters import variable_packing
+
+# Constants
+STEP_CACHE_BYTES = 256 * 1024 * 1024  # Resident steps in the viewer without a budget
+# Most the step cache grows to without a budget: a global run of the default catalog
+STEP_CACHE_MAX_BYTES = 2 * STEP_CACHE_BYTES
+STEP_CACHE_SHARE = 0.5  # Part of the budget for resident steps; the rest for conversion
+GRIB_CHUNKS = {"step": 1}
+
+_memory_budget: Optional[int] = None
+_field_packing = False
+_steps = LRUCache(STEP_CACHE_BYTES)
+register_cache("steps", _steps)
+
+
+def set_memory_budget(nbytes: Optional[int]) -> None:
+    """
+    Set the memory budget for decoded field data, or remove it.
+
+    Args:
+        nbytes: Budget in bytes, or None to decode runs fully into memory
+            and use the default step cache size.
+    """
+    global _memory_budget
+    _memory_budget = nbytes
+    if nbytes is None:
+        _steps.resize(STEP_CACHE_BYTES)
+        logging.info("Memory budget: none, runs are decoded fully into memory")
+    else:
+        _steps.resize(int(nbytes * STEP_CACHE_SHARE))
+        logging.info(f"Memory budget: {nbytes / 2**20:.0f} MiB")
+
+
+def memory_budget() -> Optional[int]:
+    """Return the memory budget in bytes, or None if loading is unbounded."""
+    return _memory_budget
+
+
+def resize_step_cache(nbytes: int) -> None:
+    """
+    Change the size of the resident step cache, evicting steps if needed.
+
+    Args:
+        nbytes: New size in bytes; 0 disables the cache.
+    """
+    _steps.resize(nbytes)
+
+
+def fit_step_cache(*datasets: xr.Dataset) -> int:
+    """
+    Size the step cache to hold every step of the given datasets' fields.
+
+    A run of a larger catalog outgrows ``STEP_CACHE_BYTES``, and reading all
+    its steps in order, as point queries do, would then evict every step
+    before it is read again. The cache grows at most to its share of the
+    memory budget, or to ``STEP_CACHE_MAX_BYTES`` without one, and shrinks
+    back to ``STEP_CACHE_BYTES`` for smaller runs. A disabled cache stays
+    disabled.
+
+    Args:
+        *datasets: Datasets whose steps are read through ``step_values``.
+
+    Returns:
+        int: Size of the step cache in bytes.
+    """
+    if _steps.max_bytes == 0:
+        return 0
+    packings = variable_packing() if _field_packing else {}
+    needed = sum(
+        variable.size * (2 if name in packings else variable.dtype.itemsize)
+        for ds in datasets
+        for name, variable in ds.data_vars.items()
+        if "step" in variable.dims
+    )
+    if _memory_budget is not None:
+        limit = int(_memory_budget * STEP_CACHE_SHARE)
+    else:
+        limit = STEP_CACHE_MAX_BYTES
+    size = max(min(STEP_CACHE_BYTES, limit), min(needed, limit))
+    if size != _steps.max_bytes:
+        _steps.resize(size)
+        logging.info(f"Step cache resized to {size / 2**20:.0f} MiB")
+    return size
+
+
+def set_field_packing(enabled: bool) -> None:
+    """
+    Keep the steps of the step cache packed into 16 bits, or as read.
+
+    Args:
+        enabled: Pack steps added from now on; steps already cached stay as
+            they are until they are evicted.
+    """
+    global _field_packing
+    _field_packing = enabled
+    logging.info(f"Field packing: {'on' if enabled else 'off'}")
+
+
+def field_packing() -> bool:
+    """Return whether cached steps are packed."""
+    return _field_packing
+
+
+def grib_chunks() -> Optional[Dict[str, int]]:
+    """Return the dask chunks to open GRIB subsets with, or None to load them."""
+    return GRIB_CHUNKS if _memory_budget is not None else None
+
+
+def conversion_batch_steps(ds: xr.Dataset) -> int:
+    """
+    Return how many steps of a dataset may be decoded and written at once.
+
+    Args:
+        ds (xr.Dataset): Dataset with one chunk per step, about to be written.
+
+    Returns:
+        int: Steps per batch; at least 1. Without a budget, all steps.
+    """
+    n_steps = ds.sizes.get("step", 1)
+    if _memory_budget is None:
+        return n_steps
+    # Every variable of a step, source and derived, is in memory while it is written
+    step_bytes = sum(
+        variable.dtype.itemsize * variable.size // n_steps
+        for variable in ds.data_vars.values()
+        if "step" in variable.dims
+    )
+    budget = _memory_budget * (1 - STEP_CACHE_SHARE)
+    return int(max(1, min(n_steps, budget // max(step_bytes, 1))))
+
+
+def step_values(da: xr.DataArray, step: int) -> np.ndarray:
+    """
+    Return one step of a field as a NumPy array, through the step cache.
+
+    Only dask-backed fields (opened from a store) are cached; their dask
+    name identifies the store, group and variable. The returned array is
+    read-only because it may be shared with other callers. With field
+    packing, a step is cached packed and unpacked on every read; the first
+    read returns the unpacked values too, so every read sees the same ones.
+
+    Args:
+        da (xr.DataArray): Field with a ``step`` dimension.
+        step (int): Step index.
+    """
+    name = getattr(da.data, "name", None)
+    if name is None:
+        return da.isel(step=step).values
+    key = (name, step)
+    values = _steps.get(key)
+    if values is None:
+        values = da.isel(step=step).values
+        packed = _pack_step(da.name, values) if _field_packing else None
+        if packed is None:
+            values.flags.writeable = False
+            _steps.put(key, values, values.nbytes)
+        else:
+            _steps.put(key, packed, packed.nbytes)
+            values = packed.unpack()
+    elif isinstance(values, PackedField):
+        values = values.unpack()
+    return values
+
+
+def _pack_step(name: Any, values: np.ndarray) -> Optional[PackedField]:
+    """Pack a step of a variable within its precision, or return None."""
+    packing = variable_packing().get(name)
+    if packing is None:
+        return None
+    packed = pack(values, *packing)
+    if packed is not None:
+        observe("packing_saved_bytes", values.nbytes - packed.nbytes, variable=name)
+    return packed
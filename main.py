@@ -2,15 +2,29 @@
 Main pipeline for weather data streaming and visualization.
 
 This module orchestrates the download, processing, and visualization of weather forecast data
-for both global and Scandinavian regions.
+for both global and Scandinavian regions. Every stage can also be run on its own, as the
+``ingest``, ``convert``, ``render`` and ``serve`` commands; modules a command does not use
+(xarray, Zarr, matplotlib, cartopy) are not imported, so ``ingest`` starts quickly.
 """
 
+import argparse
 import logging
-import time
-import xarray as xr
-from ingesting import download_latest_run
-from plotting import plot_all_parameters
-from scandinavia_split import split_datasets
+import threading
+from datetime import timedelta
+from typing import List, Optional
+from archive import ARCHIVE_BUDGET_BYTES, ARCHIVE_DIR, RunArchive
+from metrics import PROFILERS, configure_json_log
+from pipeline import (
+    CONVERT,
+    INGEST,
+    PROFILE_DIR,
+    RENDER,
+    STAGES,
+    LivePipeline,
+    show_run,
+)
+from parameters import load_parameters, set_parameters
+from regions import load_regions, set_regions
 
 # Configure logging
 logging.basicConfig(
@@ -20,68 +34,329 @@ logging.basicConfig(
 # Constants
 GLOBAL_FORECAST_FILE = "forecast_global.grib"
 SCANDINAVIA_FORECAST_FILE = "forecast_scandinavia.grib"
-UPDATE_INTERVAL_SECONDS = 3600  # 1 hour
+OUTPUT_DIR = "output"
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8080  # Port of the serve command
+RUN = "run"  # Every stage in one process
+SERVE = "serve"  # The render stage, serving map tiles
+COMMANDS = [RUN, INGEST, CONVERT, RENDER, SERVE]
 
 
-def run_pipeline() -> None:
+def run_pipeline(
+    headless: bool = False,
+    output_dir: str = OUTPUT_DIR,
+    processes: Optional[int] = None,
+    animate: bool = False,
+    metrics_file: Optional[str] = None,
+    metrics_log: Optional[str] = None,
+    profiler: Optional[str] = None,
+    profile_dir: str = PROFILE_DIR,
+    memory_budget_mb: Optional[int] = None,
+    pack_fields: bool = False,
+    regions_file: Optional[str] = None,
+    parameters_file: Optional[str] = None,
+    archive_dir: str = ARCHIVE_DIR,
+    archive_budget_gb: float = ARCHIVE_BUDGET_BYTES / 2**30,
+    archive_max_age_days: Optional[float] = None,
+    run_label: Optional[str] = None,
+    serve_port: Optional[int] = None,
+    serve_host: str = SERVE_HOST,
+    tile_dir: Optional[str] = None,
+    command: str = RUN,
+    once: bool = False,
+    fps: Optional[float] = None,
+    autoplay: bool = False,
+) -> None:
     """
     Run the main weather data pipeline.
 
     Downloads the latest weather forecasts, processes the data, and displays
-    interactive visualizations. Runs continuously with periodic updates.
+    interactive visualizations. Runs continuously, polling for new runs
+    around the times the sources are expected to publish them. Download,
+    conversion and rendering run as separate stages, and new runs are
+    swapped into the open window.
+
+    Args:
+        headless (bool): Render every map to image files instead of opening
+            the interactive window.
+        output_dir (str): Directory for headless output.
+        processes (int, optional): Worker processes for headless rendering.
+        animate (bool): Also write animations in headless mode.
+        metrics_file (str, optional): Prometheus text file with the pipeline's
+            metrics, rewritten after every stage iteration.
+        metrics_log (str, optional): File every recorded metric is appended
+            to as a JSON line.
+        profiler (str, optional): ``"cprofile"`` or ``"tracemalloc"`` to
+            profile every stage iteration.
+        profile_dir (str): Directory for the cProfile output.
+        memory_budget_mb (int, optional): Memory for decoded field data in
+            MiB. Runs are then decoded a few steps at a time and the viewer
+            keeps only recently shown steps in memory.
+        pack_fields (bool): Keep cached steps packed into 16 bits within the
+            precision of each parameter, so about twice as many fit.
+        regions_file (str, optional): JSON file with the regions to show,
+            replacing the default Global and Scandinavia regions.
+        parameters_file (str, optional): JSON file with the parameter catalog,
+            replacing the default parameters.
+        archive_dir (str): Directory the converted runs are archived in.
+        archive_budget_gb (float): Disk space for archived runs in GiB; the
+            least recently used runs are evicted beyond it.
+        archive_max_age_days (float, optional): Archived runs older than
+            this many days are evicted.
+        run_label (str, optional): Show or render this archived run
+            (YYYYMMDDHH) once instead of running the live pipeline.
+        serve_port (int, optional): Serve map tiles of the newest run (or of
+            ``run_label``) over HTTP on this port instead of showing them.
+        serve_host (str): Address the tile server listens on.
+        tile_dir (str, optional): Directory of the tile cache; ``tiles/`` by
+            default.
+        command (str): ``"run"`` for every stage in this process, or one
+            stage on its own: ``"ingest"``, ``"convert"``, ``"render"`` (the
+            window or image files) or ``"serve"`` (map tiles). Separate
+            stages hand runs on through ``runs/`` and the archive.
+        once (bool): For ``"ingest"`` and ``"convert"``: download or convert
+            once and return, e.g. from cron, instead of polling.
+        fps (float, optional): Time steps per second the window's play button
+            shows; 2 by default.
+        autoplay (bool): Start playing the steps when the window opens, e.g.
+            on a wall display.
     """
     logging.info("Starting weather data pipeline...")
-    last_date_str, last_hour = None, None # Track last processed run
-    try:
-        while True:
-            logging.info("Starting new pipeline iteration...")
-
-            # Download latest forecast data
-            date_str, hour, new_data = download_latest_run(
-                GLOBAL_FORECAST_FILE, SCANDINAVIA_FORECAST_FILE, last_date_str, last_hour
-            )
-
-            if not new_data:
-                logging.info("No new forecast data. Skipping processing.")
-            else:
-                logging.info(f"Processing forecasts for {date_str} {hour:02d} UTC")
+    if metrics_log:
+        configure_json_log(metrics_log)
+    if memory_budget_mb is not None:
+        from loading import set_memory_budget
 
-                # Process Scandinavian data
-                precipitation, u_wind, v_wind, cloud_cover = split_datasets(
-                    SCANDINAVIA_FORECAST_FILE
-                )
-                logging.info("Split Scandinavian datasets successfully")
+        set_memory_budget(memory_budget_mb * 2**20)
+    if pack_fields:
+        from loading import set_field_packing
 
-                # Open datasets and create visualization
-                try:
-                    with xr.open_dataset(
-                        GLOBAL_FORECAST_FILE,
-                        engine="cfgrib",
-                        decode_timedelta=True,
-                        backend_kwargs={"indexpath": ""},
-                    ) as global_dataset, xr.merge(
-                        [precipitation, u_wind, v_wind, cloud_cover], compat="override"
-                    ) as scandinavian_dataset:
-
-                        logging.info("Creating interactive weather visualization...")
-                        plot_all_parameters(global_dataset, scandinavian_dataset)
-                        # Update last processed run
-                        last_date_str, last_hour = date_str, hour
-                except Exception as exc:
-                    logging.error(f"Failed to process datasets: {exc}")
-                    continue
-
-            logging.info(
-                f"Waiting {UPDATE_INTERVAL_SECONDS // 60} minutes before next update..."
-            )
-            time.sleep(UPDATE_INTERVAL_SECONDS)
+        set_field_packing(True)
+    if regions_file:
+        set_regions(load_regions(regions_file))
+    if parameters_file:
+        set_parameters(load_parameters(parameters_file))
+    archive_max_age = (
+        timedelta(days=archive_max_age_days) if archive_max_age_days else None
+    )
+    if command == SERVE and serve_port is None:
+        serve_port = SERVE_PORT
+    # Runs converted by another process are only read
+    read_only = command not in (RUN, CONVERT)
+    if run_label and serve_port is not None:
+        from tiles import TILE_CACHE_DIR, TileServer
 
+        archive = RunArchive(
+            archive_dir, int(archive_budget_gb * 2**30), read_only=read_only
+        )
+        server = TileServer(archive, tile_dir or TILE_CACHE_DIR, processes)
+        server.set_run(archive.get(run_label))
+        server.start(serve_host, serve_port)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            logging.info("Tile server stopped by user.")
+        finally:
+            server.close()
+        return
+    if run_label:
+        archive = RunArchive(
+            archive_dir, int(archive_budget_gb * 2**30), read_only=read_only
+        )
+        show_run(
+            archive.get(run_label),
+            headless=headless,
+            output_dir=output_dir,
+            processes=processes,
+            animate=animate,
+            fps=fps,
+            autoplay=autoplay,
+        )
+        return
+    pipeline = LivePipeline(
+        GLOBAL_FORECAST_FILE,
+        SCANDINAVIA_FORECAST_FILE,
+        headless=headless,
+        output_dir=output_dir,
+        processes=processes,
+        animate=animate,
+        metrics_file=metrics_file,
+        profiler=profiler,
+        profile_dir=profile_dir,
+        archive_dir=archive_dir,
+        archive_budget_bytes=int(archive_budget_gb * 2**30),
+        archive_max_age=archive_max_age,
+        serve_address=(serve_host, serve_port) if serve_port is not None else None,
+        tile_dir=tile_dir,
+        stages=STAGES if command == RUN else [RENDER if command == SERVE else command],
+        fps=fps,
+        autoplay=autoplay,
+    )
+    try:
+        if once and command == INGEST:
+            pipeline.ingest_once()
+        elif once and command == CONVERT:
+            pipeline.convert_pending()
+        else:
+            pipeline.run()
     except KeyboardInterrupt:
         logging.info("Pipeline stopped gracefully by user.")
     except Exception as exc:
         logging.error(f"Pipeline failed with error: {exc}")
         raise
+    finally:
+        pipeline.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments of the pipeline."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=COMMANDS,
+        default=RUN,
+        help="stage to run on its own: download runs (ingest), decode and archive "
+        "them (convert), show or render the newest one (render) or serve its "
+        "tiles (serve); default: every stage in one process (run)",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="ingest/convert: download or convert once and exit instead of polling",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="render all maps to PNG files instead of opening a window",
+    )
+    parser.add_argument(
+        "--output-dir", default=OUTPUT_DIR, help="directory for headless output"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="worker processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--animate", action="store_true", help="also write one animation per map"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Prometheus text file to write the metrics to (e.g. weather.prom)",
+    )
+    parser.add_argument(
+        "--metrics-log", default=None, help="file to append JSON metric records to"
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILERS,
+        default=None,
+        help="profile every download, conversion and render",
+    )
+    parser.add_argument(
+        "--profile-dir", default=PROFILE_DIR, help="directory for cProfile output"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="decode runs a few steps at a time and keep at most MB of fields resident",
+    )
+    parser.add_argument(
+        "--pack-fields",
+        action="store_true",
+        help="keep cached fields packed into 16 bits within each parameter's precision",
+    )
+    parser.add_argument(
+        "--regions",
+        default=None,
+        metavar="FILE",
+        help="JSON file with the regions to show (name, source, bbox)",
+    )
+    parser.add_argument(
+        "--parameters",
+        default=None,
+        metavar="FILE",
+        help="JSON file with the parameter catalog to download and show",
+    )
+    parser.add_argument(
+        "--archive-dir", default=ARCHIVE_DIR, help="directory of the run archive"
+    )
+    parser.add_argument(
+        "--archive-budget",
+        type=float,
+        default=ARCHIVE_BUDGET_BYTES / 2**30,
+        metavar="GB",
+        help="disk space for archived runs; least recently used runs are evicted",
+    )
+    parser.add_argument(
+        "--archive-max-age",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help="evict archived runs older than this",
+    )
+    parser.add_argument(
+        "--run",
+        default=None,
+        metavar="YYYYMMDDHH",
+        help="show or render this archived run instead of following new runs",
+    )
+    parser.add_argument(
+        "--serve",
+        "--port",
+        dest="serve",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="serve XYZ map tiles over HTTP on PORT instead of showing the maps "
+        f"(serve command default: {SERVE_PORT})",
+    )
+    parser.add_argument(
+        "--host", default=SERVE_HOST, help="address the tile server listens on"
+    )
+    parser.add_argument(
+        "--tile-dir", default=None, help="directory of the tile cache (default: tiles)"
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="time steps per second the window's play button shows (default: 2)",
+    )
+    parser.add_argument(
+        "--play",
+        action="store_true",
+        help="start playing the time steps when the window opens",
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    args = parse_args()
+    run_pipeline(
+        headless=args.headless,
+        output_dir=args.output_dir,
+        processes=args.processes,
+        animate=args.animate,
+        metrics_file=args.metrics_file,
+        metrics_log=args.metrics_log,
+        profiler=args.profile,
+        profile_dir=args.profile_dir,
+        memory_budget_mb=args.memory_budget,
+        pack_fields=args.pack_fields,
+        regions_file=args.regions,
+        parameters_file=args.parameters,
+        archive_dir=args.archive_dir,
+        archive_budget_gb=args.archive_budget,
+        archive_max_age_days=args.archive_max_age,
+        run_label=args.run,
+        serve_port=args.serve,
+        serve_host=args.host,
+        tile_dir=args.tile_dir,
+        command=args.command,
+        once=args.once,
+        fps=args.fps,
+        autoplay=args.play,
+    )
@@ -0,0 +1,315 @@
+"""
+Module for the pipeline's timing, size, memory and cache metrics.
+
+Instrumented code records durations and sizes into a process-wide registry. Every recorded
+value is also emitted as one JSON line on the ``metrics`` logger, and the registry can be
+written out in the Prometheus text file format for the node exporter's textfile collector.
+Per-iteration profiling with cProfile or tracemalloc is available through ``profiled``.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Constants
+METRIC_PREFIX = "weather_"
+METRICS_LOGGER = "metrics"
+PROFILERS = ["cprofile", "tracemalloc"]
+PROFILE_TOP = 15  # Functions or allocation sites listed per profiled iteration
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+logger = logging.getLogger(METRICS_LOGGER)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of summaries (count and sum) and gauges (last value).
+
+    Values are keyed by metric name and a set of string labels, like
+    Prometheus series.
+    """
+
+    def __init__(self) -> None:
+        self._summaries: Dict[str, Dict[LabelKey, list]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._caches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Add one observation to a summary, e.g. the duration of a download.
+
+        Args:
+            name: Metric name without prefix.
+            value: Observed value.
+            **labels: Label names and values of the series.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {}).setdefault(key, [0, 0.0])
+            series[0] += 1
+            series[1] += value
+        _log_event(name, value, labels)
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Set the current value of a gauge, e.g. the throughput of the last download.
+
+        Args:
+            name: Metric name without prefix.
+            value: Current value.
+            **labels: Label names and values of the series.
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+        _log_event(name, value, labels)
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """
+        Export the hit rate and size of an ``LRUCache`` with every snapshot.
+
+        Args:
+            name: Label the cache is exported under.
+            cache: Cache with ``hits``, ``misses`` and ``current_bytes``.
+        """
+        with self._lock:
+            self._caches[name] = cache
+
+    def _sample_process(self) -> None:
+        """Update the gauges read from the process and the registered caches."""
+        with self._lock:
+            caches = dict(self._caches)
+        samples = []
+        for name, cache in caches.items():
+            labels = _label_key({"cache": name})
+            samples += [
+                ("cache_hits", labels, cache.hits),
+                ("cache_misses", labels, cache.misses),
+                ("cache_hit_ratio", labels, cache.hit_rate),
+                ("cache_bytes", labels, cache.current_bytes),
+            ]
+        for scope, rss in peak_rss_bytes().items():
+            samples.append(("peak_rss_bytes", _label_key({"process": scope}), rss))
+        with self._lock:
+            for metric, labels, value in samples:
+                self._gauges.setdefault(metric, {})[labels] = value
+
+    def to_prometheus(self) -> str:
+        """
+        Return every series in the Prometheus text exposition format.
+
+        Summaries are exported as ``<name>_count`` and ``<name>_sum``.
+        """
+        self._sample_process()
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._summaries.items()):
+                full_name = f"{METRIC_PREFIX}{name}"
+                lines.append(f"# TYPE {full_name} summary")
+                for key, (count, total) in sorted(series.items()):
+                    labels = _format_labels(key)
+                    lines.append(f"{full_name}_count{labels} {count}")
+                    lines.append(f"{full_name}_sum{labels} {total:.6g}")
+            for name, series in sorted(self._gauges.items()):
+                full_name = f"{METRIC_PREFIX}{name}"
+                lines.append(f"# TYPE {full_name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Write all series to a ``.prom`` file for the node exporter.
+
+        The file is replaced atomically, so the collector never reads a
+        partial file.
+
+        Args:
+            path: Target path, normally ending in ``.prom``.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def clear(self) -> None:
+        """Remove all recorded series; registered caches are kept."""
+        with self._lock:
+            self._summaries.clear()
+            self._gauges.clear()
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _log_event(name: str, value: float, labels: Dict[str, Any]) -> None:
+    """Emit one recorded value as a JSON line on the metrics logger."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            json.dumps(
+                {
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "metric": name,
+                    "value": value,
+                    "labels": {key: str(label) for key, label in labels.items()},
+                    "thread": threading.current_thread().name,
+                }
+            )
+        )
+
+
+registry = MetricsRegistry()
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Add an observation to a summary of the process-wide registry."""
+    registry.observe(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """Set a gauge of the process-wide registry."""
+    registry.set_gauge(name, value, **labels)
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """Export a cache's hit rate and size from the process-wide registry."""
+    registry.register_cache(name, cache)
+
+
+@contextmanager
+def timed(name: str, **labels: Any) -> Iterator[None]:
+    """
+    Record the wall time of a block as an observation of ``name``.
+
+    The time is recorded even if the block raises.
+
+    Args:
+        name: Summary name, normally ending in ``_seconds``.
+        **labels: Label names and values of the series.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start, **labels)
+
+
+def peak_rss_bytes() -> Dict[str, int]:
+    """
+    Return the peak resident set size of this process and its children.
+
+    Returns:
+        Dict[str, int]: Bytes by ``"self"`` and ``"children"`` (the largest
+            finished child, e.g. a render worker; a child forked from a
+            large parent counts at least the parent's size). Empty where
+            the ``resource`` module is not available.
+    """
+    if resource is None:
+        return {}
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def configure_json_log(path: str) -> None:
+    """
+    Write the metrics logger's JSON lines to a file instead of the console.
+
+    Args:
+        path: Log file; appended to.
+    """
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+
+@contextmanager
+def profiled(
+    profiler: Optional[str], directory: str, stage: str, label: str
+) -> Iterator[None]:
+    """
+    Profile one pipeline iteration with cProfile or tracemalloc.
+
+    cProfile covers the calling thread only and its statistics are dumped
+    to ``<directory>/<stage>-<label>.prof``. tracemalloc covers every
+    thread, so allocations of stages running at the same time are included;
+    the top allocation sites since the start of the block are logged and
+    the peak traced memory is recorded.
+
+    Args:
+        profiler: One of ``PROFILERS``, or None to run unprofiled.
+        directory: Directory for profile output.
+        stage: Pipeline stage, e.g. ``"convert"``.
+        label: Iteration within the stage, e.g. the run label.
+    """
+    if profiler is None:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}")
+    name = f"{stage}-{label}"
+
+    if profiler == "cprofile":
+        os.makedirs(directory, exist_ok=True)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            path = os.path.join(directory, f"{name}.prof")
+            profile.dump_stats(path)
+            summary = io.StringIO()
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            logging.info(f"Profile of {name} written to {path}\n{summary.getvalue()}")
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        registry.set_gauge("traced_peak_bytes", peak, stage=stage)
+        top = after.compare_to(before, "lineno")[:PROFILE_TOP]
+        logging.info(
+            f"Allocations of {name} (traced peak {peak / 1e6:.1f} MB):\n"
+            + "\n".join(str(stat) for stat in top)
+        )
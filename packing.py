@@ -0,0 +1,91 @@
+"""
+Module for packing cached forecast fields into 16 bits per value.
+
+A step of a field is kept either as int16 with a scale and offset, like GRIB simple packing,
+or as float16. Every variable has a precision: the largest error packing may add, in the
+units it is stored in. A step is only packed when its value range allows that precision, so
+a field outside its usual range is kept as it is rather than drawn wrongly. Packed steps are
+unpacked when they are read, at the cost of one multiply-add over the step.
+"""
+
+from typing import NamedTuple, Optional
+import numpy as np
+
+# Constants
+INT16 = "int16"  # Scale/offset packing over the step's value range
+FLOAT16 = "float16"  # Half precision; relative error, for bounded non-negative fields
+PACKINGS = [INT16, FLOAT16]
+INT16_MISSING = np.iinfo(np.int16).min  # Marks NaN; the other values span the range
+INT16_STEPS = 2 * int(np.iinfo(np.int16).max)  # Intervals between -32767 and 32767
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+FLOAT16_ERROR = 2.0**-11  # Largest rounding error relative to the value
+
+
+class PackedField(NamedTuple):
+    """A field packed into 16 bits and what is needed to unpack it."""
+
+    data: np.ndarray  # int16 or float16 values
+    scale: float
+    offset: float
+    dtype: np.dtype  # Data type of the unpacked values
+    missing: bool  # Whether int16 data holds INT16_MISSING values
+
+    @property
+    def nbytes(self) -> int:
+        """Return the size of the packed values in bytes."""
+        return self.data.nbytes
+
+    def unpack(self) -> np.ndarray:
+        """Return the values as a read-only array of the original type."""
+        values = self.data.astype(self.dtype)
+        if self.data.dtype != np.float16:
+            values *= self.dtype.type(self.scale)
+            values += self.dtype.type(self.offset)
+            if self.missing:
+                values[self.data == INT16_MISSING] = np.nan
+        values.flags.writeable = False
+        return values
+
+
+def pack(values: np.ndarray, packing: str, precision: float) -> Optional[PackedField]:
+    """
+    Pack a field into 16 bits if that keeps it within a precision.
+
+    Args:
+        values (np.ndarray): Floating point field; NaN marks missing values.
+        packing (str): ``"int16"`` or ``"float16"``.
+        precision (float): Largest absolute error allowed, in the units of
+            ``values``.
+
+    Returns:
+        Optional[PackedField]: The packed field, or None if the field is not
+            floating point, has no finite values or its range does not allow
+            the precision.
+    """
+    if packing not in PACKINGS:
+        raise ValueError(f"Unknown packing {packing}; use one of {PACKINGS}")
+    if not np.issubdtype(values.dtype, np.floating) or values.dtype.itemsize <= 2:
+        return None
+    missing = np.isnan(values)
+    has_missing = bool(missing.any())
+    if has_missing and missing.all():
+        return None
+    low, high = float(np.nanmin(values)), float(np.nanmax(values))
+
+    if packing == FLOAT16:
+        largest = max(abs(low), abs(high))
+        if largest > FLOAT16_MAX or largest * FLOAT16_ERROR > precision:
+            return None
+        return PackedField(values.astype(np.float16), 1.0, 0.0, values.dtype, False)
+
+    # Rounding to the nearest of INT16_STEPS intervals errs by half an interval
+    scale = (high - low) / INT16_STEPS
+    if scale / 2 > precision:
+        return None
+    offset = (high + low) / 2
+    scaled = np.rint((values - offset) / (scale or 1.0))
+    if has_missing:
+        scaled[missing] = INT16_MISSING
+    return PackedField(
+        scaled.astype(np.int16), scale or 1.0, offset, values.dtype, has_missing
+    )
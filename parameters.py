@@ -0,0 +1,320 @@
+"""
+Module with the catalog of forecast parameters.
+
+One entry per parameter drives every stage: the names requested from each source, the GRIB
+keys its messages are decoded by, the variable it is stored as, and how it is drawn. Adding
+a parameter means adding a catalog entry (or loading a catalog from JSON); the download
+request, the decoding, the pyramid levels, the map panels and the map tiles follow from it.
+A parameter can be missing from a source, e.g. wind gusts in the global model; its panels
+are then only drawn for the other source's regions. Each parameter also sets how its cached
+steps may be packed into 16 bits (see ``packing``) and the error that packing may add.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from derived import ACCUMULATED_VARIABLES, WIND_DIRECTION, WIND_SPEED
+from packing import FLOAT16, INT16, PACKINGS
+from regions import GLOBAL_SOURCE, REGIONAL_SOURCE, SOURCES
+
+# Constants
+MESH = "mesh"  # Scalar field drawn as a colored mesh
+VECTORS = "vectors"  # Vector field drawn as arrows colored by speed; fields are [u, v]
+KINDS = [MESH, VECTORS]
+AGGREGATIONS = ["mean", "max", "min"]
+DIRECTION_PRECISION = 0.5  # Packing error of the derived wind direction, in degrees
+
+
+class GribField(NamedTuple):
+    """One GRIB parameter of a source and the variable it is decoded to."""
+
+    request: str  # Parameter name in the source's download request
+    filter_by_keys: Dict[str, Any]  # GRIB keys selecting its messages
+    variable: str  # Variable name of the decoded field
+
+
+class Parameter(NamedTuple):
+    """A forecast parameter: its GRIB fields per source and how it is drawn."""
+
+    name: str  # Display name
+    key: str  # Short identifier, e.g. for tile URLs
+    kind: str
+    fields: Dict[str, List[GribField]]  # By source
+    label: str  # Colorbar label
+    cmap: str
+    limits: Tuple[float, float]  # Color scale limits in display units
+    scale: float = 1.0  # Display value = stored value * scale + offset
+    offset: float = 0.0
+    aggregation: str = "mean"  # Block reduction of the pyramid levels
+    packing: str = INT16  # 16-bit packing of cached steps
+    precision: float = 0.0  # Largest packing error in display units; 0 never packs
+
+
+DEFAULT_PARAMETERS = [
+    Parameter(
+        "Total Precipitation",
+        "precipitation",
+        MESH,
+        {
+            GLOBAL_SOURCE: [GribField("tp", {"shortName": "tp"}, "tp")],
+            REGIONAL_SOURCE: [
+                GribField("PrecipitationAmount", {"shortName": "rain_con"}, "rain_con")
+            ],
+        },
+        "Total Precipitation (m)",
+        "Blues",
+        (0, 0.050),
+        scale=1 / 1000,
+        # The maximum keeps local precipitation peaks visible
+        aggregation="max",
+        precision=1e-5,
+    ),
+    Parameter(
+        "Surface Wind",
+        "wind_speed",
+        VECTORS,
+        {
+            GLOBAL_SOURCE: [
+                GribField("10u", {"shortName": "10u"}, "u10"),
+                GribField("10v", {"shortName": "10v"}, "v10"),
+            ],
+            REGIONAL_SOURCE: [
+                GribField("windums", {"shortName": "10u"}, "u10"),
+                GribField("windvms", {"shortName": "10v"}, "v10"),
+            ],
+        },
+        "Wind speed (m/s)",
+        "coolwarm",
+        (0, 40),
+        precision=0.05,
+    ),
+    Parameter(
+        "Total Cloud Cover",
+        "cloud_cover",
+        MESH,
+        {
+            GLOBAL_SOURCE: [GribField("tcc", {"shortName": "tcc"}, "tcc")],
+            REGIONAL_SOURCE: [
+                GribField(
+                    "totalcloudcover",
+                    {"shortName": "tcc", "typeOfLevel": "entireAtmosphere"},
+                    "tcc",
+                )
+            ],
+        },
+        "Total Cloud Cover (fraction)",
+        "bone",
+        (0, 100),
+        # Bounded to 0-100, where half precision errs by at most 0.05
+        packing=FLOAT16,
+        precision=0.1,
+    ),
+    Parameter(
+        "2 m Temperature",
+        "temperature",
+        MESH,
+        {
+            GLOBAL_SOURCE: [GribField("2t", {"shortName": "2t"}, "t2m")],
+            REGIONAL_SOURCE: [GribField("Temperature", {"shortName": "2t"}, "t2m")],
+        },
+        "2 m Temperature (°C)",
+        "RdYlBu_r",
+        (-30, 30),
+        offset=-273.15,
+        precision=0.05,
+    ),
+    Parameter(
+        "Wind Gust",
+        "wind_gust",
+        MESH,
+        {REGIONAL_SOURCE: [GribField("WindGust", {"shortName": "i10fg"}, "i10fg")]},
+        "Wind gust (m/s)",
+        "YlOrRd",
+        (0, 40),
+        aggregation="max",
+        precision=0.05,
+    ),
+    Parameter(
+        "Mean Sea Level Pressure",
+        "pressure",
+        MESH,
+        {
+            GLOBAL_SOURCE: [GribField("msl", {"shortName": "msl"}, "msl")],
+            REGIONAL_SOURCE: [GribField("Pressure", {"shortName": "msl"}, "msl")],
+        },
+        "Mean sea level pressure (hPa)",
+        "viridis",
+        (960, 1050),
+        scale=1 / 100,
+        precision=0.1,
+    ),
+]
+
+_parameters: Dict[str, Parameter] = {param.name: param for param in DEFAULT_PARAMETERS}
+
+
+def _validate(param: Parameter) -> Parameter:
+    """Check a parameter's kind, sources and fields."""
+    if param.kind not in KINDS:
+        raise ValueError(f"Parameter {param.name}: unknown kind {param.kind}")
+    if param.aggregation not in AGGREGATIONS:
+        raise ValueError(
+            f"Parameter {param.name}: unknown aggregation {param.aggregation}"
+        )
+    if param.packing not in PACKINGS or param.precision < 0:
+        raise ValueError(
+            f"Parameter {param.name}: bad packing {param.packing} "
+            f"with precision {param.precision}"
+        )
+    unknown = set(param.fields) - set(SOURCES)
+    if unknown or not param.fields:
+        raise ValueError(f"Parameter {param.name}: bad sources {sorted(param.fields)}")
+    expected = 2 if param.kind == VECTORS else 1
+    for source, fields in param.fields.items():
+        if len(fields) != expected:
+            raise ValueError(
+                f"Parameter {param.name}: {param.kind} needs {expected} fields "
+                f"per source, {source} has {len(fields)}"
+            )
+    return param
+
+
+def set_parameters(new_parameters: List[Parameter]) -> None:
+    """
+    Replace the parameter catalog.
+
+    Args:
+        new_parameters (List[Parameter]): Parameters in display order.
+
+    Raises:
+        ValueError: If a parameter is invalid or names are not unique.
+    """
+    validated = [_validate(Parameter(*param)) for param in new_parameters]
+    names = [param.name for param in validated]
+    keys = [param.key for param in validated]
+    if not validated or len(set(names)) != len(names) or len(set(keys)) != len(keys):
+        raise ValueError(f"Parameter names and keys must be unique: {names}")
+    _parameters.clear()
+    _parameters.update((param.name, param) for param in validated)
+
+
+def load_parameters(path: str) -> List[Parameter]:
+    """
+    Read a parameter catalog from a JSON file.
+
+    The file holds a list of objects with the ``Parameter`` fields; ``fields``
+    maps each source to a list of ``{"request", "filter_by_keys",
+    "variable"}`` objects, and ``limits`` is a ``[vmin, vmax]`` pair.
+
+    Args:
+        path (str): Path of the JSON file.
+
+    Returns:
+        List[Parameter]: Parameters in file order.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    loaded = [
+        Parameter(
+            **{
+                **entry,
+                "fields": {
+                    source: [GribField(**field) for field in fields]
+                    for source, fields in entry["fields"].items()
+                },
+                "limits": tuple(entry["limits"]),
+            }
+        )
+        for entry in entries
+    ]
+    logging.info(f"Loaded {len(loaded)} parameters from {path}")
+    return loaded
+
+
+def parameters() -> List[Parameter]:
+    """Return the parameters in display order."""
+    return list(_parameters.values())
+
+
+def parameter_names() -> List[str]:
+    """Return the parameter names in display order."""
+    return list(_parameters)
+
+
+def get_parameter(name: str) -> Parameter:
+    """Return a parameter by name or key."""
+    if name in _parameters:
+        return _parameters[name]
+    for param in _parameters.values():
+        if param.key == name:
+            return param
+    raise ValueError(f"Unknown parameter: {name}")
+
+
+def parameter_variables(name: str, source: str) -> Optional[List[str]]:
+    """Return the stored variables of a parameter for a source, or None."""
+    fields = get_parameter(name).fields.get(source)
+    return [field.variable for field in fields] if fields else None
+
+
+def source_fields(source: str) -> List[GribField]:
+    """
+    Return the GRIB fields to download and decode for a source.
+
+    Fields shared by several parameters are listed once.
+    """
+    fields: Dict[str, GribField] = {}
+    for param in _parameters.values():
+        for field in param.fields.get(source, []):
+            fields.setdefault(field.variable, field)
+    return list(fields.values())
+
+
+def request_parameters(source: str) -> List[str]:
+    """Return the parameter names to request from a source."""
+    return list(dict.fromkeys(field.request for field in source_fields(source)))
+
+
+def level_aggregations() -> Dict[str, str]:
+    """Return the pyramid block reduction of every stored scalar variable."""
+    return {
+        field.variable: param.aggregation
+        for param in _parameters.values()
+        if param.kind == MESH
+        for fields in param.fields.values()
+        for field in fields
+    }
+
+
+def variable_packing() -> Dict[str, Tuple[str, float]]:
+    """
+    Return the packing and precision, in stored units, of every packable variable.
+
+    Derived fields are packed like the fields they are computed from; wind
+    direction to ``DIRECTION_PRECISION``.
+    """
+    packings = {}
+    for param in _parameters.values():
+        if param.precision <= 0:
+            continue
+        # Display units are stored units times the scale
+        precision = param.precision / abs(param.scale)
+        for fields in param.fields.values():
+            for field in fields:
+                packings[field.variable] = (param.packing, precision)
+    if "u10" in packings:
+        packings[WIND_SPEED] = packings["u10"]
+        packings[WIND_DIRECTION] = (INT16, DIRECTION_PRECISION)
+    for name, interval_name in ACCUMULATED_VARIABLES.items():
+        if name in packings:
+            packings[interval_name] = packings[name]
+    return packings
+
+
+def display_values(param: Parameter, values: Any) -> Any:
+    """Convert stored values (NumPy or xarray) to the parameter's display units."""
+    if param.scale != 1.0:
+        values = values * param.scale
+    if param.offset:
+        values = values + param.offset
+    return values
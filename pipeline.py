@@ -0,0 +1,580 @@
+"""
+Module for running the live pipeline as overlapping stages.
+
+Ingest, convert and render run in their own workers, connected by bounded queues:
+
+    ingest (download) -> convert (decode to Zarr) -> render (window, image files or tiles)
+
+Each download is snapshotted into a directory of its own under ``runs/``, named after the run
+and the download, so the next cycle (or a corrected copy of the same run) can be downloaded
+while the previous one is still being converted. Converted runs are moved into the run
+archive (see ``archive``) and viewed or rendered from there. In the interactive mode the open
+window keeps showing the previous run until the next one is fully converted, then swaps it in
+without restarting. No stage ever reads a file another stage is writing, so none of them lock.
+
+The stages can also run in separate processes, so each can be scaled on its own: an ingest
+process leaves complete snapshots in ``runs/`` for a convert process, which archives them for
+render or serve processes that open the archive read-only and follow its index. The decoding
+and plotting modules (xarray, Zarr, matplotlib, cartopy) are imported by the stages that use
+them, so an ingest-only process starts without them. It records the last run it ingested in
+``runs/ingested.json``, so a restarted or cron-driven ingest does not download and snapshot
+an unchanged run again.
+"""
+
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, List, Optional, Sequence, Set, Tuple
+from archive import ARCHIVE_BUDGET_BYTES, ARCHIVE_DIR, RunArchive, RunStores
+from digests import file_digest
+from ingesting import download_latest_run
+from metrics import profiled, registry, timed
+from scheduling import PublicationScheduler
+
+# Constants
+RUNS_DIR = "runs"
+QUEUE_SIZE = 1  # A stage works at most one run ahead of the next one
+STOP_CHECK_SECONDS = 1.0
+PROFILE_DIR = "profiles"
+INGEST = "ingest"
+CONVERT = "convert"
+RENDER = "render"  # Window, image files or tiles
+STAGES = [INGEST, CONVERT, RENDER]
+POLL_SECONDS = 10.0  # How often a stage looks for the output of another process
+INGESTED_FILE = "ingested.json"  # Last run ingested, in the runs directory
+SNAPSHOT_TMP_SUFFIX = ".tmp"
+
+
+class LivePipeline:
+    """
+    Staged pipeline with one worker per stage and bounded queues between them.
+
+    A full queue blocks the stage that feeds it, so a slow viewer or renderer
+    holds back conversion and downloads instead of piling up runs.
+    """
+
+    def __init__(
+        self,
+        global_file: str,
+        scandinavia_file: str,
+        headless: bool = False,
+        output_dir: str = "output",
+        processes: Optional[int] = None,
+        animate: bool = False,
+        runs_dir: str = RUNS_DIR,
+        metrics_file: Optional[str] = None,
+        profiler: Optional[str] = None,
+        profile_dir: str = PROFILE_DIR,
+        archive_dir: str = ARCHIVE_DIR,
+        archive_budget_bytes: int = ARCHIVE_BUDGET_BYTES,
+        archive_max_age: Optional[timedelta] = None,
+        serve_address: Optional[Tuple[str, int]] = None,
+        tile_dir: Optional[str] = None,
+        stages: Sequence[str] = STAGES,
+        fps: Optional[float] = None,
+        autoplay: bool = False,
+    ) -> None:
+        """
+        Args:
+            global_file: Download target of the global forecast GRIB file.
+            scandinavia_file: Download target of the Scandinavian GRIB file.
+            headless: Render runs to image files instead of showing a window.
+            output_dir: Directory for headless output.
+            processes: Worker processes for headless rendering.
+            animate: Also write animations in headless mode.
+            runs_dir: Directory the per-run download snapshots are converted in.
+            metrics_file: Prometheus text file rewritten after every stage
+                iteration, e.g. in the node exporter's textfile directory.
+            profiler: ``"cprofile"`` or ``"tracemalloc"`` to profile every
+                stage iteration; see ``metrics.profiled``.
+            profile_dir: Directory for the cProfile output.
+            archive_dir: Directory of the run archive.
+            archive_budget_bytes: Disk space the archived runs may use.
+            archive_max_age: Archived runs older than this are evicted.
+            serve_address: Host and port to serve map tiles of the newest run
+                on, instead of rendering it to a window or image files.
+            tile_dir: Directory of the tile cache; ``tiles.TILE_CACHE_DIR``
+                by default.
+            stages: Stages to run in this process. A stage whose input stage
+                runs elsewhere takes its input from disk: snapshots in
+                ``runs_dir`` for the convert stage, the archive's newest run
+                for the render stage.
+            fps: Time steps per second the window plays at;
+                ``plotting.PLAY_FPS`` by default.
+            autoplay: Start playing the steps when the window opens.
+        """
+        unknown = set(stages) - set(STAGES)
+        if unknown or not stages:
+            raise ValueError(f"Unknown stages {sorted(unknown)}; use some of {STAGES}")
+        self.stages = list(stages)
+        self.global_file = global_file
+        self.scandinavia_file = scandinavia_file
+        self.headless = headless
+        self.output_dir = output_dir
+        self.processes = processes
+        self.animate = animate
+        self.runs_dir = runs_dir
+        self.metrics_file = metrics_file
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        # An ingest-only process leaves the archive to the convert process
+        self.archive: Optional[RunArchive] = None
+        if CONVERT in self.stages or RENDER in self.stages:
+            self.archive = RunArchive(
+                archive_dir,
+                archive_budget_bytes,
+                archive_max_age,
+                read_only=CONVERT not in self.stages,
+            )
+        self.serve_address = serve_address
+        self.tile_dir = tile_dir
+        self.fps = fps
+        self.autoplay = autoplay
+        self.tile_server: Optional[Any] = None  # tiles.TileServer
+        self.scheduler = PublicationScheduler()
+        # Run label and snapshot directory of every ingested download
+        self.ingested: "queue.Queue[Tuple[str, str]]" = queue.Queue(
+            maxsize=QUEUE_SIZE
+        )
+        self.converted: "queue.Queue[RunStores]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Newest run ingested and newest run passed to the render stage
+        self._last_date_str: Optional[str] = None
+        self._last_hour: Optional[int] = None
+        self._shown: Optional[RunStores] = None
+        # An ingest process of its own picks up where the previous one stopped;
+        # with the convert stage, the files on disk are converted first instead
+        if INGEST in self.stages and CONVERT not in self.stages:
+            self._load_ingested()
+
+    def run(self) -> None:
+        """
+        Start the stage workers and block until the pipeline is stopped.
+
+        In the interactive mode the calling thread runs the window and the
+        pipeline stops when it is closed.
+        """
+        logging.basicConfig(level=logging.INFO)
+        if INGEST in self.stages:
+            # A convert process of its own still needs the complete snapshots
+            self._remove_snapshots(partial_only=CONVERT not in self.stages)
+            self._start_worker(self._ingest_stage, INGEST)
+        if CONVERT in self.stages:
+            if INGEST not in self.stages:
+                self._start_worker(self._watch_snapshots, "snapshots")
+            self._start_worker(self._convert_stage, CONVERT)
+        if RENDER not in self.stages:
+            self._stopped.wait()
+        elif self.serve_address is not None:
+            from tiles import TILE_CACHE_DIR, TileServer
+
+            self.tile_server = TileServer(
+                self.archive, self.tile_dir or TILE_CACHE_DIR, self.processes
+            )
+            self.tile_server.start(*self.serve_address)
+            # Serve the newest archived run until the first download is converted
+            self._shown = self.archive.latest()
+            if self._shown is not None:
+                self.tile_server.set_run(self._shown)
+            self._watch_archive_if_needed()
+            self._start_worker(self._serve_stage, "serve")
+            self._stopped.wait()
+        elif self.headless:
+            self._watch_archive_if_needed()
+            self._start_worker(self._render_stage, RENDER)
+            self._stopped.wait()
+        else:
+            self._watch_archive_if_needed()
+            self._view()
+        self.stop()
+
+    def stop(self) -> None:
+        """Ask every stage to finish after its current step."""
+        self._stopped.set()
+        # A running download or render is not interrupted; the workers are
+        # daemon threads and do not keep the interpreter alive
+        for thread in self._threads:
+            thread.join(timeout=STOP_CHECK_SECONDS)
+        self._threads = []
+        # Taken first, so a second call to stop does not close it again
+        tile_server, self.tile_server = self.tile_server, None
+        if tile_server is not None:
+            tile_server.close()
+        self._export_metrics()
+
+    def _start_worker(self, target: Any, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _put(self, stage_queue: queue.Queue, item: Any) -> bool:
+        """Put an item on a queue, waiting for room until stopped."""
+        while not self._stopped.is_set():
+            try:
+                stage_queue.put(item, timeout=STOP_CHECK_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, stage_queue: queue.Queue) -> Optional[Any]:
+        """Take an item from a queue, waiting until one arrives or stopped."""
+        while not self._stopped.is_set():
+            try:
+                return stage_queue.get(timeout=STOP_CHECK_SECONDS)
+            except queue.Empty:
+                continue
+        return None
+
+    @contextmanager
+    def _measured(self, stage: str, label: str) -> Iterator[None]:
+        """Time and optionally profile one stage iteration, then export metrics."""
+        try:
+            with timed("stage_seconds", stage=stage), profiled(
+                self.profiler, self.profile_dir, stage, label
+            ):
+                yield
+        finally:
+            self._export_metrics()
+
+    def _export_metrics(self) -> None:
+        if self.metrics_file is None:
+            return
+        try:
+            registry.write_textfile(self.metrics_file)
+        except OSError as exc:
+            logging.warning(f"Failed to write metrics to {self.metrics_file}: {exc}")
+
+    def _remove_snapshots(self, partial_only: bool = False) -> None:
+        """Remove the snapshots a previous process left unconverted or unfinished."""
+        if not os.path.isdir(self.runs_dir):
+            return
+        for name in os.listdir(self.runs_dir):
+            path = os.path.join(self.runs_dir, name)
+            if os.path.isdir(path) and (
+                not partial_only or name.endswith(SNAPSHOT_TMP_SUFFIX)
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def pending_snapshots(self) -> List[Tuple[str, str]]:
+        """Return the label and directory of every complete snapshot, oldest first."""
+        if not os.path.isdir(self.runs_dir):
+            return []
+        names = sorted(
+            name
+            for name in os.listdir(self.runs_dir)
+            if not name.endswith(SNAPSHOT_TMP_SUFFIX)
+            and os.path.isdir(os.path.join(self.runs_dir, name))
+        )
+        return [
+            (name.split(".")[0], os.path.join(self.runs_dir, name)) for name in names
+        ]
+
+    def _snapshot(self, label: str, version: str) -> str:
+        """
+        Link the downloaded files into a directory of their own.
+
+        The download targets are replaced atomically by the next download, so
+        a hard link keeps this download's contents for the later stages. Every
+        download gets a new directory, so a snapshot is never changed while
+        it is being converted. The directory is filled under a temporary name
+        and then renamed, so a convert process never sees half a snapshot.
+
+        Args:
+            label: Run label (YYYYMMDDHH).
+            version: Name of the download, unique for the run.
+
+        Returns:
+            str: Path of the snapshot directory.
+        """
+        run_dir = os.path.join(self.runs_dir, f"{label}.{version}")
+        tmp_dir = f"{run_dir}{SNAPSHOT_TMP_SUFFIX}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for path in (self.global_file, self.scandinavia_file):
+            target = os.path.join(tmp_dir, os.path.basename(path))
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+        os.replace(tmp_dir, run_dir)
+        return run_dir
+
+    def _load_ingested(self) -> None:
+        """Read the last ingested run recorded by a previous process, if any."""
+        path = os.path.join(self.runs_dir, INGESTED_FILE)
+        try:
+            with open(path) as f:
+                label = json.load(f)["run"]
+            self._last_date_str, self._last_hour = label[:8], int(label[8:])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logging.warning(f"Ignoring unreadable {path}: {exc}")
+            return
+        logging.info(f"Last ingested run: {label}")
+
+    def _save_ingested(self, label: str) -> None:
+        """Record the last ingested run for the next ingest process."""
+        path = os.path.join(self.runs_dir, INGESTED_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"run": label}, f)
+        os.replace(tmp_path, path)
+
+    def _archived(
+        self, label: str, global_file: str, scandinavia_file: str
+    ) -> Optional[RunStores]:
+        """Return a run's archived stores if they were converted from these files."""
+        from converting import store_is_current
+
+        if label not in self.archive:
+            return None
+        run = self.archive.get(label)
+        if store_is_current(
+            run.global_store, file_digest(global_file)
+        ) and store_is_current(run.scandinavia_store, file_digest(scandinavia_file)):
+            return run
+        return None
+
+    def ingest_once(self) -> Optional[Tuple[str, str]]:
+        """
+        Download the newest run if it is new, and snapshot it.
+
+        Returns:
+            Optional[Tuple[str, str]]: Run label and snapshot directory, or
+                None if there was nothing new to convert.
+        """
+        polled = datetime.now(timezone.utc)
+        with self._measured(INGEST, f"{polled:%Y%m%dT%H%M%S}"):
+            date_str, hour, new_data, latest = download_latest_run(
+                self.global_file,
+                self.scandinavia_file,
+                self._last_date_str,
+                self._last_hour,
+            )
+        self.scheduler.record(latest)
+        if date_str is None:
+            logging.info("No forecast run available yet.")
+            return None
+        # On the first iteration, use the files on disk even if unchanged,
+        # unless a previous ingest process already snapshotted them
+        if not new_data and self._last_date_str is not None:
+            logging.info("No new forecast data. Skipping processing.")
+            return None
+        label = f"{date_str}{hour:02d}"
+        run_dir = self._snapshot(label, f"{polled:%Y%m%dT%H%M%S}")
+        self._save_ingested(label)
+        logging.info(f"Ingested run {label}")
+        self._last_date_str, self._last_hour = date_str, hour
+        return label, run_dir
+
+    def convert_snapshot(self, label: str, run_dir: str) -> Optional[RunStores]:
+        """
+        Convert a snapshot into the archive and remove it.
+
+        Args:
+            label: Run label (YYYYMMDDHH).
+            run_dir: Snapshot directory, see ``ingest_once``.
+
+        Returns:
+            Optional[RunStores]: The archived run, or None if it failed.
+        """
+        from converting import convert_run
+
+        global_file = os.path.join(run_dir, os.path.basename(self.global_file))
+        scandinavia_file = os.path.join(
+            run_dir, os.path.basename(self.scandinavia_file)
+        )
+        run = None
+        try:
+            with self._measured(CONVERT, label):
+                run = self._archived(label, global_file, scandinavia_file)
+                if run is None:
+                    global_store, scandinavia_store = convert_run(
+                        global_file, scandinavia_file
+                    )
+                    run = self.archive.add(label, global_store, scandinavia_store)
+                    logging.info(f"Converted run {label}")
+                else:
+                    logging.info(f"Run {label} is already archived")
+        except Exception as exc:
+            logging.error(f"Failed to convert run {label}: {exc}")
+        # The archive keeps the stores; the GRIB snapshot is not needed any more.
+        # A failed one is not retried either: the next download replaces it.
+        shutil.rmtree(run_dir, ignore_errors=True)
+        return run
+
+    def convert_pending(self) -> List[RunStores]:
+        """
+        Convert every complete snapshot on disk, oldest first, then evict.
+
+        Returns:
+            List[RunStores]: The runs archived.
+        """
+        runs = []
+        for label, run_dir in self.pending_snapshots():
+            run = self.convert_snapshot(label, run_dir)
+            if run is not None:
+                runs.append(run)
+        self.archive.evict()
+        return runs
+
+    def _ingest_stage(self) -> None:
+        """Download new runs when the sources are due to publish them."""
+        while not self._stopped.is_set():
+            try:
+                ingested = self.ingest_once()
+                # A convert process of its own finds the snapshot on disk
+                if (
+                    ingested is not None
+                    and CONVERT in self.stages
+                    and not self._put(self.ingested, ingested)
+                ):
+                    return
+            except Exception as exc:
+                logging.error(f"Failed to ingest forecasts: {exc}")
+                self.scheduler.record({name: None for name in self.scheduler.sources})
+
+            self.scheduler.log_status()
+            wait_seconds = self.scheduler.seconds_until_next_poll()
+            logging.info(f"Waiting {wait_seconds / 60:.0f} minutes before next update...")
+            self._stopped.wait(wait_seconds)
+
+    def _watch_snapshots(self) -> None:
+        """Pass the snapshots an ingest process leaves on disk to the convert stage."""
+        queued: Set[str] = set()
+        while not self._stopped.is_set():
+            pending = self.pending_snapshots()
+            # Converted snapshots are removed; forget them
+            queued &= {run_dir for _, run_dir in pending}
+            for label, run_dir in pending:
+                if run_dir in queued:
+                    continue
+                if not self._put(self.ingested, (label, run_dir)):
+                    return
+                queued.add(run_dir)
+            self._stopped.wait(POLL_SECONDS)
+
+    def _convert_stage(self) -> None:
+        """Convert ingested runs to chunked stores."""
+        while not self._stopped.is_set():
+            ingested = self._get(self.ingested)
+            if ingested is None:
+                return
+            run = self.convert_snapshot(*ingested)
+            if run is None:
+                continue
+            if RENDER in self.stages and not self._put(self.converted, run):
+                return
+            # The run before this one has been taken by the render stage, if any
+            self.archive.evict()
+
+    def _watch_archive_if_needed(self) -> None:
+        """Follow the archive for new runs if they are converted in another process."""
+        if CONVERT not in self.stages:
+            self._start_worker(self._watch_archive, "archive")
+
+    def _watch_archive(self) -> None:
+        """Pass the newest run a convert process archives to the render stage."""
+        while not self._stopped.is_set():
+            self.archive.refresh()
+            latest = self.archive.latest()
+            if latest is not None and latest != self._shown:
+                if not self._put(self.converted, latest):
+                    return
+                self._shown = latest
+            self._stopped.wait(POLL_SECONDS)
+
+    def _render_stage(self) -> None:
+        """Render converted runs to image files."""
+        while not self._stopped.is_set():
+            run = self._get(self.converted)
+            if run is None:
+                return
+            try:
+                with self._measured("render", run.label):
+                    show_run(
+                        run,
+                        headless=True,
+                        output_dir=self.output_dir,
+                        processes=self.processes,
+                        animate=self.animate,
+                    )
+            except Exception as exc:
+                logging.error(f"Failed to render run {run.label}: {exc}")
+
+    def _serve_stage(self) -> None:
+        """Serve the tiles of converted runs as they arrive."""
+        while not self._stopped.is_set():
+            run = self._get(self.converted)
+            if run is None:
+                return
+            self.tile_server.set_run(run)
+
+    def _view(self) -> None:
+        """Show the first converted run and swap in later ones as they arrive."""
+        run = self._get(self.converted)
+        if run is None:
+            return
+        show_run(
+            run, updates=self.converted, fps=self.fps, autoplay=self.autoplay
+        )
+
+
+def show_run(
+    run: RunStores,
+    headless: bool = False,
+    output_dir: str = "output",
+    processes: Optional[int] = None,
+    animate: bool = False,
+    updates: Optional[queue.Queue] = None,
+    fps: Optional[float] = None,
+    autoplay: bool = False,
+) -> None:
+    """
+    Show a converted run in the interactive window or render it to image files.
+
+    Works the same for the newest run and for any run taken from the archive.
+
+    Args:
+        run: Stores of the run.
+        headless: Render to image files instead of opening the window.
+        output_dir: Directory for headless output.
+        processes: Worker processes for headless rendering.
+        animate: Also write animations in headless mode.
+        updates: Queue of newer runs to swap into the open window.
+        fps: Time steps per second the window plays at.
+        autoplay: Start playing the steps when the window opens.
+    """
+    if headless:
+        from rendering import render_batch
+
+        render_batch(
+            run.global_store,
+            run.scandinavia_store,
+            output_dir,
+            processes=processes,
+            animate=animate,
+        )
+        return
+    from converting import open_store
+    from plotting import plot_all_parameters
+
+    logging.info(f"Creating interactive weather visualization for run {run.label}")
+    with open_store(run.global_store) as global_dataset, open_store(
+        run.scandinavia_store
+    ) as scandinavian_dataset:
+        plot_all_parameters(
+            global_dataset,
+            scandinavian_dataset,
+            updates=updates,
+            fps=fps,
+            autoplay=autoplay,
+        )
@@ -3,22 +3,54 @@ Module for creating interactive weather visualization plots with parameter and r
 """
 
 import logging
-from typing import List, Set, Tuple, Any
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 import numpy as np
-from matplotlib.widgets import CheckButtons, Slider
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox, TransformedBbox
+from matplotlib.widgets import Button, CheckButtons, Slider
+from basemap import add_basemap, basemap_key
+from caching import LRUCache
+from converting import open_store
+from derived import WIND_SPEED, thinning_slice
+from loading import fit_step_cache, step_values
+from metrics import observe, register_cache, timed
+from parameters import (
+    VECTORS,
+    Parameter,
+    display_values,
+    get_parameter,
+    parameter_names,
+    parameter_variables,
+)
+from pyramid import pyramid_levels, select_level
+from regions import GLOBAL_SOURCE, get_region, region_dataset, region_names
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Constants
-PARAMETER_NAMES = ["Total Precipitation", "Surface Wind", "Total Cloud Cover"]
-REGION_NAMES = ["Global", "Scandinavia"]
-SCANDINAVIA_BBOX = [5, 31, 54, 72]
-GLOBAL_WIND_SCALE = 700
-SCANDINAVIA_WIND_SCALE = 150
+INITIAL_REGIONS = 2  # The first registered regions are shown when the window opens
+# Arrows are spaced evenly on screen in both regions, so they share one scale
+WIND_SCALE = 150
+QUIVER_GRID_CACHE_BYTES = 16 * 1024 * 1024  # Arrow positions per region and zoom
+SUPTITLE_FONTSIZE = 16
+FRAME_CACHE_BYTES = 512 * 1024 * 1024  # Memory budget for pre-rendered frames
+FRAME_BBOX = (0.18, 0.07, 1.0, 1.0)  # Map area in figure coordinates
+UPDATE_CHECK_INTERVAL_MS = 1000  # How often an open window checks for new runs
+PLAY_FPS = 2.0  # Time steps shown per second during playback
+TICKS_PER_FRAME = 2  # Playback timer ticks per frame, so a late tick costs little
+PREFETCH_STEPS = 2  # Steps after the shown one read ahead during playback
+PLAY_BUTTON_AXES = [0.915, 0.02, 0.065, 0.045]  # Right of the time slider
+
+# Thinned arrow grids, shared by all panels and figures
+_quiver_grids = LRUCache(QUIVER_GRID_CACHE_BYTES)
+register_cache("quiver_grids", _quiver_grids)
 
 # -------------------------------
 # Helper functions
@@ -26,8 +58,8 @@ SCANDINAVIA_WIND_SCALE = 150
 
 
 def setup_widgets(
-    fig: plt.Figure, n_steps: int, ds: Any
-) -> Tuple[CheckButtons, CheckButtons, Slider]:
+    fig: plt.Figure, n_steps: int, ds: Any, selected_regions: Set[str]
+) -> Tuple[CheckButtons, CheckButtons, Slider, Any]:
     """
     Create parameter, region checkboxes and time slider widgets.
 
@@ -35,12 +67,16 @@ def setup_widgets(
         fig: The matplotlib figure to add widgets to.
         n_steps: Number of time steps in the dataset.
         ds: The dataset containing step information.
+        selected_regions: Regions whose checkboxes start checked.
 
     Returns:
-        Tuple containing parameter checkboxes, region checkboxes, and time slider.
+        Tuple containing parameter checkboxes, region checkboxes, time slider,
+        and the axes with the slider's step labels.
     """
-    # Parameter checkbuttons
-    ax_param = plt.axes([0.02, 0.5, 0.15, 0.35])
+    # Parameter checkbuttons, the first parameter checked
+    names = parameter_names()
+    height = min(0.35, 0.35 * max(0.5, len(names) / 6))
+    ax_param = plt.axes([0.02, 0.85 - height, 0.15, height])
     fig.text(
         0.02 + 0.075,
         0.82,
@@ -50,10 +86,12 @@ def setup_widgets(
         fontsize=12,
         fontweight="bold",
     )
-    check_param = CheckButtons(ax_param, PARAMETER_NAMES, [True, False, False])
+    check_param = CheckButtons(ax_param, names, [i == 0 for i in range(len(names))])
 
-    # Region checkbuttons
-    ax_region = plt.axes([0.02, 0.25, 0.15, 0.2])
+    # Region checkbuttons, growing downwards with the number of regions
+    names = region_names()
+    height = min(0.4, 0.2 * max(1.0, len(names) / 4))
+    ax_region = plt.axes([0.02, 0.45 - height, 0.15, height])
     fig.text(
         0.02 + 0.075,
         0.42,
@@ -63,7 +101,9 @@ def setup_widgets(
         fontsize=12,
         fontweight="bold",
     )
-    check_region = CheckButtons(ax_region, REGION_NAMES, [True, True])
+    check_region = CheckButtons(
+        ax_region, names, [name in selected_regions for name in names]
+    )
 
     # Time slider
     ax_slider = plt.axes([0.25, 0.03, 0.65, 0.03])
@@ -71,12 +111,37 @@ def setup_widgets(
 
     # Tick labels for time steps
     ax_ticks = plt.axes([0.25, 0.03, 0.65, 0.03], frameon=False)
-    ax_ticks.set_xlim(0, n_steps - 1)
-    ax_ticks.set_xticks(range(0, n_steps, max(1, n_steps // 10)))
-    ax_ticks.set_xticklabels([f"{int(s)}h" for s in ds["step"].values / 3600000000000])
     ax_ticks.get_yaxis().set_ticks([])
+    set_step_range(slider, ax_ticks, ds)
+
+    return check_param, check_region, slider, ax_ticks
+
+
+def set_step_range(slider: Slider, ax_ticks: Any, ds: Any) -> None:
+    """
+    Fit the time slider and its step labels to the steps of a dataset.
+
+    The slider's value is kept, or moved to the last step if it is beyond it,
+    without notifying the slider's observers.
+
+    Args:
+        slider: The time slider.
+        ax_ticks: Axes with the slider's step labels.
+        ds: The dataset containing step information.
+    """
+    n_steps = len(ds["step"])
+    slider.valmax = n_steps - 1
+    slider.ax.set_xlim(slider.valmin, max(slider.valmax, slider.valmin + 1))
+    if slider.val > slider.valmax:
+        eventson, slider.eventson = slider.eventson, False
+        slider.set_val(slider.valmax)
+        slider.eventson = eventson
 
-    return check_param, check_region, slider
+    ticks = range(0, n_steps, max(1, n_steps // 10))
+    hours = ds["step"].values / np.timedelta64(1, "h")
+    ax_ticks.set_xlim(0, max(n_steps - 1, 1))
+    ax_ticks.set_xticks(ticks)
+    ax_ticks.set_xticklabels([f"{int(hours[i])}h" for i in ticks])
 
 
 def update_params(current_params: Set[str], label: str) -> None:
@@ -112,202 +177,1067 @@ def update_regions(current_regions: Set[str], label: str) -> None:
 # -------------------------------
 
 
-def plot_map(
+def valid_time_labels(ds: Any) -> List[str]:
+    """Format the valid time of every step once for the figure title."""
+    return [
+        str(value)[:19].replace("T", ", ") for value in ds["valid_time"].values
+    ]
+
+
+def dataset_extent(ds: Any) -> List[float]:
+    """Return the [lon_min, lon_max, lat_min, lat_max] extent of a dataset."""
+    return [
+        ds.longitude.min().item(),
+        ds.longitude.max().item(),
+        ds.latitude.min().item(),
+        ds.latitude.max().item(),
+    ]
+
+
+def region_view(
+    region: str, ds1: Any, ds2: Any
+) -> Tuple[Any, List[float], Optional[Dict[int, Any]]]:
+    """
+    Return the dataset, map extent and pyramid levels a region is drawn from.
+
+    Crops are cut from the source dataset and from each of its pyramid
+    levels by index slices, so only the region's cells are read and drawn.
+
+    Args:
+        region: Region name.
+        ds1: Global dataset.
+        ds2: Scandinavian (FMI) dataset.
+
+    Returns:
+        The region's dataset, its extent, and its pyramid levels by
+        coarsening factor (None when the source has no pyramid).
+    """
+    info = get_region(region)
+    source_ds = ds1 if info.source == GLOBAL_SOURCE else ds2
+    ds = region_dataset(info, source_ds)
+    extent = list(info.bbox) if info.bbox is not None else dataset_extent(ds)
+    levels = pyramid_levels(source_ds)
+    if len(levels) > 1:
+        levels = {factor: region_dataset(info, lvl) for factor, lvl in levels.items()}
+    else:
+        levels = None
+    return ds, extent, levels
+
+
+def _colorbar_fraction(region: str) -> float:
+    """Return the colorbar width: narrower next to the wide whole-field maps."""
+    return 0.025 if get_region(region).bbox is None else 0.04
+
+
+def selection_key(
+    selected_params: Set[str], selected_regions: Set[str]
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return the selection as ordered tuples, usable as a layout or cache key."""
+    return (
+        tuple(p for p in parameter_names() if p in selected_params),
+        tuple(r for r in region_names() if r in selected_regions),
+    )
+
+
+def playback_order(position: int, n_steps: int, count: int) -> List[int]:
+    """Return ``count`` steps from ``position`` on, wrapping around after the last."""
+    return [(position + offset) % n_steps for offset in range(min(count, n_steps))]
+
+
+class MapRenderer:
+    """
+    Rendering engine that keeps one axes, data artist and colorbar per
+    (parameter, region) panel.
+
+    The layout is only rebuilt when the parameter or region selection changes.
+    A time step change updates the existing artists in place and, when the
+    canvas supports it, redraws them by blitting over a cached background.
+    """
+
+    def __init__(
+        self,
+        fig: plt.Figure,
+        ds1: Any,
+        ds2: Any,
+        suptitle: Any,
+        blit: bool = True,
+        overlays: Optional[List[Any]] = None,
+    ) -> None:
+        """
+        Args:
+            fig: The matplotlib figure.
+            ds1: Global dataset.
+            ds2: Scandinavian dataset.
+            suptitle: Figure suptitle object.
+            blit: Whether to update time steps by blitting.
+            overlays: Extra artists (e.g. the slider axes) redrawn on every blit.
+        """
+        self.fig = fig
+        self.ds1 = ds1
+        self.ds2 = ds2
+        self.suptitle = suptitle
+        self.blit = blit and fig.canvas.supports_blit
+        self.overlays = list(overlays or [])
+        self.panels: List[Dict[str, Any]] = []
+        self.colorbars: List[Any] = []
+        self.selection: Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]] = None
+        self.time_index = 0
+        self.background = None
+        self._stale = False
+        self.time_labels = valid_time_labels(ds1)
+        # Dataset, extent and levels per region, cut once per pair of datasets
+        self.views: Dict[str, Tuple[Any, List[float], Optional[Dict[int, Any]]]] = {}
+
+        suptitle.set_y(1.0)
+        suptitle.set_x(0.6)
+        if self.blit:
+            suptitle.set_animated(True)
+        fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def render(
+        self, selected_params: Set[str], selected_regions: Set[str], time_index: int
+    ) -> None:
+        """
+        Show the selected parameters and regions at the given time step.
+
+        Args:
+            selected_params: Set of selected parameter names.
+            selected_regions: Set of selected region names.
+            time_index: Time step index to show.
+        """
+        if self.prepare(selected_params, selected_regions, time_index):
+            self.fig.canvas.draw_idle()
+        else:
+            self._present()
+
+    def prepare(
+        self, selected_params: Set[str], selected_regions: Set[str], time_index: int
+    ) -> bool:
+        """
+        Bring the panels to the given selection and time step without drawing.
+
+        Args:
+            selected_params: Set of selected parameter names.
+            selected_regions: Set of selected region names.
+            time_index: Time step index to show.
+
+        Returns:
+            True if the layout was rebuilt and needs a full draw.
+        """
+        selection = selection_key(selected_params, selected_regions)
+        if selection != self.selection:
+            self.selection = selection
+            self.time_index = time_index
+            self._stale = False
+            self._build_layout(*selection)
+            return True
+        self._set_step(time_index)
+        return False
+
+    def set_datasets(self, ds1: Any, ds2: Any) -> None:
+        """
+        Replace the datasets; the next render rebuilds the panels from them.
+
+        Args:
+            ds1: Global dataset.
+            ds2: Scandinavian dataset.
+        """
+        self.ds1 = ds1
+        self.ds2 = ds2
+        self.time_labels = valid_time_labels(ds1)
+        self.views = {}
+        self.time_index = min(self.time_index, len(self.time_labels) - 1)
+        self.selection = None
+
+    def set_time(self, time_index: int) -> None:
+        """
+        Update every panel in place to the given time step.
+
+        Args:
+            time_index: Time step index to show.
+        """
+        self._set_step(time_index)
+        self._present()
+
+    def show_frame(self, frame: Any, time_index: int) -> bool:
+        """
+        Blit a pre-rendered frame of the map area instead of drawing it.
+
+        The panel artists are only brought up to date on the next full draw.
+
+        Args:
+            frame: Region copied from an identically sized canvas.
+            time_index: Time step index the frame shows.
+
+        Returns:
+            True if the frame was shown, False if the canvas cannot blit yet.
+        """
+        if not self.blit or self.background is None:
+            return False
+        self.time_index = time_index
+        self._stale = True
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        canvas.restore_region(frame)
+        for overlay in self.overlays:
+            self.fig.draw_artist(overlay)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+        return True
+
+    def _set_step(self, time_index: int) -> None:
+        """Load a time step into the suptitle and every panel."""
+        self.time_index = time_index
+        self._stale = False
+        self.suptitle.set_text(f"Valid time: {self.time_labels[time_index]}")
+        for panel in self.panels:
+            update_panel(panel, time_index)
+
+    def _present(self) -> None:
+        """Show the current artists, by blitting when possible."""
+        if self.blit and self.background is not None:
+            canvas = self.fig.canvas
+            with timed("frame_seconds", mode="blit"):
+                canvas.restore_region(self.background)
+                self._draw_animated()
+                canvas.blit(self.fig.bbox)
+                canvas.flush_events()
+        else:
+            self.fig.canvas.draw_idle()
+
+    def _on_draw(self, event: Any) -> None:
+        """Cache the static background after every full draw."""
+        if self._stale:
+            self._set_step(self.time_index)
+        # After a resize or zoom, draw again at the matching resolution
+        refreshed = [
+            refresh_panel_resolution(panel, self.time_index) for panel in self.panels
+        ]
+        if any(refreshed):
+            self.fig.canvas.draw_idle()
+            return
+        if not self.blit:
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self) -> None:
+        """Draw the artists that change with the time step."""
+        self.fig.draw_artist(self.suptitle)
+        for panel in self.panels:
+            ax = panel["ax"]
+            ax.draw_artist(panel["artist"])
+            # Keep coastlines, borders and the frame on top of the data
+            for decoration in panel["decorations"]:
+                ax.draw_artist(decoration)
+        for overlay in self.overlays:
+            self.fig.draw_artist(overlay)
+
+    def _build_layout(
+        self, selected_params: Tuple[str, ...], selected_regions: Tuple[str, ...]
+    ) -> None:
+        """Replace all panels with a new grid for the given selection."""
+        # Clean up previous plotting axes and colorbars
+        for panel in self.panels:
+            self.fig.delaxes(panel["ax"])
+        for cbar in self.colorbars:
+            cbar.remove()
+
+        self.panels = []
+        self.colorbars = []
+        self.suptitle.set_text(f"Valid time: {self.time_labels[self.time_index]}")
+
+        if not selected_params or not selected_regions:
+            return
+
+        # Grid layout
+        nrows = len(selected_params)
+        ncols = len(selected_regions)
+        widths = [1.5 if get_region(r).bbox is None else 1 for r in selected_regions]
+        gs = self.fig.add_gridspec(
+            nrows,
+            ncols,
+            left=0.25,
+            right=0.95,
+            top=0.95,
+            bottom=0.1,
+            hspace=0.25,
+            wspace=0.25,
+            width_ratios=widths,
+        )
+
+        # Loop over parameters and regions
+        for i, parameter in enumerate(selected_params):
+            for j, region in enumerate(selected_regions):
+                if region not in self.views:
+                    self.views[region] = region_view(region, self.ds1, self.ds2)
+                ds, extent, levels = self.views[region]
+                if not panel_available(parameter, region, ds):
+                    continue
+                self.panels.append(
+                    create_panel(
+                        self.fig,
+                        gs[i, j],
+                        parameter,
+                        region,
+                        ds,
+                        self.time_index,
+                        self.colorbars,
+                        animated=self.blit,
+                        extent=extent,
+                        levels=levels,
+                    )
+                )
+
+
+def create_panel(
     fig: plt.Figure,
-    ds1: Any,
-    ds2: Any,
-    selected_params: Set[str],
-    selected_regions: Set[str],
+    subplot_spec: Any,
+    parameter: str,
+    region: str,
+    ds: Any,
     time_index: int,
-    plot_axes: List[Any],
     colorbars: List[Any],
-    suptitle: Any,
-) -> Tuple[List[Any], List[Any]]:
+    animated: bool = False,
+    extent: Optional[List[float]] = None,
+    levels: Optional[Dict[int, Any]] = None,
+) -> Dict[str, Any]:
     """
-    Draw the selected parameters and regions at the specified time step.
+    Create the axes, data artist and colorbar of one map panel.
 
     Args:
         fig: The matplotlib figure.
-        ds1: Global dataset.
-        ds2: Scandinavian dataset.
-        selected_params: Set of selected parameter names.
-        selected_regions: Set of selected region names.
-        time_index: Current time step index.
-        plot_axes: List of current plot axes to be cleaned up.
-        colorbars: List of current colorbars to be cleaned up.
-        suptitle: Figure suptitle object.
+        subplot_spec: Grid cell to place the panel in.
+        parameter: Name of a catalog parameter (see ``parameters``) that the
+            region's source has.
+        region: Name of a registered region.
+        ds: Dataset of the region, already cropped (see ``region_view``).
+        time_index: Time step index to draw.
+        colorbars: List the new colorbar is appended to.
+        animated: Whether the data artist is drawn by blitting.
+        extent: Map extent; the region's box, or computed from ``ds`` for
+            whole-field regions, when not given.
+        levels: Pyramid levels of ``ds`` by coarsening factor. Mesh
+            parameters are drawn from the level matching the axes size.
 
     Returns:
-        Tuple of new plot axes and colorbars lists.
+        Panel record used by ``update_panel``.
     """
-    # Clean up previous plotting axes and colorbars
-    for ax in plot_axes:
-        fig.delaxes(ax)
-    for cbar in colorbars:
-        cbar.remove()
-
-    plot_axes = []
-    colorbars_new = []
-
-    # Get valid time string from global dataset
-    ds_t_global = ds1.isel(step=time_index)
-    time_str = str(ds_t_global["tp"].coords["valid_time"].values)[:19].replace(
-        "T", ", "
+    start = time.perf_counter()
+    ax = fig.add_subplot(subplot_spec, projection=ccrs.PlateCarree())
+
+    # Select extent and variables based on the region and its source
+    info = get_region(region)
+    if extent is None:
+        extent = list(info.bbox) if info.bbox is not None else dataset_extent(ds)
+    param = get_parameter(parameter)
+    variables = parameter_variables(parameter, info.source)
+
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    level = 1
+    if param.kind == VECTORS or levels is None:
+        levels = None
+    else:
+        levels = {factor: lvl for factor, lvl in levels.items() if variables[0] in lvl}
+        level = _panel_level(ax, levels)
+        ds = levels[level]
+
+    # Plot the parameter as its kind is drawn
+    thinning = None
+    if param.kind == VECTORS:
+        thinning = _quiver_thinning(ax, ds, region)
+        artist = _plot_vectors(
+            ax,
+            ds,
+            time_index,
+            param,
+            variables,
+            region,
+            fig,
+            colorbars,
+            animated,
+            thinning,
+        )
+    else:
+        artist = _plot_field(
+            ax,
+            ds.isel(step=time_index),
+            param,
+            variables[0],
+            region,
+            fig,
+            colorbars,
+            animated,
+        )
+
+    # Coastlines and borders, added once the colorbar has set the axes size
+    basemap, decorations = add_basemap(ax)
+    decorations.append(ax.spines["geo"])
+    observe(
+        "panel_render_seconds",
+        time.perf_counter() - start,
+        parameter=parameter,
+        region=region,
+        kind="create",
     )
 
-    # Update suptitle
-    suptitle.set_y(1.0)
-    suptitle.set_x(0.6)
-    suptitle.set_text(f"Valid time: {time_str}")
-
-    if not selected_params or not selected_regions:
-        fig.canvas.draw_idle()
-        return plot_axes, colorbars_new
-
-    # Grid layout
-    nrows = len(selected_params)
-    ncols = len(selected_regions)
-    widths = [1.5 if r == "Global" else 1 for r in selected_regions]
-    gs = fig.add_gridspec(
-        nrows,
-        ncols,
-        left=0.25,
-        right=0.95,
-        top=0.95,
-        bottom=0.1,
-        hspace=0.25,
-        wspace=0.25,
-        width_ratios=widths,
+    return {
+        "parameter": parameter,
+        "region": region,
+        "ax": ax,
+        "artist": artist,
+        "decorations": decorations,
+        "basemap": basemap,
+        "colorbar": colorbars[-1],
+        "ds": ds,
+        "levels": levels,
+        "level": level,
+        "thinning": thinning,
+        "param": param,
+        "variables": variables,
+    }
+
+
+def panel_available(parameter: str, region: str, ds: Optional[Any] = None) -> bool:
+    """
+    Return True if a region's source has the fields of a parameter, and if
+    given, the region's dataset holds them.
+    """
+    variables = parameter_variables(parameter, get_region(region).source)
+    return variables is not None and (ds is None or all(v in ds for v in variables))
+
+
+def _panel_level(ax: Any, levels: Dict[int, Any]) -> int:
+    """Return the pyramid level whose cells best match the axes' pixels."""
+    longitude = levels[1]["longitude"].values
+    full_span = abs(longitude[-1] - longitude[0]) or 1.0
+    lon_min, lon_max, _, _ = ax.get_extent(crs=ccrs.PlateCarree())
+    visible = min(1.0, (lon_max - lon_min) / full_span)
+    # Shrink the axes to the map's aspect ratio before measuring it
+    ax.apply_aspect()
+    return select_level(levels, len(longitude) * visible, ax.bbox.width)
+
+
+def _quiver_thinning(ax: Any, ds: Any, region: str) -> Dict[str, Any]:
+    """
+    Return the arrow grid for the axes' current size and view.
+
+    Arrows are kept about ``derived.QUIVER_SPACING_PX`` pixels apart on
+    screen and only placed inside the view. Grids are cached per region and
+    zoom.
+    """
+    ax.apply_aspect()
+    lon_min, lon_max, lat_min, lat_max = ax.get_extent(crs=ccrs.PlateCarree())
+    width, height = ax.bbox.width, ax.bbox.height
+    latitude = ds["latitude"].values
+    longitude = ds["longitude"].values
+    key = (
+        region,
+        latitude.shape + longitude.shape,
+        tuple(round(value, 2) for value in (lon_min, lon_max, lat_min, lat_max)),
+        (int(width), int(height)),
     )
+    thinning = _quiver_grids.get(key)
+    if thinning is None:
+        skip = (
+            thinning_slice(latitude, lat_min, lat_max, height),
+            thinning_slice(longitude, lon_min, lon_max, width),
+        )
+        lon, lat = np.meshgrid(longitude[skip[1]], latitude[skip[0]])
+        thinning = {"skip": skip, "lon": lon, "lat": lat}
+        _quiver_grids.put(key, thinning, lon.nbytes + lat.nbytes)
+    return thinning
 
-    # Loop over parameters and regions
-    for i, parameter in enumerate(selected_params):
-        for j, region in enumerate(selected_regions):
-            ax = fig.add_subplot(gs[i, j], projection=ccrs.PlateCarree())
-            plot_axes.append(ax)
-
-            # Select dataset and extent based on region
-            if region == "Scandinavia":
-                ds = ds2
-                extent = SCANDINAVIA_BBOX
-                precipitation_var = "rain_con"
-            else:  # Global
-                ds = ds1
-                extent = [
-                    ds.longitude.min().item(),
-                    ds.longitude.max().item(),
-                    ds.latitude.min().item(),
-                    ds.latitude.max().item(),
-                ]
-                precipitation_var = "tp"
-
-            ds_t = ds.isel(step=time_index)
-            ax.set_extent(extent, crs=ccrs.PlateCarree())
-            ax.add_feature(cfeature.COASTLINE)
-            ax.add_feature(cfeature.BORDERS)
-
-            # Plot each parameter
-            if parameter == "Total Precipitation":
-                _plot_precipitation(
-                    ax, ds_t, precipitation_var, region, fig, colorbars_new
-                )
-            elif parameter == "Surface Wind":
-                _plot_wind(ax, ds_t, region, fig, colorbars_new)
-            elif parameter == "Total Cloud Cover":
-                _plot_cloud_cover(ax, ds_t, region, fig, colorbars_new)
 
-    fig.canvas.draw_idle()
-    return plot_axes, colorbars_new
+def refresh_panel_resolution(panel: Dict[str, Any], time_index: int) -> bool:
+    """
+    Redraw a panel at another resolution if its axes size or zoom changed.
 
+    Precipitation and cloud cover switch pyramid level, wind arrows are
+    thinned again for the new view, and the basemap is taken from the cache
+    entry of the new view.
 
-def _plot_precipitation(
-    ax: Any,
-    ds_t: Any,
-    precipitation_var: str,
-    region: str,
-    fig: plt.Figure,
-    colorbars_new: List[Any],
-) -> None:
-    """Plot precipitation data on the given axes."""
-    tp_m = ds_t[precipitation_var] / 1000
-    im = tp_m.plot(
+    Args:
+        panel: Panel record from ``create_panel``.
+        time_index: Time step index to draw.
+
+    Returns:
+        True if the panel's data artist or basemap was replaced.
+    """
+    basemap_changed = _refresh_basemap(panel)
+    return _refresh_artist(panel, time_index) or basemap_changed
+
+
+def _refresh_basemap(panel: Dict[str, Any]) -> bool:
+    """Replace a panel's coastlines and borders if its view or size changed."""
+    ax = panel["ax"]
+    if basemap_key(ax) == panel["basemap"]:
+        return False
+    spine = panel["decorations"].pop()
+    for artist in panel["decorations"]:
+        artist.remove()
+    basemap, decorations = add_basemap(ax)
+    panel["basemap"] = basemap
+    panel["decorations"] = decorations + [spine]
+    return True
+
+
+def _refresh_artist(panel: Dict[str, Any], time_index: int) -> bool:
+    """Replace a panel's data artist if another resolution fits better."""
+    ax = panel["ax"]
+    old_artist = panel["artist"]
+    animated = old_artist.get_animated()
+
+    if panel["thinning"] is not None:
+        thinning = _quiver_thinning(ax, panel["ds"], panel["region"])
+        if thinning["skip"] == panel["thinning"]["skip"]:
+            return False
+        artist = _quiver(
+            ax,
+            panel["ds"],
+            time_index,
+            panel["param"],
+            panel["variables"],
+            thinning,
+            animated,
+        )
+        panel["thinning"] = thinning
+    else:
+        levels = panel["levels"]
+        if not levels:
+            return False
+        level = _panel_level(ax, levels)
+        if level == panel["level"]:
+            return False
+        ds_t = levels[level].isel(step=time_index)
+        artist = _field_mesh(
+            ax, ds_t, panel["param"], panel["variables"][0], animated
+        )
+        panel.update({"ds": levels[level], "level": level})
+
+    old_artist.remove()
+    panel["colorbar"].update_normal(artist)
+    panel["artist"] = artist
+    return True
+
+
+def update_panel(panel: Dict[str, Any], time_index: int) -> None:
+    """Load one time step into an existing panel's data artist."""
+    ds = panel["ds"]
+    parameter = panel["parameter"]
+    with timed(
+        "panel_render_seconds",
+        parameter=parameter,
+        region=panel["region"],
+        kind="update",
+    ):
+        if panel["param"].kind == VECTORS:
+            u, v, speed = _vector_components(
+                ds, time_index, panel["variables"], panel["thinning"]["skip"]
+            )
+            panel["artist"].set_UVC(u, v, speed)
+        else:
+            values = step_values(ds[panel["variables"][0]], time_index)
+            panel["artist"].set_array(display_values(panel["param"], values))
+
+
+def _field_mesh(
+    ax: Any, ds_t: Any, param: Parameter, variable: str, animated: bool = False
+) -> Any:
+    """Draw the mesh of a scalar parameter at one time step."""
+    return display_values(param, ds_t[variable]).plot(
         ax=ax,
-        cmap="Blues",
+        cmap=param.cmap,
         transform=ccrs.PlateCarree(),
         add_colorbar=False,
-        vmin=0,
-        vmax=0.050,
+        add_labels=False,
+        vmin=param.limits[0],
+        vmax=param.limits[1],
+        animated=animated,
     )
+
+
+def _add_colorbar(
+    fig: plt.Figure,
+    ax: Any,
+    artist: Any,
+    param: Parameter,
+    region: str,
+    colorbars_new: List[Any],
+) -> None:
+    """Add a parameter's colorbar next to its panel and title the panel."""
     cbar = fig.colorbar(
-        im,
+        artist,
         ax=ax,
         orientation="vertical",
         pad=0.02,
-        fraction=0.04 if region == "Scandinavia" else 0.025,
+        fraction=_colorbar_fraction(region),
     )
-    cbar.set_label("Total Precipitation (m)")
+    cbar.set_label(param.label)
     colorbars_new.append(cbar)
-    ax.set_title(f"Total Precipitation ({region})")
+    ax.set_title(f"{param.name} ({region})")
 
 
-def _plot_wind(
-    ax: Any, ds_t: Any, region: str, fig: plt.Figure, colorbars_new: List[Any]
-) -> None:
-    """Plot wind data on the given axes."""
-    skip = (slice(None, None, 10), slice(None, None, 10))
-    lats = ds_t["latitude"].values[skip[0]]
-    lons = ds_t["longitude"].values[skip[1]]
-    u = ds_t["u10"].values[skip]
-    v = ds_t["v10"].values[skip]
-    Lon, Lat = np.meshgrid(lons, lats)
-    wind_speed = np.sqrt(u**2 + v**2)
-    scale = SCANDINAVIA_WIND_SCALE if region == "Scandinavia" else GLOBAL_WIND_SCALE
-    vmin, vmax = 0, 40
-    q = ax.quiver(
-        Lon,
-        Lat,
+def _plot_field(
+    ax: Any,
+    ds_t: Any,
+    param: Parameter,
+    variable: str,
+    region: str,
+    fig: plt.Figure,
+    colorbars_new: List[Any],
+    animated: bool = False,
+) -> Any:
+    """Plot a scalar parameter on the given axes and return the mesh."""
+    im = _field_mesh(ax, ds_t, param, variable, animated)
+    _add_colorbar(fig, ax, im, param, region, colorbars_new)
+    return im
+
+
+def _vector_components(
+    ds: Any, time_index: int, variables: List[str], skip: Tuple[slice, slice]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the thinned u, v and speed arrays of a vector field at one step."""
+    u_var, v_var = variables
+    u = step_values(ds[u_var], time_index)[skip]
+    v = step_values(ds[v_var], time_index)[skip]
+    # The wind speed is stored with the converted run
+    if (u_var, v_var) == ("u10", "v10") and WIND_SPEED in ds:
+        return u, v, step_values(ds[WIND_SPEED], time_index)[skip]
+    return u, v, np.hypot(u, v)
+
+
+def panel_fields(panel: Dict[str, Any]) -> List[Any]:
+    """Return the data arrays a panel reads one step of on every update."""
+    ds = panel["ds"]
+    variables = list(panel["variables"])
+    if (
+        panel["param"].kind == VECTORS
+        and tuple(variables) == ("u10", "v10")
+        and WIND_SPEED in ds
+    ):
+        variables.append(WIND_SPEED)
+    return [ds[variable] for variable in variables]
+
+
+def _quiver(
+    ax: Any,
+    ds: Any,
+    time_index: int,
+    param: Parameter,
+    variables: List[str],
+    thinning: Dict[str, Any],
+    animated: bool = False,
+) -> Any:
+    """Draw the arrows of a vector parameter at one time step on the arrow grid."""
+    u, v, speed = _vector_components(ds, time_index, variables, thinning["skip"])
+    return ax.quiver(
+        thinning["lon"],
+        thinning["lat"],
         u,
         v,
-        wind_speed,
-        cmap="coolwarm",
+        speed,
+        cmap=param.cmap,
         transform=ccrs.PlateCarree(),
-        scale=scale,
-        clim=(vmin, vmax),
-    )
-    cbar = fig.colorbar(
-        q,
-        ax=ax,
-        orientation="vertical",
-        pad=0.02,
-        fraction=0.04 if region == "Scandinavia" else 0.025,
+        scale=WIND_SCALE,
+        clim=param.limits,
+        animated=animated,
     )
-    cbar.set_label("Wind speed (m/s)")
-    colorbars_new.append(cbar)
-    ax.set_title(f"Surface Wind ({region})")
 
 
-def _plot_cloud_cover(
-    ax: Any, ds_t: Any, region: str, fig: plt.Figure, colorbars_new: List[Any]
-) -> None:
-    """Plot cloud cover data on the given axes."""
-    im = ds_t["tcc"].plot(
-        ax=ax,
-        cmap="bone",
-        transform=ccrs.PlateCarree(),
-        add_colorbar=False,
-        vmin=0,
-        vmax=100,
-    )
-    cbar = fig.colorbar(
-        im,
-        ax=ax,
-        orientation="vertical",
-        pad=0.02,
-        fraction=0.04 if region == "Scandinavia" else 0.025,
-    )
-    cbar.set_label("Total Cloud Cover (fraction)")
-    colorbars_new.append(cbar)
-    ax.set_title(f"Total Cloud Cover ({region})")
+def _plot_vectors(
+    ax: Any,
+    ds: Any,
+    time_index: int,
+    param: Parameter,
+    variables: List[str],
+    region: str,
+    fig: plt.Figure,
+    colorbars_new: List[Any],
+    animated: bool = False,
+    thinning: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Plot a vector parameter on the given axes and return the quiver."""
+    if thinning is None:
+        thinning = _quiver_thinning(ax, ds, region)
+    q = _quiver(ax, ds, time_index, param, variables, thinning, animated)
+    _add_colorbar(fig, ax, q, param, region, colorbars_new)
+    return q
+
+
+# -------------------------------
+# Background pre-rendering
+# -------------------------------
+
+
+class FramePrerenderer:
+    """
+    Background worker that renders every time step of the current selection
+    into an LRU frame cache.
+
+    Frames are rendered on an off-screen Agg canvas with the same size as the
+    interactive figure, nearest steps to the slider first, and only cover the
+    map area so they can be blitted without touching the widgets.
+    """
+
+    def __init__(
+        self, fig: plt.Figure, ds1: Any, ds2: Any, cache: Optional[LRUCache] = None
+    ) -> None:
+        """
+        Args:
+            fig: The interactive matplotlib figure.
+            ds1: Global dataset.
+            ds2: Scandinavian dataset.
+            cache: Frame cache; a new one with ``FRAME_CACHE_BYTES`` is created
+                when not given.
+        """
+        self.fig = fig
+        self.ds1 = ds1
+        self.ds2 = ds2
+        self.cache = cache if cache is not None else LRUCache(FRAME_CACHE_BYTES)
+        register_cache("frames", self.cache)
+        self.n_steps = len(ds1["step"])
+        self._selection: Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]] = None
+        self._position = 0
+        self._forward = False
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="frame-prerender", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the worker thread after the frame it is rendering."""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def update(
+        self,
+        selected_params: Set[str],
+        selected_regions: Set[str],
+        position: int,
+        forward: bool = False,
+    ) -> None:
+        """
+        Tell the worker about the current selection and slider position.
+
+        A new selection cancels the frames still queued for the old one.
+
+        Args:
+            selected_params: Set of selected parameter names.
+            selected_regions: Set of selected region names.
+            position: Current time step index of the slider.
+            forward: Render the steps after the position first, wrapping
+                around, as playback shows them.
+        """
+        selection = selection_key(selected_params, selected_regions)
+        with self._lock:
+            if selection != self._selection:
+                self._selection = selection
+                self._generation += 1
+            self._position = position
+            self._forward = forward
+        self._wakeup.set()
+
+    def set_datasets(self, ds1: Any, ds2: Any) -> None:
+        """
+        Replace the datasets and drop every frame rendered from the old ones.
+
+        Args:
+            ds1: Global dataset.
+            ds2: Scandinavian dataset.
+        """
+        with self._lock:
+            self.ds1 = ds1
+            self.ds2 = ds2
+            self.n_steps = len(ds1["step"])
+            self._generation += 1
+            self.cache.clear()
+        self._wakeup.set()
+
+    def get(
+        self, selected_params: Set[str], selected_regions: Set[str], step: int
+    ) -> Any:
+        """
+        Return the cached frame for a selection and step, or None.
+
+        Args:
+            selected_params: Set of selected parameter names.
+            selected_regions: Set of selected region names.
+            step: Time step index.
+        """
+        selection = selection_key(selected_params, selected_regions)
+        return self.cache.get(self._frame_key(selection, self._canvas_size(), step))
+
+    def _canvas_size(self) -> Tuple[int, int, float]:
+        """Return the pixel size and dpi of the interactive figure."""
+        width, height = self.fig.bbox.size
+        return int(width), int(height), self.fig.dpi
+
+    @staticmethod
+    def _frame_key(selection: Any, size: Tuple[int, int, float], step: int) -> Tuple:
+        return selection, size, step
+
+    def _next_step(
+        self,
+        selection: Any,
+        position: int,
+        size: Tuple[int, int, float],
+        forward: bool = False,
+    ) -> Optional[int]:
+        """Return the missing step closest to the slider, or None when done."""
+        if forward:
+            order = playback_order(position, self.n_steps, self.n_steps)
+        else:
+            order = sorted(range(self.n_steps), key=lambda s: (abs(s - position), s))
+        for step in order:
+            if self._frame_key(selection, size, step) not in self.cache:
+                return step
+        return None
+
+    def _build_offscreen(self, size: Tuple[int, int, float]) -> "MapRenderer":
+        """Create an off-screen figure and renderer matching the interactive one."""
+        width, height, dpi = size
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        suptitle = fig.suptitle("", fontsize=SUPTITLE_FONTSIZE)
+        return MapRenderer(fig, self.ds1, self.ds2, suptitle, blit=False)
+
+    def _render_frame(
+        self, renderer: "MapRenderer", selection: Any, step: int
+    ) -> Tuple[Any, int]:
+        """Render one step off-screen and copy the map area."""
+        selected_params, selected_regions = selection
+        with timed("frame_seconds", mode="prerender"):
+            renderer.prepare(set(selected_params), set(selected_regions), step)
+            canvas = renderer.fig.canvas
+            canvas.draw()
+        bbox = TransformedBbox(Bbox.from_extents(*FRAME_BBOX), renderer.fig.transFigure)
+        frame = canvas.copy_from_bbox(bbox)
+        return frame, int(bbox.width * bbox.height * 4)
+
+    def _run(self) -> None:
+        """Worker loop: render missing frames until stopped."""
+        renderer = None
+        built_for = None
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            with self._lock:
+                selection = self._selection
+                position = self._position
+                forward = self._forward
+                generation = self._generation
+            size = self._canvas_size()
+            step = (
+                None
+                if selection is None
+                else self._next_step(selection, position, size, forward)
+            )
+            if step is None:
+                self._wakeup.wait()
+                continue
+
+            try:
+                if built_for != (generation, size):
+                    renderer = self._build_offscreen(size)
+                    built_for = (generation, size)
+                frame, nbytes = self._render_frame(renderer, selection, step)
+            except Exception as exc:
+                with self._lock:
+                    if generation != self._generation:
+                        continue  # The datasets were swapped while rendering
+                logging.error(f"Failed to pre-render frame for step {step}: {exc}")
+                return
+
+            with self._lock:
+                if generation != self._generation:
+                    continue  # Selection changed while rendering, drop the frame
+            self.cache.put(self._frame_key(selection, size, step), frame, nbytes)
+
+
+# -------------------------------
+# Playback
+# -------------------------------
+
+
+class StepPrefetcher:
+    """
+    Background worker that reads the next time steps of the shown fields into
+    the step cache, so playback only has to draw them.
+
+    Only the latest request is kept: a new one abandons the steps still
+    pending for the previous one.
+    """
+
+    def __init__(self) -> None:
+        self._request: Optional[Tuple[List[Any], List[int]]] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="step-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the worker thread after the step it is reading."""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def request(self, fields: List[Any], steps: List[int]) -> None:
+        """
+        Ask for steps of some fields to be read, in the given order.
+
+        Args:
+            fields: Data arrays with a ``step`` dimension.
+            steps: Time step indices, the most urgent first.
+        """
+        with self._lock:
+            self._request = (fields, steps)
+        self._wakeup.set()
+
+    def _fetch(self, fields: List[Any], steps: List[int]) -> None:
+        """Read the requested steps until done or a newer request arrives."""
+        for step in steps:
+            for field in fields:
+                if self._wakeup.is_set():
+                    return
+                with timed("prefetch_seconds"):
+                    step_values(field, step)
+
+    def _run(self) -> None:
+        """Worker loop: read requested steps until stopped."""
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                request, self._request = self._request, None
+            if request is None or self._stopped.is_set():
+                continue
+            try:
+                self._fetch(*request)
+            except Exception as exc:
+                # Playback then reads the step itself and reports the failure
+                logging.warning(f"Failed to prefetch steps {request[1]}: {exc}")
+
+
+class Player:
+    """
+    Play/pause control that steps the time slider at a target frame rate.
+
+    Each tick shows the step that is due by the wall clock since playback
+    started, so frames that miss their deadline are dropped instead of
+    making playback lag. Playback wraps around after the last step.
+    """
+
+    def __init__(
+        self,
+        fig: plt.Figure,
+        slider: Slider,
+        button: Button,
+        fps: float,
+        on_frame: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """
+        Args:
+            fig: The interactive matplotlib figure.
+            slider: Time slider; setting its value shows a step.
+            button: Play/pause button.
+            fps: Target frames, i.e. time steps, per second.
+            on_frame: Called with every step playback shows, e.g. to prefetch
+                the steps after it.
+        """
+        if fps <= 0:
+            raise ValueError(f"Frame rate must be positive, got {fps}")
+        self.slider = slider
+        self.button = button
+        self.fps = fps
+        self.on_frame = on_frame
+        self.playing = False
+        self._start_frame = 0
+        self._start_time = 0.0
+        self._frame = 0
+        self._timer = fig.canvas.new_timer(
+            interval=max(1, int(1000 / (fps * TICKS_PER_FRAME)))
+        )
+        self._timer.add_callback(self.tick)
+        button.on_clicked(self.toggle)
+
+    @property
+    def n_steps(self) -> int:
+        """Return the number of time steps on the slider."""
+        return int(self.slider.valmax) + 1
+
+    def toggle(self, event: Any = None) -> None:
+        """Start or pause playback."""
+        if self.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def play(self) -> None:
+        """Start playback from the current slider position."""
+        self.playing = True
+        self.sync(int(self.slider.val), force=True)
+        self.button.label.set_text("Pause")
+        self.button.ax.figure.canvas.draw_idle()
+        if self.on_frame is not None:
+            self.on_frame(self._frame)
+        self._timer.start()
+        logging.info(f"Playing forecast steps at {self.fps:g} fps")
+
+    def pause(self) -> None:
+        """Pause playback at the step shown."""
+        self.playing = False
+        self._timer.stop()
+        self.button.label.set_text("Play")
+        self.button.ax.figure.canvas.draw_idle()
+
+    def sync(self, step: int, force: bool = False) -> None:
+        """
+        Restart the playback clock at a step moved to by hand.
+
+        Args:
+            step: Time step index the slider shows.
+            force: Restart the clock even if playback is at this step.
+        """
+        if force or step != self._frame % self.n_steps:
+            self._start_frame = self._frame = step
+            self._start_time = time.perf_counter()
+
+    def tick(self) -> None:
+        """Show the step that is due now, skipping any that were missed."""
+        if not self.playing:
+            return
+        elapsed = time.perf_counter() - self._start_time
+        due = self._start_frame + int(elapsed * self.fps)
+        if due <= self._frame:
+            return
+        dropped = due - self._frame - 1
+        if dropped:
+            observe("dropped_frames", dropped)
+        self._frame = due
+        step = due % self.n_steps
+        with timed("frame_seconds", mode="play"):
+            self.slider.set_val(step)
+        if self.on_frame is not None:
+            self.on_frame(step)
+
+    def stop(self) -> None:
+        """Stop the playback timer."""
+        self.playing = False
+        self._timer.stop()
 
 
 # -------------------------------
@@ -315,99 +1245,165 @@ def _plot_cloud_cover(
 # -------------------------------
 
 
-def plot_all_parameters(ds1: Any, ds2: Any) -> None:
+def plot_all_parameters(
+    ds1: Any,
+    ds2: Any,
+    updates: Optional[queue.Queue] = None,
+    fps: Optional[float] = None,
+    autoplay: bool = False,
+) -> None:
     """
     Main function to display interactive weather maps with widgets.
 
     Args:
         ds1: Global weather dataset.
         ds2: Scandinavian weather dataset.
+        updates: Queue of newer runs' stores (``archive.RunStores``). The
+            open window checks it periodically and swaps each run in.
+        fps: Time steps per second shown by the play button; ``PLAY_FPS``
+            when not given.
+        autoplay: Start playing the steps as soon as the window opens.
     """
     try:
-        current_params = set(["Total Precipitation"])
-        current_regions = set(["Scandinavia", "Global"])
+        current_params = set(parameter_names()[:1])
+        current_regions = set(region_names()[:INITIAL_REGIONS])
         current_step = 0
 
         n_steps = len(ds1["step"])
+        fit_step_cache(ds1, ds2)
         fig = plt.figure(figsize=(14, 10))
 
         # Create suptitle (updated every redraw)
-        suptitle = fig.suptitle("", fontsize=16)
+        suptitle = fig.suptitle("", fontsize=SUPTITLE_FONTSIZE)
 
         # Create widgets
-        check_param, check_region, step_slider = setup_widgets(fig, n_steps, ds1)
+        check_param, check_region, step_slider, ax_ticks = setup_widgets(
+            fig, n_steps, ds1, current_regions
+        )
+
+        # When blitting, the slider is kept out of the cached background and
+        # redrawn by the renderer together with the maps
+        renderer = MapRenderer(
+            fig,
+            ds1,
+            ds2,
+            suptitle,
+            overlays=[step_slider.ax, step_slider.label, step_slider.valtext],
+        )
+        if renderer.blit:
+            step_slider.drawon = False
+            step_slider.ax.set_animated(True)
+            step_slider.label.set_animated(True)
+            step_slider.valtext.set_animated(True)
+
+        # Frames are only useful when they can be blitted
+        prerenderer = FramePrerenderer(fig, ds1, ds2) if renderer.blit else None
+        prefetcher = StepPrefetcher()
 
-        # Lists to track plotting axes and colorbars
-        plot_axes = []
-        colorbars = []
+        def prefetch(step: int) -> None:
+            """Read the steps playback shows next while this one is on screen."""
+            fields = [
+                field for panel in renderer.panels for field in panel_fields(panel)
+            ]
+            prefetcher.request(
+                fields, playback_order(step + 1, player.n_steps, PREFETCH_STEPS)
+            )
+
+        play_button = Button(plt.axes(PLAY_BUTTON_AXES), "Play")
+        player = Player(
+            fig, step_slider, play_button, fps or PLAY_FPS, on_frame=prefetch
+        )
 
         # Define callback functions
+        def redraw(step: int) -> None:
+            """Show the current selection at a step, from the frame cache if possible."""
+            if prerenderer is not None:
+                prerenderer.update(
+                    current_params, current_regions, step, forward=player.playing
+                )
+                frame = prerenderer.get(current_params, current_regions, step)
+                if frame is not None and renderer.selection == selection_key(
+                    current_params, current_regions
+                ):
+                    if renderer.show_frame(frame, step):
+                        return
+            renderer.render(current_params, current_regions, step)
+
         def on_param_change(label: str) -> None:
             """Handle parameter selection changes."""
             update_params(current_params, label)
-            nonlocal plot_axes, colorbars
-            plot_axes, colorbars = plot_map(
-                fig,
-                ds1,
-                ds2,
-                current_params,
-                current_regions,
-                int(step_slider.val),
-                plot_axes,
-                colorbars,
-                suptitle,
-            )
+            redraw(int(step_slider.val))
 
         def on_region_change(label: str) -> None:
             """Handle region selection changes."""
             update_regions(current_regions, label)
-            nonlocal plot_axes, colorbars
-            plot_axes, colorbars = plot_map(
-                fig,
-                ds1,
-                ds2,
-                current_params,
-                current_regions,
-                int(step_slider.val),
-                plot_axes,
-                colorbars,
-                suptitle,
-            )
+            redraw(int(step_slider.val))
 
         def on_slider_change(val: float) -> None:
             """Handle time slider changes."""
-            nonlocal plot_axes, colorbars
-            plot_axes, colorbars = plot_map(
-                fig,
-                ds1,
-                ds2,
-                current_params,
-                current_regions,
-                int(val),
-                plot_axes,
-                colorbars,
-                suptitle,
-            )
+            player.sync(int(val))
+            redraw(int(val))
+
+        # Datasets opened here for swapped-in runs, closed when replaced
+        opened: List[Any] = []
+
+        def check_updates() -> None:
+            """Swap in the newest run waiting in the update queue, if any."""
+            run = None
+            try:
+                while True:
+                    run = updates.get_nowait()
+            except queue.Empty:
+                pass
+            if run is None:
+                return
+
+            new_ds1 = open_store(run.global_store)
+            new_ds2 = open_store(run.scandinavia_store)
+            fit_step_cache(new_ds1, new_ds2)
+            if prerenderer is not None:
+                prerenderer.set_datasets(new_ds1, new_ds2)
+            renderer.set_datasets(new_ds1, new_ds2)
+            for ds in opened:
+                ds.close()
+            opened[:] = [new_ds1, new_ds2]
+
+            # The new run may have another number of steps
+            set_step_range(step_slider, ax_ticks, new_ds1)
+            step = int(step_slider.val)
+            player.sync(step)
+            renderer.render(current_params, current_regions, step)
+            if prerenderer is not None:
+                prerenderer.update(
+                    current_params, current_regions, step, forward=player.playing
+                )
+            logging.info(f"Switched to run {run.label}")
 
         # Connect callbacks
         check_param.on_clicked(on_param_change)
         check_region.on_clicked(on_region_change)
         step_slider.on_changed(on_slider_change)
+        if updates is not None:
+            timer = fig.canvas.new_timer(interval=UPDATE_CHECK_INTERVAL_MS)
+            timer.add_callback(check_updates)
+            timer.start()
 
         # Initial draw
-        plot_axes, colorbars = plot_map(
-            fig,
-            ds1,
-            ds2,
-            current_params,
-            current_regions,
-            current_step,
-            plot_axes,
-            colorbars,
-            suptitle,
-        )
+        renderer.render(current_params, current_regions, current_step)
+        if prerenderer is not None:
+            prerenderer.update(current_params, current_regions, current_step)
+            prerenderer.start()
+        prefetcher.start()
+        if autoplay:
+            player.play()
 
         plt.show()
+        player.stop()
+        prefetcher.stop()
+        if prerenderer is not None:
+            prerenderer.stop()
+        for ds in opened:
+            ds.close()
         logging.info("Interactive weather visualization displayed successfully")
 
     except Exception as exc:
@@ -0,0 +1,289 @@
+"""
+Module for point forecasts: time series of every variable at many sites at once.
+
+Both sources use regular latitude/longitude grids, so the grid cell of a site follows from
+index arithmetic on the first coordinate and the spacing; an uneven axis falls back to
+interpolating the index from the coordinate values. The index of a grid is built once and
+cached, and lookups are vectorized over all sites: nearest neighbour reads one value per
+site, step and variable, bilinear interpolation four.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import xarray as xr
+from archive import RunStores
+from converting import open_store
+from derived import WIND_DIRECTION, wind_speed_direction
+from loading import fit_step_cache, step_values
+from regions import GLOBAL_SOURCE, REGIONAL_SOURCE, grid_key
+
+# Constants
+METHODS = ["nearest", "bilinear"]
+REGULAR_TOLERANCE = 1e-4  # Spacing difference, in cells, still treated as regular
+FULL_CIRCLE = 360.0
+
+# Grid indexes by grid key, built once per grid
+_indexes: Dict[Tuple, "GridIndex"] = {}
+
+
+class _Axis:
+    """Turn coordinates on one monotonic grid axis into fractional indices."""
+
+    def __init__(self, values: np.ndarray, periodic_degrees: bool = False) -> None:
+        self.values = np.asarray(values, dtype=np.float64)
+        self.size = len(self.values)
+        self.start = self.values[0]
+        self.spacing = (self.values[-1] - self.start) / max(self.size - 1, 1)
+        steps = np.diff(self.values)
+        self.regular = self.size < 2 or bool(
+            np.all(
+                np.abs(steps - self.spacing) <= REGULAR_TOLERANCE * abs(self.spacing)
+            )
+        )
+        # A longitude axis that closes the circle wraps around between its ends
+        self.periodic = (
+            periodic_degrees
+            and self.regular
+            and self.size > 1
+            and abs(abs(self.spacing) * self.size - FULL_CIRCLE) < abs(self.spacing) / 2
+        )
+        self.degrees = periodic_degrees
+        if not self.regular:
+            ascending = self.values[0] <= self.values[-1]
+            order = np.arange(self.size, dtype=np.float64)
+            self._xp = self.values if ascending else self.values[::-1]
+            self._fp = order if ascending else order[::-1]
+
+    def positions(self, coords: np.ndarray) -> np.ndarray:
+        """Return fractional indices of ``coords``; NaN outside the axis."""
+        coords = np.asarray(coords, dtype=np.float64)
+        if self.degrees:
+            # Bring longitudes into the axis' own 360 degree window
+            low = min(self.values[0], self.values[-1])
+            coords = np.mod(coords - low, FULL_CIRCLE) + low
+        if not self.regular:
+            return np.interp(coords, self._xp, self._fp, left=np.nan, right=np.nan)
+        if self.size < 2:
+            return np.where(coords == self.start, 0.0, np.nan)
+        positions = (coords - self.start) / self.spacing
+        if self.periodic:
+            return np.mod(positions, self.size)
+        outside = (positions < -REGULAR_TOLERANCE) | (
+            positions > self.size - 1 + REGULAR_TOLERANCE
+        )
+        positions = np.clip(positions, 0, self.size - 1)
+        positions[outside] = np.nan
+        return positions
+
+    def neighbours(
+        self, positions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the lower and upper index around each position and its weight."""
+        if self.periodic:
+            lower = np.floor(positions)
+            weight = positions - lower
+            lower = lower.astype(np.intp) % self.size
+            upper = (lower + 1) % self.size
+        else:
+            # The last grid point is the upper neighbour of the cell before it
+            lower = np.minimum(np.floor(positions), max(self.size - 2, 0))
+            weight = positions - lower
+            lower = lower.astype(np.intp)
+            upper = np.minimum(lower + 1, self.size - 1)
+        return lower, upper, weight
+
+    def nearest(self, positions: np.ndarray) -> np.ndarray:
+        """Return the index of the nearest grid point of each position."""
+        nearest = np.rint(positions).astype(np.intp)
+        return nearest % self.size if self.periodic else nearest
+
+
+class GridIndex:
+    """
+    Spatial index of a regular (or rectilinear) latitude/longitude grid.
+
+    ``locate`` returns flat indices into a (latitude, longitude) field and
+    the weight of each, so a lookup is a single ``np.take`` per corner.
+    """
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray) -> None:
+        """
+        Args:
+            latitude: Latitude coordinate of the grid.
+            longitude: Longitude coordinate of the grid.
+        """
+        self.latitude = _Axis(latitude)
+        self.longitude = _Axis(longitude, periodic_degrees=True)
+        self.shape = (self.latitude.size, self.longitude.size)
+
+    def locate(
+        self, latitudes: np.ndarray, longitudes: np.ndarray, method: str = "nearest"
+    ) -> Tuple[List[np.ndarray], List[np.ndarray], np.ndarray]:
+        """
+        Find the grid points to read for every site.
+
+        Args:
+            latitudes: Site latitudes.
+            longitudes: Site longitudes, in any 360 degree window.
+            method: ``"nearest"`` or ``"bilinear"``.
+
+        Returns:
+            Flat indices per corner, the weight per corner, and a mask of the
+            sites inside the grid. Outside sites point at index 0.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}; use one of {METHODS}")
+        y = self.latitude.positions(latitudes)
+        x = self.longitude.positions(longitudes)
+        inside = ~(np.isnan(y) | np.isnan(x))
+        y = np.where(inside, y, 0.0)
+        x = np.where(inside, x, 0.0)
+        n_lon = self.shape[1]
+        if method == "nearest":
+            flat = self.latitude.nearest(y) * n_lon + self.longitude.nearest(x)
+            return [flat], [np.ones(len(flat))], inside
+        y0, y1, wy = self.latitude.neighbours(y)
+        x0, x1, wx = self.longitude.neighbours(x)
+        corners = [y0 * n_lon + x0, y0 * n_lon + x1, y1 * n_lon + x0, y1 * n_lon + x1]
+        weights = [(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx]
+        return corners, weights, inside
+
+    def locate_raster(
+        self, latitudes: np.ndarray, longitudes: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest grid point of every pixel of a latitude/longitude raster.
+
+        Each axis is located once, so a raster of rows x columns costs
+        rows + columns lookups.
+
+        Args:
+            latitudes: Latitude of every raster row.
+            longitudes: Longitude of every raster column.
+
+        Returns:
+            Flat indices and a mask of the pixels inside the grid, both of
+            shape (rows, columns). Outside pixels point at index 0.
+        """
+        y = self.latitude.positions(latitudes)
+        x = self.longitude.positions(longitudes)
+        inside = ~np.isnan(y)[:, None] & ~np.isnan(x)[None, :]
+        rows = self.latitude.nearest(np.nan_to_num(y))
+        columns = self.longitude.nearest(np.nan_to_num(x))
+        flat = rows[:, None] * self.shape[1] + columns[None, :]
+        return np.where(inside, flat, 0), inside
+
+
+def grid_index(ds: xr.Dataset) -> GridIndex:
+    """Return the cached spatial index of a dataset's grid, building it once."""
+    key = grid_key(ds)
+    index = _indexes.get(key)
+    if index is None:
+        index = GridIndex(ds["latitude"].values, ds["longitude"].values)
+        _indexes[key] = index
+    return index
+
+
+def query_points(
+    ds: xr.Dataset,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    method: str = "nearest",
+    variables: Optional[List[str]] = None,
+) -> xr.Dataset:
+    """
+    Return the forecast of every variable and step at many sites.
+
+    Steps are read through the resident step cache (``loading.step_values``),
+    which is first grown to hold every step of the dataset, so repeated
+    queries on the same run do not read the store again. With a memory
+    budget smaller than the run, later queries read the evicted steps again.
+
+    Args:
+        ds (xr.Dataset): Dataset of one source, loaded or opened from a store.
+        latitudes (Sequence[float]): Site latitudes.
+        longitudes (Sequence[float]): Site longitudes.
+        method (str): ``"nearest"`` or ``"bilinear"``.
+        variables (List[str], optional): Variables to return; defaults to
+            every field with step, latitude and longitude dimensions.
+
+    Returns:
+        xr.Dataset: One (step, point) array per variable. Sites outside the
+            grid are NaN. Bilinear wind direction is computed from the
+            interpolated wind components rather than interpolated itself.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64).ravel()
+    longitudes = np.asarray(longitudes, dtype=np.float64).ravel()
+    if latitudes.shape != longitudes.shape:
+        raise ValueError("latitudes and longitudes must have the same length")
+    corners, weights, inside = grid_index(ds).locate(latitudes, longitudes, method)
+    fit_step_cache(ds)
+    if variables is None:
+        variables = [
+            name
+            for name, da in ds.data_vars.items()
+            if {"step", "latitude", "longitude"} <= set(da.dims)
+        ]
+    n_steps = ds.sizes["step"]
+
+    data_vars: Dict[str, Any] = {}
+    for name in variables:
+        da = ds[name].transpose("step", "latitude", "longitude")
+        values = np.empty((n_steps, len(latitudes)), dtype=da.dtype)
+        for step in range(n_steps):
+            field = step_values(da, step).ravel()
+            values[step] = sum(
+                np.take(field, flat) * weight for flat, weight in zip(corners, weights)
+            )
+        values[:, ~inside] = np.nan
+        data_vars[name] = (("step", "point"), values, da.attrs)
+    if method == "bilinear" and WIND_DIRECTION in data_vars and {"u10", "v10"} <= set(
+        data_vars
+    ):
+        _, direction = wind_speed_direction(data_vars["u10"][1], data_vars["v10"][1])
+        attrs = ds[WIND_DIRECTION].attrs
+        data_vars[WIND_DIRECTION] = (("step", "point"), direction, attrs)
+
+    coords = {
+        "step": ds["step"],
+        "latitude": ("point", latitudes),
+        "longitude": ("point", longitudes),
+    }
+    for name in ("time", "valid_time"):
+        if name in ds.coords:
+            coords[name] = ds[name]
+    return xr.Dataset(data_vars, coords=coords, attrs={"method": method})
+
+
+def query_run(
+    run: RunStores,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    source: str = GLOBAL_SOURCE,
+    method: str = "nearest",
+    variables: Optional[List[str]] = None,
+) -> xr.Dataset:
+    """
+    Return point forecasts from the stores of a run, e.g. an archived one.
+
+    Args:
+        run (RunStores): Stores of the run, see ``archive.RunArchive.get``.
+        latitudes (Sequence[float]): Site latitudes.
+        longitudes (Sequence[float]): Site longitudes.
+        source (str): ``"ECMWF"`` or ``"FMI"``.
+        method (str): ``"nearest"`` or ``"bilinear"``.
+        variables (List[str], optional): Variables to return.
+
+    Returns:
+        xr.Dataset: See ``query_points``.
+    """
+    if source not in (GLOBAL_SOURCE, REGIONAL_SOURCE):
+        raise ValueError(f"Unknown source: {source}")
+    store = run.global_store if source == GLOBAL_SOURCE else run.scandinavia_store
+    with open_store(store) as ds:
+        result = query_points(ds, latitudes, longitudes, method, variables)
+    logging.info(
+        f"Queried {len(result['point'])} points from run {run.label} ({source})"
+    )
+    return result
@@ -0,0 +1,139 @@
+"""
+Module for building and reading multi-resolution pyramids of the global fields.
+
+The global 0.25° grid has far more cells than a map panel has pixels. Each run's global store
+therefore also holds coarsened copies of the plotted fields, one group per factor, and the
+plotting code draws the level whose cell size matches the panel's pixel size.
+"""
+
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List
+import xarray as xr
+from parameters import level_aggregations
+
+# Constants
+PYRAMID_FACTORS = [2, 4, 8]
+PYRAMID_GROUP = "pyramid"
+PYRAMID_ATTR = "pyramid_factors"
+OPEN_PYRAMIDS = 4  # Stores whose levels stay open, e.g. the shown run and the next one
+
+# Opened pyramids by store path, least recently used first; viewer, prefetch and
+# tile threads share them
+_open_levels: "OrderedDict[str, Dict[int, xr.Dataset]]" = OrderedDict()
+_open_levels_lock = threading.Lock()
+
+
+def level_group(factor: int) -> str:
+    """Return the Zarr group of the level coarsened by ``factor``."""
+    return f"{PYRAMID_GROUP}/{factor}"
+
+
+def build_pyramid(
+    ds: xr.Dataset, factors: List[int] = PYRAMID_FACTORS
+) -> Dict[int, xr.Dataset]:
+    """
+    Coarsen the plotted fields of a dataset into lower resolution levels.
+
+    Args:
+        ds (xr.Dataset): Full resolution dataset.
+        factors (List[int]): Coarsening factors along latitude and longitude.
+
+    Returns:
+        Dict[int, xr.Dataset]: Lazily coarsened dataset per factor.
+    """
+    # Block reduction per variable, from the parameter catalog
+    aggregations = level_aggregations()
+    variables = [name for name in aggregations if name in ds]
+    levels = {}
+    for factor in factors:
+        blocks = ds[variables].coarsen(
+            latitude=factor, longitude=factor, boundary="trim"
+        )
+        levels[factor] = xr.merge(
+            [
+                getattr(blocks, aggregations[name])()[[name]]
+                for name in variables
+            ],
+            combine_attrs="override",
+        )
+    return levels
+
+
+def pyramid_levels(ds: xr.Dataset) -> Dict[int, xr.Dataset]:
+    """
+    Return every resolution level of a dataset opened from a store.
+
+    The levels of the last few stores stay open, so each is opened once per
+    dataset. Levels dropped from that cache are closed once nothing refers
+    to their full resolution dataset any more, which every holder of the
+    returned levels does.
+
+    Args:
+        ds (xr.Dataset): Full resolution dataset.
+
+    Returns:
+        Dict[int, xr.Dataset]: Dataset per coarsening factor, including
+            ``ds`` itself as factor 1. Only factor 1 is returned for datasets
+            that were not opened from a store with a pyramid.
+    """
+    source = ds.encoding.get("source")
+    factors = ds.attrs.get(PYRAMID_ATTR, [])
+    if not source or not factors:
+        return {1: ds}
+    with _open_levels_lock:
+        levels = _open_levels.get(source)
+        # Not when the store was opened again, e.g. a new run at the same path
+        if levels is not None and levels[1] is ds:
+            _open_levels.move_to_end(source)
+            return levels
+
+    # Opened without the lock, so other stores are not held up
+    levels = {1: ds}
+    for factor in factors:
+        try:
+            levels[factor] = xr.open_zarr(
+                source,
+                group=level_group(factor),
+                consolidated=True,
+                decode_timedelta=True,
+            )
+        except Exception as exc:
+            logging.warning(f"Pyramid level {factor} of {source} unavailable: {exc}")
+    # Callers may still draw from levels the cache drops, so they are closed
+    # only once their dataset is collected, never while the lock is held
+    coarse = {factor: level for factor, level in levels.items() if factor != 1}
+    weakref.finalize(ds, _close_levels, coarse)
+    with _open_levels_lock:
+        _open_levels[source] = levels
+        _open_levels.move_to_end(source)
+        while len(_open_levels) > OPEN_PYRAMIDS:
+            _open_levels.popitem(last=False)
+    return levels
+
+
+def _close_levels(levels: Dict[int, xr.Dataset]) -> None:
+    """Close the coarsened levels of a pyramid; level 1 is the caller's dataset."""
+    for factor, level in levels.items():
+        if factor != 1:
+            level.close()
+
+
+def select_level(
+    levels: Dict[int, Any], n_cells: float, n_pixels: float
+) -> int:
+    """
+    Return the coarsest level that still has at least one cell per pixel.
+
+    Args:
+        levels (Dict[int, Any]): Available levels by coarsening factor.
+        n_cells (float): Full resolution cells across the visible area.
+        n_pixels (float): Pixels across the axes.
+
+    Returns:
+        int: Coarsening factor of the selected level.
+    """
+    suitable = [factor for factor in levels if n_cells / factor >= n_pixels]
+    return max(suitable, default=1)
@@ -0,0 +1,210 @@
+"""
+Module with the registry of map regions.
+
+Every region is drawn from the field of one source: the global ECMWF model or the regional
+FMI HARMONIE model. A region shows either the whole field of its source or a crop of it
+given by a bounding box. Crops are cut with index slices that are computed once per grid,
+so a small region only reads and draws its own grid cells. Regions of the same source share
+one download: FMI is requested once for the union of its regions' boxes.
+"""
+
+import json
+import logging
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+if TYPE_CHECKING:
+    # Only annotations use xarray, which the ingest command never loads
+    import xarray as xr
+
+# Constants
+GLOBAL_SOURCE = "ECMWF"
+REGIONAL_SOURCE = "FMI"
+SOURCES = [GLOBAL_SOURCE, REGIONAL_SOURCE]
+SCANDINAVIA_BBOX = (5.0, 31.0, 54.0, 72.0)  # lon_min, lon_max, lat_min, lat_max
+CROP_MARGIN = 1  # Extra grid cells around a crop, so the edge cells cover its box
+
+BBox = Tuple[float, float, float, float]
+
+
+class Region(NamedTuple):
+    """A map region: the field of ``source``, cropped to ``bbox`` if given."""
+
+    name: str
+    source: str
+    bbox: Optional[BBox] = None  # lon_min, lon_max, lat_min, lat_max
+
+
+DEFAULT_REGIONS = [
+    Region("Global", GLOBAL_SOURCE),
+    Region("Scandinavia", REGIONAL_SOURCE, SCANDINAVIA_BBOX),
+]
+
+_regions: Dict[str, Region] = {region.name: region for region in DEFAULT_REGIONS}
+# Crop index slices per region box and grid
+_crop_slices: Dict[Tuple, Tuple[slice, slice]] = {}
+
+
+def _validate(region: Region) -> Region:
+    """Check a region's source and box, returning it with a float box."""
+    if region.source not in SOURCES:
+        raise ValueError(f"Region {region.name}: unknown source {region.source}")
+    if region.bbox is None:
+        if region.source == REGIONAL_SOURCE:
+            raise ValueError(f"Region {region.name}: FMI regions need a bbox")
+        return region
+    lon_min, lon_max, lat_min, lat_max = (float(value) for value in region.bbox)
+    if not (lon_min < lon_max and lat_min < lat_max):
+        raise ValueError(f"Region {region.name}: empty bbox {region.bbox}")
+    return region._replace(bbox=(lon_min, lon_max, lat_min, lat_max))
+
+
+def set_regions(new_regions: List[Region]) -> None:
+    """
+    Replace the registered regions.
+
+    Args:
+        new_regions (List[Region]): Regions in display order.
+
+    Raises:
+        ValueError: If a region is invalid or names are not unique.
+    """
+    validated = [_validate(Region(*region)) for region in new_regions]
+    names = [region.name for region in validated]
+    if not validated or len(set(names)) != len(names):
+        raise ValueError(f"Region names must be unique and non-empty: {names}")
+    _regions.clear()
+    _regions.update((region.name, region) for region in validated)
+    _crop_slices.clear()
+
+
+def load_regions(path: str) -> List[Region]:
+    """
+    Read regions from a JSON file.
+
+    The file holds a list of objects with ``name``, ``source`` (``"ECMWF"``
+    or ``"FMI"``) and an optional ``bbox`` of
+    ``[lon_min, lon_max, lat_min, lat_max]``.
+
+    Args:
+        path (str): Path of the JSON file.
+
+    Returns:
+        List[Region]: Regions in file order.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    loaded = [
+        Region(
+            entry["name"],
+            entry["source"],
+            tuple(entry["bbox"]) if entry.get("bbox") else None,
+        )
+        for entry in entries
+    ]
+    logging.info(f"Loaded {len(loaded)} regions from {path}")
+    return loaded
+
+
+def regions() -> List[Region]:
+    """Return the registered regions in display order."""
+    return list(_regions.values())
+
+
+def region_names() -> List[str]:
+    """Return the names of the registered regions in display order."""
+    return list(_regions)
+
+
+def get_region(name: str) -> Region:
+    """Return a registered region by name."""
+    try:
+        return _regions[name]
+    except KeyError:
+        raise ValueError(f"Unknown region: {name}") from None
+
+
+def download_bbox(source: str) -> Optional[BBox]:
+    """
+    Return the box to download for a source: the union of its regions' boxes.
+
+    Args:
+        source (str): Source name.
+
+    Returns:
+        Optional[BBox]: Union of the boxes, or None if a region of the source
+            shows its whole field. FMI falls back to ``SCANDINAVIA_BBOX``
+            when it has no regions.
+    """
+    boxes = [region.bbox for region in _regions.values() if region.source == source]
+    if any(bbox is None for bbox in boxes):
+        return None
+    if not boxes:
+        return SCANDINAVIA_BBOX if source == REGIONAL_SOURCE else None
+    lon_min, lon_max, lat_min, lat_max = zip(*boxes)
+    return min(lon_min), max(lon_max), min(lat_min), max(lat_max)
+
+
+def _index_slice(coord: np.ndarray, low: float, high: float) -> slice:
+    """Return the slice of a monotonic coordinate covering [low, high]."""
+    size = len(coord)
+    descending = size > 1 and coord[0] > coord[-1]
+    values = coord[::-1] if descending else coord
+    start = max(int(np.searchsorted(values, low, side="left")) - CROP_MARGIN, 0)
+    stop = min(int(np.searchsorted(values, high, side="right")) + CROP_MARGIN, size)
+    if descending:
+        start, stop = size - stop, size - start
+    return slice(start, stop)
+
+
+def grid_key(ds: "xr.Dataset") -> Tuple:
+    """Return a key identifying the latitude/longitude grid of a dataset."""
+    latitude = ds["latitude"].values
+    longitude = ds["longitude"].values
+    return (
+        (len(latitude), float(latitude[0]), float(latitude[-1])),
+        (len(longitude), float(longitude[0]), float(longitude[-1])),
+    )
+
+
+def crop_slices(region: Region, ds: "xr.Dataset") -> Tuple[slice, slice]:
+    """
+    Return the latitude and longitude index slices of a region's crop.
+
+    The slices are computed once per region box and grid and then reused.
+
+    Args:
+        region (Region): Region with a bounding box.
+        ds (xr.Dataset): Dataset on the grid to crop.
+
+    Returns:
+        Tuple[slice, slice]: Latitude and longitude slices.
+    """
+    key = (region.bbox, grid_key(ds))
+    slices = _crop_slices.get(key)
+    if slices is None:
+        lon_min, lon_max, lat_min, lat_max = region.bbox
+        slices = (
+            _index_slice(ds["latitude"].values, lat_min, lat_max),
+            _index_slice(ds["longitude"].values, lon_min, lon_max),
+        )
+        _crop_slices[key] = slices
+    return slices
+
+
+def region_dataset(region: Region, ds: "xr.Dataset") -> "xr.Dataset":
+    """
+    Return the part of a source dataset that a region shows.
+
+    Args:
+        region (Region): Region to show.
+        ds (xr.Dataset): Dataset of the region's source.
+
+    Returns:
+        xr.Dataset: ``ds`` itself for whole-field regions, otherwise a lazy
+            crop of it.
+    """
+    if region.bbox is None:
+        return ds
+    lat_slice, lon_slice = crop_slices(region, ds)
+    return ds.isel(latitude=lat_slice, longitude=lon_slice)
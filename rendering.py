@@ -0,0 +1,334 @@
+"""
+Module for rendering forecast maps headlessly to image files.
+
+Every step x parameter x region map is rendered as a static PNG, optionally followed by one
+animation per parameter and region. The work is spread over a process pool whose workers open
+the run's stores once and reuse one figure per task, updating its artists from step to step.
+"""
+
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import dask
+import numpy as np
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.image import imread
+from converting import open_store
+from loading import resize_step_cache
+from metrics import observe
+from parameters import Parameter, parameter_names, parameters, set_parameters
+from plotting import (
+    SUPTITLE_FONTSIZE,
+    create_panel,
+    panel_available,
+    region_view,
+    update_panel,
+    valid_time_labels,
+)
+from regions import Region, get_region, region_names, regions, set_regions
+
+# Constants
+RENDER_DPI = 100
+WHOLE_FIELD_FIGSIZE = (12, 6.5)
+CROP_FIGSIZE = (8, 5.5)
+ANIMATION_FPS = 2
+MANIFEST_FILENAME = "manifest.json"
+
+# Datasets opened once per worker process by ``_init_worker``
+_worker_datasets: Dict[str, Any] = {}
+
+
+def _slug(name: str) -> str:
+    """Turn a parameter or region name into a file name part."""
+    return name.lower().replace(" ", "_")
+
+
+def _run_label(ds: Any) -> str:
+    """Return the model run time of a dataset as YYYYMMDDTHH."""
+    return str(np.datetime_as_string(ds["time"].values, unit="h")).replace("-", "")
+
+
+def panel_figsize(region: str) -> Tuple[float, float]:
+    """Return the figure size of a single-panel map of a region."""
+    return WHOLE_FIELD_FIGSIZE if get_region(region).bbox is None else CROP_FIGSIZE
+
+
+def _step_hours(ds: Any) -> List[int]:
+    """Return the forecast steps of a dataset in hours."""
+    return [int(s) for s in ds["step"].values / np.timedelta64(1, "h")]
+
+
+def _init_worker(
+    global_store: str,
+    scandinavia_store: str,
+    worker_regions: List[Region],
+    worker_parameters: List[Parameter],
+) -> None:
+    """
+    Open the run's stores and register the parent's regions and parameters
+    once per worker.
+    """
+    # One process per core already; keep dask from adding its own threads
+    dask.config.set(scheduler="synchronous")
+    # Each worker draws every step once, so keeping steps resident only costs memory
+    resize_step_cache(0)
+    set_regions(worker_regions)
+    set_parameters(worker_parameters)
+    _worker_datasets["global"] = open_store(global_store)
+    _worker_datasets["scandinavia"] = open_store(scandinavia_store)
+
+
+def _render_frames(
+    parameter: str, region: str, steps: List[int], out_dir: str
+) -> List[Dict[str, Any]]:
+    """
+    Render one parameter and region for a range of steps in a worker process.
+
+    The figure is built once; later steps only update the panel's artists.
+
+    Returns:
+        List[Dict[str, Any]]: One manifest entry per written image.
+    """
+    ds, extent, levels = region_view(
+        region, _worker_datasets["global"], _worker_datasets["scandinavia"]
+    )
+    labels = valid_time_labels(ds)
+    hours = _step_hours(ds)
+
+    fig = Figure(figsize=panel_figsize(region), dpi=RENDER_DPI)
+    FigureCanvasAgg(fig)
+    suptitle = fig.suptitle("", fontsize=SUPTITLE_FONTSIZE)
+    gs = fig.add_gridspec(1, 1, left=0.05, right=0.9, top=0.88, bottom=0.05)
+    panel = create_panel(
+        fig, gs[0, 0], parameter, region, ds, steps[0], [], extent=extent, levels=levels
+    )
+
+    entries = []
+    for i, step in enumerate(steps):
+        start = time.perf_counter()
+        if i > 0:
+            update_panel(panel, step)
+        suptitle.set_text(f"Valid time: {labels[step]}")
+        path = os.path.join(
+            out_dir, f"{_slug(parameter)}_{_slug(region)}_{hours[step]:03d}h.png"
+        )
+        fig.savefig(path)
+        entries.append(
+            {
+                "parameter": parameter,
+                "region": region,
+                "step": step,
+                "step_hours": hours[step],
+                "valid_time": labels[step],
+                "path": path,
+                "render_seconds": round(time.perf_counter() - start, 4),
+            }
+        )
+    return entries
+
+
+def _render_animation(frame_paths: List[str], target: str, fps: int) -> str:
+    """
+    Combine rendered frames into an animation.
+
+    MP4 is written when ffmpeg is available, otherwise an animated GIF.
+
+    Returns:
+        str: Path of the written animation.
+    """
+    if animation.writers.is_available("ffmpeg"):
+        writer = animation.FFMpegWriter(fps=fps)
+        target = f"{target}.mp4"
+    else:
+        writer = animation.PillowWriter(fps=fps)
+        target = f"{target}.gif"
+
+    first = imread(frame_paths[0])
+    height, width = first.shape[:2]
+    fig = Figure(figsize=(width / RENDER_DPI, height / RENDER_DPI), dpi=RENDER_DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    image = ax.imshow(first)
+    with writer.saving(fig, target, RENDER_DPI):
+        for path in frame_paths:
+            image.set_data(imread(path))
+            writer.grab_frame()
+    return target
+
+
+def _split_steps(n_steps: int, n_chunks: int) -> List[List[int]]:
+    """Split the step range into at most ``n_chunks`` contiguous chunks."""
+    size = max(1, math.ceil(n_steps / max(1, n_chunks)))
+    return [list(range(i, min(i + size, n_steps))) for i in range(0, n_steps, size)]
+
+
+def _render_maps(
+    global_store: str,
+    scandinavia_store: str,
+    combinations: List[Tuple[str, str, int]],
+    run_dir: str,
+    processes: int,
+    animate: bool,
+    fps: int,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Render the frames, and optionally the animations, of maps in a process pool.
+
+    Args:
+        global_store (str): Path of the global Zarr store.
+        scandinavia_store (str): Path of the Scandinavian Zarr store.
+        combinations (List[Tuple[str, str, int]]): Parameter, region and
+            number of steps of every map; at least one.
+        run_dir (str): Directory the images are written to.
+        processes (int): Number of worker processes.
+        animate (bool): Also write one animation per map.
+        fps (int): Frames per second of the animations.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Manifest entries of
+            the frames and of the animations.
+    """
+    # Enough tasks to keep every worker busy, each reusing its figure for several steps
+    chunks_per_map = max(1, math.ceil(processes / len(combinations)))
+    tasks = [
+        (parameter, region, steps)
+        for parameter, region, n_steps in combinations
+        for steps in _split_steps(n_steps, chunks_per_map)
+    ]
+
+    frames: List[Dict[str, Any]] = []
+    animations: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(global_store, scandinavia_store, regions(), parameters()),
+    ) as pool:
+        futures = [
+            pool.submit(_render_frames, parameter, region, steps, run_dir)
+            for parameter, region, steps in tasks
+        ]
+        for future in futures:
+            frames.extend(future.result())
+        # The workers' own metrics stay in their processes
+        for entry in frames:
+            observe(
+                "panel_render_seconds",
+                entry["render_seconds"],
+                parameter=entry["parameter"],
+                region=entry["region"],
+                kind="frame",
+            )
+
+        if animate:
+            animation_futures = {}
+            for parameter, region, _ in combinations:
+                paths = [
+                    entry["path"]
+                    for entry in sorted(frames, key=lambda e: e["step"])
+                    if (entry["parameter"], entry["region"]) == (parameter, region)
+                ]
+                target = os.path.join(run_dir, f"{_slug(parameter)}_{_slug(region)}")
+                animation_futures[(parameter, region)] = pool.submit(
+                    _render_animation, paths, target, fps
+                )
+            for (parameter, region), future in animation_futures.items():
+                animations.append(
+                    {"parameter": parameter, "region": region, "path": future.result()}
+                )
+    return frames, animations
+
+
+def render_batch(
+    global_store: str,
+    scandinavia_store: str,
+    output_dir: str,
+    processes: Optional[int] = None,
+    animate: bool = False,
+    fps: int = ANIMATION_FPS,
+) -> str:
+    """
+    Render every step, parameter and region of a run to static images.
+
+    Args:
+        global_store (str): Path of the global Zarr store.
+        scandinavia_store (str): Path of the Scandinavian Zarr store.
+        output_dir (str): Directory the run's output directory is created in.
+        processes (int, optional): Number of worker processes. Defaults to
+            the number of CPUs.
+        animate (bool): Also write one animation per parameter and region.
+        fps (int): Frames per second of the animations.
+
+    Returns:
+        str: Path of the run manifest listing all outputs.
+    """
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+
+    with open_store(global_store) as global_dataset, open_store(
+        scandinavia_store
+    ) as scandinavian_dataset:
+        run_label = _run_label(global_dataset)
+        # Each region's own source sets its steps, so FMI and ECMWF may differ
+        combinations: List[Tuple[str, str, int]] = []
+        for region in region_names():
+            ds = region_view(region, global_dataset, scandinavian_dataset)[0]
+            combinations.extend(
+                (parameter, region, ds.sizes["step"])
+                for parameter in parameter_names()
+                if panel_available(parameter, region, ds)
+            )
+    run_dir = os.path.join(output_dir, run_label)
+    os.makedirs(run_dir, exist_ok=True)
+
+    processes = processes or os.cpu_count() or 1
+    frames: List[Dict[str, Any]] = []
+    animations: List[Dict[str, Any]] = []
+    if combinations:
+        frames, animations = _render_maps(
+            global_store,
+            scandinavia_store,
+            combinations,
+            run_dir,
+            processes,
+            animate,
+            fps,
+        )
+        logging.info(
+            f"Rendered {len(frames)} frames in {time.perf_counter() - start:.1f} s"
+        )
+    else:
+        logging.warning(
+            f"No parameter is available in any region of run {run_label}; "
+            "nothing to render"
+        )
+
+    elapsed = time.perf_counter() - start
+    manifest = {
+        "run": run_label,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "global_store": os.path.abspath(global_store),
+        "scandinavia_store": os.path.abspath(scandinavia_store),
+        "processes": processes,
+        "elapsed_seconds": round(elapsed, 3),
+        "frames": sorted(
+            frames, key=lambda e: (e["parameter"], e["region"], e["step"])
+        ),
+        "animations": animations,
+    }
+    manifest_path = os.path.join(run_dir, MANIFEST_FILENAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    logging.info(f"Batch rendering finished in {elapsed:.1f} s: {manifest_path}")
+    return manifest_path
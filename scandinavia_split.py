@@ -3,71 +3,48 @@ Module for splitting weather datasets from GRIB files into separate parameter da
 """
 
 import logging
-from typing import Tuple
+from typing import List
 import xarray as xr
+from grib_index import load_index, open_indexed_datasets
+from parameters import source_fields
+from regions import REGIONAL_SOURCE
 
 
-def split_datasets(
-    filename: str,
-) -> Tuple[xr.Dataset, xr.Dataset, xr.Dataset, xr.Dataset]:
+def split_datasets(filename: str) -> List[xr.Dataset]:
     """
     Split a GRIB file into separate datasets for each weather parameter.
 
+    The file is scanned once to build a message index, and every parameter
+    of the catalog is then decoded from its own messages only, in parallel.
+
     Args:
         filename (str): Path to the GRIB file to split.
 
     Returns:
-        Tuple[xr.Dataset, xr.Dataset, xr.Dataset, xr.Dataset]:
-            Tuple containing datasets for precipitation, u-wind, v-wind, and total cloud cover.
+        List[xr.Dataset]: One dataset per FMI field of the parameter catalog
+            found in the file, e.g. precipitation, u-wind, v-wind and total
+            cloud cover.
     """
     logging.basicConfig(level=logging.INFO)
 
     try:
-        # Common backend kwargs to avoid index path issues
-        backend_kwargs = {"indexpath": ""}
+        # One scan of the file serves all parameters
+        index = load_index(filename)
 
         # Open individual datasets for each parameter
-        precipitation = xr.open_dataset(
-            filename,
-            engine="cfgrib",
-            decode_timedelta=True,
-            filter_by_keys={"shortName": "rain_con"},
-            backend_kwargs=backend_kwargs,
-        )
-
-        u_wind_10m = xr.open_dataset(
-            filename,
-            engine="cfgrib",
-            decode_timedelta=True,
-            filter_by_keys={"shortName": "10u"},
-            backend_kwargs=backend_kwargs,
-        )
-
-        v_wind_10m = xr.open_dataset(
-            filename,
-            engine="cfgrib",
-            decode_timedelta=True,
-            filter_by_keys={"shortName": "10v"},
-            backend_kwargs=backend_kwargs,
-        )
-
-        total_cloud_cover = xr.open_dataset(
+        datasets = open_indexed_datasets(
             filename,
-            engine="cfgrib",
-            decode_timedelta=True,
-            filter_by_keys={"shortName": "tcc", "typeOfLevel": "entireAtmosphere"},
-            backend_kwargs=backend_kwargs,
+            [field.filter_by_keys for field in source_fields(REGIONAL_SOURCE)],
+            index,
         )
 
         logging.info(f"Successfully split datasets from {filename}")
 
         # Close the datasets to free up resources
-        precipitation.close()
-        u_wind_10m.close()
-        v_wind_10m.close()
-        total_cloud_cover.close()
+        for ds in datasets:
+            ds.close()
 
-        return precipitation, u_wind_10m, v_wind_10m, total_cloud_cover
+        return datasets
 
     except Exception as exc:
         logging.error(f"Failed to split datasets from {filename}: {exc}")
@@ -0,0 +1,160 @@
+"""
+Module for scheduling polls around the expected publication times of forecast cycles.
+
+ECMWF AIFS and FMI HARMONIE both run at 00/06/12/18 UTC and publish their output some hours
+later. Instead of polling at a fixed interval, each source is polled densely, with backoff,
+inside its publication window and left alone between windows.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+# Constants
+CYCLE_HOURS = [0, 6, 12, 18]
+CYCLE_INTERVAL = timedelta(hours=6)
+# Expected publication window of each source, as delays after the cycle time
+PUBLICATION_WINDOWS: Dict[str, Tuple[timedelta, timedelta]] = {
+    "ECMWF": (timedelta(hours=5), timedelta(hours=9)),
+    "FMI": (timedelta(hours=2), timedelta(hours=5)),
+}
+MIN_POLL_INTERVAL = timedelta(minutes=2)
+MAX_POLL_INTERVAL = timedelta(minutes=20)
+BACKOFF_FACTOR = 2
+
+
+def cycle_start(moment: datetime) -> datetime:
+    """Return the most recent cycle time at or before ``moment``."""
+    hour = max(h for h in CYCLE_HOURS if h <= moment.hour)
+    return moment.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+
+class SourceSchedule:
+    """
+    Polling state of one data source.
+
+    The source is expected to publish a cycle between ``window_start`` and
+    ``window_end`` after the cycle time. Until that cycle is seen, polls start
+    at ``MIN_POLL_INTERVAL`` and back off up to ``MAX_POLL_INTERVAL``. Once it
+    is seen, the next poll is at the start of the following cycle's window.
+    """
+
+    def __init__(
+        self, name: str, window_start: timedelta, window_end: timedelta
+    ) -> None:
+        """
+        Args:
+            name: Source name used in log messages.
+            window_start: Earliest expected publication delay.
+            window_end: Latest expected publication delay.
+        """
+        self.name = name
+        self.window_start = window_start
+        self.window_end = window_end
+        self.last_cycle: Optional[datetime] = None
+        self.interval = MIN_POLL_INTERVAL
+        self.next_poll = datetime.min.replace(tzinfo=timezone.utc)
+
+    def expected_cycle(self, now: datetime) -> datetime:
+        """Return the newest cycle whose publication window has started."""
+        return cycle_start(now - self.window_start)
+
+    def is_current(self, now: datetime) -> bool:
+        """Return True if the newest expected cycle has already been seen."""
+        if self.last_cycle is None:
+            return False
+        return self.last_cycle >= self.expected_cycle(now)
+
+    def record(self, now: datetime, cycle: Optional[datetime]) -> None:
+        """
+        Record the result of a poll and schedule the next one.
+
+        Args:
+            now: Time of the poll.
+            cycle: Newest cycle available from this source, or None if the
+                poll failed.
+        """
+        due = now >= self.next_poll
+        new = cycle is not None and (
+            self.last_cycle is None or cycle > self.last_cycle
+        )
+        if new:
+            self.last_cycle = cycle
+        if not (due or new):
+            # Polled on behalf of another source; keep this source's backoff
+            return
+
+        if self.is_current(now):
+            # Sleep until the following cycle can be published
+            following = self.expected_cycle(now) + CYCLE_INTERVAL
+            self.next_poll = following + self.window_start
+            self.interval = MIN_POLL_INTERVAL
+            return
+
+        expected = self.expected_cycle(now)
+        if now < expected + self.window_end:
+            # Inside the window: poll densely, backing off
+            self.next_poll = now + self.interval
+            self.interval = min(self.interval * BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+        else:
+            # Publication is late: keep checking at the slowest rate
+            self.next_poll = now + MAX_POLL_INTERVAL
+
+
+class PublicationScheduler:
+    """Decides when to poll next, tracking each source separately."""
+
+    def __init__(
+        self, windows: Optional[Dict[str, Tuple[timedelta, timedelta]]] = None
+    ) -> None:
+        """
+        Args:
+            windows: Publication window per source; defaults to
+                ``PUBLICATION_WINDOWS``.
+        """
+        windows = windows if windows is not None else PUBLICATION_WINDOWS
+        self.sources = {
+            name: SourceSchedule(name, start, end)
+            for name, (start, end) in windows.items()
+        }
+
+    def record(
+        self, results: Dict[str, Optional[datetime]], now: Optional[datetime] = None
+    ) -> None:
+        """
+        Record the newest cycle each source delivered in the last poll.
+
+        Args:
+            results: Newest available cycle per source name, None on failure.
+            now: Time of the poll; defaults to the current UTC time.
+        """
+        now = now or datetime.now(timezone.utc)
+        for name, cycle in results.items():
+            self.sources[name].record(now, cycle)
+
+    def next_poll(self) -> datetime:
+        """Return the time of the earliest poll due for any source."""
+        return min(source.next_poll for source in self.sources.values())
+
+    def seconds_until_next_poll(self, now: Optional[datetime] = None) -> float:
+        """
+        Return how long to sleep before the next poll.
+
+        Args:
+            now: Current time; defaults to the current UTC time.
+        """
+        now = now or datetime.now(timezone.utc)
+        return max(0.0, (self.next_poll() - now).total_seconds())
+
+    def log_status(self) -> None:
+        """Log the last seen cycle and next poll of every source."""
+        for source in self.sources.values():
+            last = (
+                f"{source.last_cycle:%Y-%m-%d %H} UTC"
+                if source.last_cycle is not None
+                else "none"
+            )
+            logging.info(
+                f"{source.name}: last cycle {last}, "
+                f"next poll {source.next_poll:%Y-%m-%d %H:%M} UTC"
+            )
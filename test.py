@@ -1,8 +1,594 @@
-from ecmwf_client import download_forecast
+from datetime import datetime, timedelta, timezone
+import gc
+import http.client
+import json
+import os
+import dask.array as da
+import eccodes
+import numpy as np
+import pytest
+import xarray as xr
+import archive as archive_module
+import ingesting
+import pipeline
+from archive import RunArchive
+from derived import deaccumulate
+from grib_index import extract_subset, load_index, select_messages
+from ingesting import _commit_download, _download_ecmwf, _ecmwf_params, _ecmwf_url
+from loading import (
+    STEP_CACHE_BYTES,
+    STEP_CACHE_MAX_BYTES,
+    fit_step_cache,
+    resize_step_cache,
+    set_memory_budget,
+)
+from packing import FLOAT16, FLOAT16_ERROR, INT16, INT16_MISSING, pack
+from parameters import parameter_names, parameter_variables
+from points import query_points
+from regions import (
+    GLOBAL_SOURCE,
+    REGIONAL_SOURCE,
+    SCANDINAVIA_BBOX,
+    Region,
+    crop_slices,
+    region_dataset,
+)
+from rendering import render_batch
+from scheduling import (
+    MAX_POLL_INTERVAL,
+    MIN_POLL_INTERVAL,
+    PUBLICATION_WINDOWS,
+    PublicationScheduler,
+)
+from tiles import TILE_SIZE, TileServer, layers, run_key, tile_coordinates
 
-def test_download_forecast(monkeypatch):
+def test_download_ecmwf(tmp_path):
     class DummyClient:
         def retrieve(self, **kwargs):
             assert "target" in kwargs
-    monkeypatch.setattr("ecmwf_client.Client", lambda source: DummyClient())
-    download_forecast("test.grib")
\ No newline at end of file
+            with open(kwargs["target"], "wb") as f:
+                f.write(b"GRIB")
+    target = tmp_path / "test.grib"
+    params = _ecmwf_params(datetime(2026, 1, 1, tzinfo=timezone.utc))
+    n_bytes, _, changed = _download_ecmwf(
+        DummyClient(), {**params, "target": str(target)}
+    )
+    assert n_bytes == 4 and changed
+    assert target.read_bytes() == b"GRIB"
+
+
+def test_query_points_reads_store_once():
+    class CountingArray:
+        """Array that counts the reads dask makes from it, like a store."""
+
+        def __init__(self, values):
+            self.values = values
+            self.shape = values.shape
+            self.dtype = values.dtype
+            self.ndim = values.ndim
+            self.reads = 0
+
+        def __getitem__(self, key):
+            self.reads += 1
+            return self.values[key]
+
+    latitude = np.linspace(90, -90, 181)
+    longitude = np.linspace(-180, 179, 360)
+    step = np.arange(9) * np.timedelta64(6, "h")
+    variables = sorted(
+        {
+            variable
+            for name in parameter_names()
+            for variable in parameter_variables(name, GLOBAL_SOURCE) or []
+        }
+    )
+    rng = np.random.default_rng(0)
+    arrays = {
+        name: CountingArray(
+            rng.normal(size=(len(step), len(latitude), len(longitude))).astype(
+                np.float32
+            )
+        )
+        for name in variables
+    }
+    ds = xr.Dataset(
+        {
+            name: (
+                ("step", "latitude", "longitude"),
+                da.from_array(array, chunks=(1, len(latitude), len(longitude))),
+            )
+            for name, array in arrays.items()
+        },
+        coords={"step": step, "latitude": latitude, "longitude": longitude},
+    )
+    # The full catalog must outgrow the cache for the test to mean anything
+    resize_step_cache(ds.nbytes // 4)
+    try:
+        query_points(ds, [60.0, -33.9], [24.9, 18.4])
+        reads = sum(array.reads for array in arrays.values())
+        query_points(ds, [60.0, -33.9], [24.9, 18.4])
+        assert sum(array.reads for array in arrays.values()) == reads
+    finally:
+        resize_step_cache(STEP_CACHE_BYTES)
+
+
+def test_failed_download_is_retried_soon(tmp_path, monkeypatch):
+    cycle = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    now = datetime(2026, 1, 1, 18, 30, tzinfo=timezone.utc)
+
+    def failing_download(*args):
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(ingesting, "Client", lambda **kwargs: None)
+    monkeypatch.setattr(
+        ingesting,
+        "probe_available_cycles",
+        lambda client, cycles: {"FMI": [cycle], "ECMWF": [cycle]},
+    )
+    monkeypatch.setattr(ingesting, "_download_fmi", failing_download)
+    monkeypatch.setattr(ingesting, "_download_ecmwf", failing_download)
+    date_str, hour, new_data, latest = ingesting.download_latest_run(
+        str(tmp_path / "global.grib"), str(tmp_path / "scandinavia.grib"), "20260101", 6
+    )
+    assert (date_str, hour, new_data) == ("20260101", 6, False)
+
+    scheduler = PublicationScheduler()
+    scheduler.record(latest, now)
+    # Not the start of the following cycle's window (20:00 UTC for FMI)
+    assert scheduler.next_poll() == now + MIN_POLL_INTERVAL
+
+
+def test_ecmwf_probe_url():
+    class DummyClient:
+        url = "https://data.ecmwf.int/forecasts"
+        model = "aifs-single"
+        resol = "0p25"
+
+    cycle = datetime(2026, 1, 1, 18, tzinfo=timezone.utc)
+    assert _ecmwf_url(DummyClient(), cycle, 48) == (
+        "https://data.ecmwf.int/forecasts/20260101/18z/aifs-single/0p25/oper/"
+        "20260101180000-48h-oper-fc.grib2"
+    )
+
+
+def test_ingest_once_remembers_last_run(tmp_path, monkeypatch):
+    global_file = tmp_path / "global.grib"
+    scandinavia_file = tmp_path / "scandinavia.grib"
+    global_file.write_bytes(b"GRIB")
+    scandinavia_file.write_bytes(b"GRIB")
+    calls = []
+
+    def fake_download(target_global, target_scandinavia, last_date_str, last_hour):
+        calls.append((last_date_str, last_hour))
+        new_data = (last_date_str, last_hour) != ("20260101", 12)
+        return "20260101", 12, new_data, {"FMI": None, "ECMWF": None}
+
+    monkeypatch.setattr(pipeline, "download_latest_run", fake_download)
+
+    def ingest_process():
+        return pipeline.LivePipeline(
+            str(global_file),
+            str(scandinavia_file),
+            runs_dir=str(tmp_path / "runs"),
+            stages=[pipeline.INGEST],
+        ).ingest_once()
+
+    assert ingest_process()[0] == "2026010112"
+    # A second cron run neither downloads nor snapshots the same run again
+    assert ingest_process() is None
+    assert calls == [(None, None), ("20260101", 12)]
+    snapshots = pipeline.LivePipeline(
+        str(global_file),
+        str(scandinavia_file),
+        runs_dir=str(tmp_path / "runs"),
+        archive_dir=str(tmp_path / "archive"),
+    ).pending_snapshots()
+    assert [label for label, _ in snapshots] == ["2026010112"]
+
+
+def test_step_cache_bounded_without_budget():
+    def run(n_steps):
+        zeros = da.zeros((n_steps, 721, 1440), dtype=np.float32, chunks=(1, 721, 1440))
+        return xr.Dataset(
+            {f"var{i}": (("step", "latitude", "longitude"), zeros) for i in range(9)}
+        )
+
+    set_memory_budget(None)
+    try:
+        # Far more steps than fit: the cache stops at its maximum
+        assert fit_step_cache(run(200)) == STEP_CACHE_MAX_BYTES
+        # A smaller run swapped in lets it shrink back
+        assert fit_step_cache(run(1)) == STEP_CACHE_BYTES
+    finally:
+        resize_step_cache(STEP_CACHE_BYTES)
+
+
+def test_render_batch_without_panels(tmp_path):
+    # Stores holding no parameter, so no panel of any region can be drawn
+    coords = {
+        "time": np.datetime64("2026-01-01T12", "ns"),
+        "step": np.arange(3) * np.timedelta64(1, "h"),
+        "latitude": np.linspace(70.0, 50.0, 21),
+        "longitude": np.linspace(0.0, 40.0, 41),
+    }
+    stores = []
+    for name in ["global.zarr", "scandinavia.zarr"]:
+        xr.Dataset(coords=coords).to_zarr(tmp_path / name, consolidated=True)
+        stores.append(str(tmp_path / name))
+
+    manifest_path = render_batch(*stores, str(tmp_path / "frames"), processes=2)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest["run"] == "20260101T12"
+    assert manifest["frames"] == [] and manifest["animations"] == []
+
+
+def write_grib(path, fields):
+    """Write one small GRIB2 message per (shortName, step) and return their bytes."""
+    messages = []
+    for short_name, step in fields:
+        handle = eccodes.codes_grib_new_from_samples("GRIB2")
+        eccodes.codes_set(handle, "shortName", short_name)
+        eccodes.codes_set(handle, "step", step)
+        messages.append(eccodes.codes_get_message(handle))
+        eccodes.codes_release(handle)
+    with open(path, "wb") as f:
+        f.write(b"".join(messages))
+    return messages
+
+
+def test_grib_index_and_subset(tmp_path):
+    grib = tmp_path / "run.grib"
+    messages = write_grib(grib, [("2t", 0), ("10u", 0), ("2t", 3), ("10u", 3)])
+
+    index = load_index(str(grib))
+    assert [(m["shortName"], m["step"]) for m in index["messages"]] == [
+        ("2t", 0),
+        ("10u", 0),
+        ("2t", 3),
+        ("10u", 3),
+    ]
+    assert [m["length"] for m in index["messages"]] == [len(m) for m in messages]
+    # A second load reads the sidecar instead of scanning the file again
+    assert load_index(str(grib)) == index
+
+    subset = extract_subset(str(grib), index, {"shortName": "2t"})
+    with open(subset, "rb") as f:
+        assert f.read() == messages[0] + messages[2]
+    assert extract_subset(str(grib), index, {"shortName": "2t"}) == subset
+    assert not [p for p in os.listdir(index["directory"]) if p.endswith(".tmp")]
+    with pytest.raises(ValueError):
+        extract_subset(str(grib), index, {"shortName": "msl"})
+    with pytest.raises(ValueError):
+        select_messages(index, {"centre": "ecmf"})
+
+    # New contents get a new index and the stale one is removed
+    write_grib(grib, [("2t", 6)])
+    new_index = load_index(str(grib))
+    assert new_index["directory"] != index["directory"]
+    assert not os.path.exists(index["directory"])
+
+
+def test_fmi_download_conditional_and_resumed(tmp_path, monkeypatch):
+    class FakeResponse:
+        def __init__(self, status_code, body=b"", headers=None):
+            self.status_code = status_code
+            self.body = body
+            self.headers = headers or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            assert self.status_code < 400
+
+        def iter_content(self, chunk_size):
+            yield from [self.body] if self.body else []
+
+    class FakeSession:
+        def __init__(self):
+            self.requests = []
+            self.responses = []
+
+        def get(self, url, headers, **kwargs):
+            self.requests.append(headers)
+            return self.responses.pop(0)
+
+    session = FakeSession()
+    monkeypatch.setattr(ingesting, "_get_session", lambda: session)
+    run = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    target = tmp_path / "scandinavia.grib"
+
+    session.responses.append(FakeResponse(200, b"GRIB1", {"ETag": '"v1"'}))
+    n_bytes, _, changed = ingesting._download_fmi(run, str(target))
+    assert (n_bytes, changed) == (5, True)
+    assert target.read_bytes() == b"GRIB1"
+    assert session.requests[-1] == {}
+
+    # The same file is asked for conditionally and not rewritten
+    session.responses.append(FakeResponse(304))
+    assert ingesting._download_fmi(run, str(target))[::2] == (0, False)
+    assert session.requests[-1]["If-None-Match"] == '"v1"'
+
+    # An interrupted download of a new version continues where it stopped
+    part_path = tmp_path / "scandinavia.grib.2026010112.part"
+    part_path.write_bytes(b"GRIB")
+    with open(f"{part_path}.json", "w") as f:
+        json.dump({"url": ingesting._fmi_url(run), "etag": '"v2"'}, f)
+    session.responses.append(FakeResponse(206, b"2", {"ETag": '"v2"'}))
+    n_bytes, _, changed = ingesting._download_fmi(run, str(target))
+    assert session.requests[-1]["Range"] == "bytes=4-"
+    assert session.requests[-1]["If-Range"] == '"v2"'
+    assert (n_bytes, changed) == (1, True)
+    assert target.read_bytes() == b"GRIB2"
+    assert not part_path.exists() and not os.path.exists(f"{part_path}.json")
+
+
+def test_commit_download_detects_unchanged_content(tmp_path):
+    target = tmp_path / "global.grib"
+    for contents, expected in [(b"GRIB1", True), (b"GRIB1", False), (b"GRIB2", True)]:
+        part_path = tmp_path / "global.grib.part"
+        part_path.write_bytes(contents)
+        assert _commit_download(str(part_path), str(target), {"step": 0}) == expected
+        assert target.read_bytes() == contents and not part_path.exists()
+    with open(f"{target}.meta.json") as f:
+        assert json.load(f)["size"] == 5
+
+
+def test_scheduler_windows_and_backoff():
+    scheduler = PublicationScheduler({"ECMWF": PUBLICATION_WINDOWS["ECMWF"]})
+    ecmwf = scheduler.sources["ECMWF"]
+    cycle = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    now = datetime(2026, 1, 1, 18, tzinfo=timezone.utc)
+
+    # Inside the 12 UTC window: the interval doubles up to its maximum
+    waits = []
+    for _ in range(6):
+        scheduler.record({"ECMWF": None}, now)
+        waits.append(scheduler.next_poll() - now)
+        now = scheduler.next_poll()
+    assert waits == [timedelta(minutes=m) for m in [2, 4, 8, 16, 20, 20]]
+
+    # A poll before this source is due leaves its backoff alone
+    next_poll, interval = ecmwf.next_poll, ecmwf.interval
+    scheduler.record({"ECMWF": None}, now - timedelta(minutes=1))
+    assert (ecmwf.next_poll, ecmwf.interval) == (next_poll, interval)
+
+    # Past the end of the window (21 UTC) polls stay at the slowest rate
+    late = datetime(2026, 1, 1, 21, 30, tzinfo=timezone.utc)
+    scheduler.record({"ECMWF": None}, late)
+    assert scheduler.next_poll() == late + MAX_POLL_INTERVAL
+
+    # Once the cycle is seen, the next poll opens the 18 UTC cycle's window
+    scheduler.record({"ECMWF": cycle}, late + MAX_POLL_INTERVAL)
+    assert ecmwf.last_cycle == cycle and ecmwf.interval == MIN_POLL_INTERVAL
+    assert scheduler.next_poll() == datetime(2026, 1, 1, 23, tzinfo=timezone.utc)
+
+    # FMI publishes sooner, so its window of the 18 UTC cycle opens at 20 UTC
+    fmi = PublicationScheduler()
+    fmi.record({"FMI": cycle}, datetime(2026, 1, 1, 16, tzinfo=timezone.utc))
+    assert fmi.sources["FMI"].next_poll == datetime(
+        2026, 1, 1, 20, tzinfo=timezone.utc
+    )
+
+
+def test_deaccumulate():
+    accumulated = np.array([[1.0, 0.0], [3.0, 0.5], [2.9999, 2.5]], dtype=np.float32)
+    expected = np.array([[1.0, 0.0], [2.0, 0.5], [0.0, 2.0]], dtype=np.float32)
+    # The first step keeps its total and a packing dip is clipped, not negative
+    np.testing.assert_allclose(deaccumulate(accumulated), expected)
+    lazy = deaccumulate(da.from_array(accumulated, chunks=(1, 2)))
+    assert isinstance(lazy, da.Array)
+    np.testing.assert_allclose(lazy.compute(), expected)
+
+
+def test_region_crop_slices():
+    ds = xr.Dataset(
+        coords={
+            "latitude": np.arange(90.0, -91.0, -1.0),
+            "longitude": np.arange(0.0, 360.0, 1.0),
+        }
+    )
+    region = Region("Scandinavia", REGIONAL_SOURCE, SCANDINAVIA_BBOX)
+    lat_slice, lon_slice = crop_slices(region, ds)
+    crop = region_dataset(region, ds)
+    # The box plus one cell on each side, in the grid's own (descending) order
+    assert (float(crop["latitude"][0]), float(crop["latitude"][-1])) == (73.0, 53.0)
+    assert (float(crop["longitude"][0]), float(crop["longitude"][-1])) == (4.0, 32.0)
+    assert crop_slices(region, ds) == (lat_slice, lon_slice)
+
+    # The margin stops at the edge of the grid
+    polar = Region("Arctic", REGIONAL_SOURCE, (0.0, 10.0, 85.0, 90.0))
+    lat_slice, lon_slice = crop_slices(polar, ds)
+    assert (lat_slice, lon_slice) == (slice(0, 7), slice(0, 12))
+    # Whole-field regions are not cropped
+    assert region_dataset(Region("Global", GLOBAL_SOURCE), ds) is ds
+
+
+def convert_run_stores(directory, label, n_steps=3):
+    """Write a tiny converted run with steps every 6 hours and return its stores."""
+    run_time = np.datetime64(datetime.strptime(label, "%Y%m%d%H"), "ns")
+    steps = np.arange(n_steps) * np.timedelta64(6, "h")
+    ds = xr.Dataset(
+        {"t2m": ("step", np.zeros(n_steps, dtype=np.float32))},
+        coords={
+            "time": run_time,
+            "step": steps,
+            "valid_time": ("step", run_time + steps),
+        },
+    )
+    stores = []
+    for name in ["forecast_global.zarr", "forecast_scandinavia.zarr"]:
+        path = directory / label / name
+        ds.to_zarr(path, consolidated=True)
+        stores.append(str(path))
+    return stores
+
+
+def test_archive_index_and_eviction(tmp_path, monkeypatch):
+    archive = RunArchive(str(tmp_path / "archive"))
+    labels = ["2026010100", "2026010106", "2026010112", "2026010118"]
+    for label in labels:
+        archive.add(label, *convert_run_stores(tmp_path / "stores", label))
+    assert archive.labels() == labels[::-1]
+
+    # Three runs forecast 12 UTC, found from the index alone
+    noon = datetime(2026, 1, 1, 12)
+    fields = archive.runs_for_valid_time(noon, GLOBAL_SOURCE)
+    assert [(f.label, f.step) for f in fields] == [
+        ("2026010112", 0),
+        ("2026010106", 1),
+        ("2026010100", 2),
+    ]
+    assert archive.lookup(GLOBAL_SOURCE, datetime(2026, 1, 1, 6), noon) == fields[1]
+
+    # Reading a run only rewrites the index once the access interval has passed
+    index_path = tmp_path / "archive" / "index.json"
+    saved = index_path.read_text()
+    oldest = archive.get("2026010100")
+    assert index_path.read_text() == saved
+    monkeypatch.setattr(archive_module, "ACCESS_SAVE_SECONDS", 0.0)
+    archive.get("2026010100")
+    assert index_path.read_text() != saved
+
+    # Over budget, the least recently used run goes, never the two newest
+    archive.budget_bytes = archive.total_bytes() - 1
+    assert archive.evict() == ["2026010106"]
+    assert not (tmp_path / "archive" / "2026010106.v1").exists()
+
+    # An evicted run stays on disk until its last handle is released
+    archive.max_age = timedelta(hours=12)
+    assert archive.evict(now=datetime(2026, 1, 2)) == ["2026010100"]
+    assert os.path.isdir(oldest.global_store)
+    del oldest
+    gc.collect()
+    assert archive.evict() == []
+    assert not (tmp_path / "archive" / "2026010100.v1").exists()
+    assert archive.labels() == labels[:1:-1]
+
+
+def test_archive_versions_and_read_only(tmp_path):
+    root = tmp_path / "archive"
+    writer = RunArchive(str(root))
+    reader = RunArchive(str(root), read_only=True)
+    label = "2026010112"
+
+    first = writer.add(label, *convert_run_stores(tmp_path / "v1", label))
+    second = writer.add(label, *convert_run_stores(tmp_path / "v2", label))
+    assert first.global_store != second.global_store
+    assert writer.is_current(second) and not writer.is_current(first)
+    # The previous version stays for readers that opened it before the swap
+    assert os.path.isdir(first.global_store)
+
+    # The version before the previous one goes once no handle refers to it
+    third = writer.add(label, *convert_run_stores(tmp_path / "v3", label))
+    assert os.path.isdir(first.global_store) and os.path.isdir(second.global_store)
+    first_store = first.global_store
+    del first
+    gc.collect()
+    writer.evict()
+    assert not os.path.exists(first_store) and os.path.isdir(second.global_store)
+
+    # Another process sees the new version once it refreshes, and writes nothing
+    assert reader.refresh()
+    assert reader.get(label) == third
+    with pytest.raises(RuntimeError):
+        reader.add(label, *convert_run_stores(tmp_path / "v4", label))
+    reader.budget_bytes = 0
+    assert reader.evict() == []
+    assert not reader.refresh()
+
+    # What an interrupted add leaves behind is removed by the next writer only
+    (root / f"{label}.v4.tmp").mkdir()
+    RunArchive(str(root), read_only=True)
+    assert (root / f"{label}.v4.tmp").exists()
+    RunArchive(str(root))
+    assert not (root / f"{label}.v4.tmp").exists()
+    assert os.path.isdir(third.global_store)
+
+
+def test_tile_coordinates():
+    latitudes, longitudes = tile_coordinates(0, 0, 0)
+    assert latitudes.shape == longitudes.shape == (TILE_SIZE,)
+    # Pixel centres, north to south and west to east, within Web Mercator's limits
+    half_pixel = 180.0 / TILE_SIZE
+    np.testing.assert_allclose(
+        longitudes[[0, -1]], [-180 + half_pixel, 180 - half_pixel]
+    )
+    np.testing.assert_allclose(latitudes, -latitudes[::-1], atol=1e-9)
+    assert 84.9 < latitudes[0] < 85.06
+    assert np.all(np.diff(latitudes) < 0)
+
+    # The north-east quarter at zoom 1 meets the equator and the meridian
+    latitudes, longitudes = tile_coordinates(1, 1, 0)
+    assert 0 < longitudes[0] < 1 and 179 < longitudes[-1] < 180
+    assert 0 < latitudes[-1] < 1 and 84.9 < latitudes[0] < 85.06
+
+
+def test_tile_server_etags(tmp_path):
+    label = "2026010112"
+    archive = RunArchive(str(tmp_path / "archive"))
+    run = archive.add(label, *convert_run_stores(tmp_path / "stores", label))
+    server = TileServer(archive, str(tmp_path / "tiles"), processes=1)
+    server.start("127.0.0.1", 0)
+    port = server._server.server_port
+
+    def get(path, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response
+
+    try:
+        layer = layers()[0]
+        etag = f'"{run_key(run)}"'
+        assert etag == '"2026010112.v1"'
+        # A viewer holding the tile of this run version renders nothing again
+        response = get(f"/tiles/{label}/{layer}/0/0/0/0.png", {"If-None-Match": etag})
+        assert response.status == 304
+        assert response.getheader("ETag") == etag
+        assert response.getheader("Cache-Control") == "public, max-age=86400"
+        assert get(f"/tiles/{label}/{layer}/0/1/2/0.png").status == 404
+        assert get(f"/tiles/{label}/{layer}/3/0/0/0.png").status == 404
+        assert get(f"/tiles/2026010100/{layer}/0/0/0/0.png").status == 404
+        assert get("/runs.json").status == 200
+    finally:
+        server.close()
+
+
+def test_pack_unpack_error_bounds():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(220.0, 320.0, (50, 60)).astype(np.float32)
+    values[3, 4] = np.nan
+
+    packed = pack(values, INT16, precision=0.01)
+    assert packed.data.dtype == np.int16 and packed.missing
+    assert packed.data[3, 4] == INT16_MISSING
+    unpacked = packed.unpack()
+    assert unpacked.dtype == np.float32 and not unpacked.flags.writeable
+    assert np.isnan(unpacked[3, 4]) and np.isnan(unpacked).sum() == 1
+    # Half of one of the INT16_STEPS intervals over the range, plus float32 rounding
+    assert np.nanmax(np.abs(unpacked - values)) <= packed.scale / 2 + 1e-4
+    assert packed.scale / 2 <= 0.01
+
+    # A range too wide for the precision is kept as it is
+    assert pack(values, INT16, precision=1e-4) is None
+    # float16 errs relative to the value, so only small fields pass
+    fractions = rng.uniform(0.0, 1.0, (50, 60))
+    packed = pack(fractions, FLOAT16, precision=1e-3)
+    assert packed.data.dtype == np.float16 and packed.unpack().dtype == np.float64
+    assert np.max(np.abs(packed.unpack() - fractions)) <= FLOAT16_ERROR
+    assert pack(values, FLOAT16, precision=0.01) is None
+
+    # Constant, all-missing and integer fields
+    constant = pack(np.full(4, 5.0), INT16, precision=0.01)
+    np.testing.assert_array_equal(constant.unpack(), np.full(4, 5.0))
+    assert pack(np.full(4, np.nan), INT16, precision=0.01) is None
+    assert pack(np.arange(4), INT16, precision=0.01) is None
+    with pytest.raises(ValueError):
+        pack(values, "int8", precision=0.01)
@@ -0,0 +1,507 @@
+"""
+Module for serving forecast maps as XYZ map tiles over HTTP, for many viewers at once.
+
+Tiles are 256 px Web Mercator PNGs addressed by run, layer, step and z/x/y; every parameter
+of the catalog is a layer named by its key, drawn with the colormap and limits of its panels
+(vector parameters by their speed). The FMI field is drawn where it covers a tile
+and the global ECMWF field everywhere else. Tiles are rendered on demand in a process pool and
+cached on disk per archived run version, so every tile of a run is drawn once however many
+viewers ask for it; concurrent requests for a tile that is still being drawn wait for the same
+render. When a run arrives, its low zoom levels are rendered ahead of the first viewer.
+
+    GET /runs.json                                   runs, layers and valid times
+    GET /tiles/<run>/<layer>/<step>/<z>/<x>/<y>.png  run is a label (YYYYMMDDHH) or "latest"
+"""
+
+import http.server
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+import dask
+import numpy as np
+import xarray as xr
+from matplotlib import colormaps
+from matplotlib.colors import Normalize
+from matplotlib.image import imsave
+from archive import RunArchive, RunStores
+from converting import open_store
+from derived import WIND_SPEED
+from loading import field_packing, resize_step_cache, set_field_packing, step_values
+from metrics import observe
+from parameters import (
+    VECTORS,
+    Parameter,
+    display_values,
+    get_parameter,
+    parameters,
+    set_parameters,
+)
+from points import grid_index
+from pyramid import pyramid_levels, select_level
+from regions import GLOBAL_SOURCE, REGIONAL_SOURCE
+
+# Constants
+TILE_CACHE_DIR = "tiles"
+TILE_SIZE = 256
+MAX_ZOOM = 12
+PREWARM_ZOOM = 2  # Zoom levels 0..2 are rendered when a run arrives
+LATEST = "latest"
+OPEN_STORES = 4  # Stores a worker keeps open: both sources of two runs
+WORKER_STEP_CACHE_BYTES = 128 * 1024 * 1024  # Resident steps per worker process
+RUN_CACHE_SECONDS = 24 * 3600  # Browser caching of tiles of a labelled run
+LATEST_CACHE_SECONDS = 60  # ... and of the moving "latest" run
+TILE_PATTERN = re.compile(r"^/tiles/(\w+)/(\w+)/(\d+)/(\d+)/(\d+)/(\d+)\.png$")
+
+
+# Stores opened by ``_open_store`` in a worker process with their valid times, least
+# recently used first
+_worker_datasets: "OrderedDict[str, Tuple[xr.Dataset, np.ndarray]]" = OrderedDict()
+
+
+def layers() -> List[str]:
+    """Return the tile layers: the keys of the catalog's parameters."""
+    return [param.key for param in parameters()]
+
+
+def run_key(run: RunStores) -> str:
+    """Return the name of a run's version, e.g. ``2026010112.v2``."""
+    return os.path.basename(os.path.dirname(os.path.abspath(run.global_store)))
+
+
+def tile_coordinates(z: int, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the latitude of every pixel row and longitude of every pixel column
+    of a Web Mercator tile, at the pixel centres.
+    """
+    n = 2**z
+    fraction = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    longitudes = (x + fraction) / n * 360.0 - 180.0
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + fraction) / n))))
+    return latitudes, longitudes
+
+
+# -------------------------------
+# Worker processes
+# -------------------------------
+
+
+def _init_worker(
+    step_cache_bytes: int, worker_parameters: List[Parameter], packing: bool
+) -> None:
+    """Set up a tile worker process with the parent's catalog and step packing."""
+    # One process per core already; keep dask from adding its own threads
+    dask.config.set(scheduler="synchronous")
+    resize_step_cache(step_cache_bytes)
+    set_parameters(worker_parameters)
+    if packing:
+        set_field_packing(True)
+
+
+def _open_store(store: str) -> Tuple[xr.Dataset, np.ndarray]:
+    """
+    Open a store and read its valid times once per worker, closing the least
+    recently used stores beyond a few.
+    """
+    opened = _worker_datasets.pop(store, None)
+    if opened is None:
+        ds = open_store(store)
+        opened = ds, ds["valid_time"].values
+    _worker_datasets[store] = opened
+    while len(_worker_datasets) > OPEN_STORES:
+        _worker_datasets.popitem(last=False)[1][0].close()
+    return opened
+
+
+def _tile_variables(param: Parameter, source: str, ds: xr.Dataset) -> List[str]:
+    """
+    Return the stored variables a tile of a parameter is drawn from: the
+    field itself, the stored wind speed, or both vector components.
+    """
+    fields = param.fields.get(source)
+    if not fields:
+        return []
+    variables = [field.variable for field in fields]
+    if param.kind == VECTORS and variables == ["u10", "v10"] and WIND_SPEED in ds:
+        variables = [WIND_SPEED]
+    return variables if all(name in ds for name in variables) else []
+
+
+def _tile_field(
+    store: str, param: Parameter, source: str, valid_time: np.datetime64, z: int
+) -> Optional[Tuple[xr.Dataset, List[str], int]]:
+    """
+    Return the pyramid level of a parameter to draw a tile of zoom ``z`` from,
+    the variables to read and the index of the step at ``valid_time``; None if
+    the source lacks either.
+    """
+    ds, valid_times = _open_store(store)
+    variables = _tile_variables(param, source, ds)
+    if not variables:
+        return None
+    steps = np.flatnonzero(valid_times == valid_time)
+    if not len(steps):
+        return None
+    levels = {
+        factor: level
+        for factor, level in pyramid_levels(ds).items()
+        if all(name in level for name in variables)
+    }
+    longitude = ds["longitude"].values
+    spacing = abs(float(longitude[1] - longitude[0])) if len(longitude) > 1 else 360.0
+    # Full resolution cells across the tile's width
+    factor = select_level(levels, 360.0 / 2**z / spacing, TILE_SIZE)
+    return levels[factor], variables, int(steps[0])
+
+
+def _render_tile(
+    run: RunStores,
+    layer: str,
+    valid_time: np.datetime64,
+    z: int,
+    x: int,
+    y: int,
+    path: str,
+) -> bytes:
+    """
+    Render one tile in a worker process and write it to the tile cache.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    latitudes, longitudes = tile_coordinates(z, x, y)
+    param = get_parameter(layer)
+    cmap, norm = colormaps[param.cmap], Normalize(*param.limits)
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    missing = np.ones((TILE_SIZE, TILE_SIZE), dtype=bool)
+    # The regional field on top, the global one around it
+    for source, store in (
+        (REGIONAL_SOURCE, run.scandinavia_store),
+        (GLOBAL_SOURCE, run.global_store),
+    ):
+        field = _tile_field(store, param, source, valid_time, z)
+        if field is None:
+            continue
+        level, variables, step = field
+        flat, inside = grid_index(level).locate_raster(latitudes, longitudes)
+        drawn = inside & missing
+        if not drawn.any():
+            continue
+        # One variable, or the two components of a vector field
+        components = [
+            step_values(level[name], step).ravel()[flat[drawn]] for name in variables
+        ]
+        values = components[0] if len(components) == 1 else np.hypot(*components)
+        rgba[drawn] = cmap(norm(display_values(param, values)), bytes=True)
+        missing &= ~inside
+
+    buffer = io.BytesIO()
+    imsave(buffer, rgba, format="png")
+    data = buffer.getvalue()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return data
+
+
+# -------------------------------
+# Server
+# -------------------------------
+
+
+class TileServer:
+    """
+    HTTP tile server over the runs of a run archive.
+
+    Requests are handled in threads; tiles missing from the disk cache are
+    rendered by a shared process pool.
+    """
+
+    def __init__(
+        self,
+        archive: RunArchive,
+        cache_dir: str = TILE_CACHE_DIR,
+        processes: Optional[int] = None,
+        prewarm_zoom: int = PREWARM_ZOOM,
+    ) -> None:
+        """
+        Args:
+            archive: Archive the served runs are taken from.
+            cache_dir: Directory of the tile cache.
+            processes: Tile rendering processes. Defaults to the number of CPUs.
+            prewarm_zoom: Zoom levels up to this are rendered when a run arrives.
+        """
+        self.archive = archive
+        self.cache_dir = cache_dir
+        self.processes = processes or os.cpu_count() or 1
+        self.prewarm_zoom = prewarm_zoom
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(WORKER_STEP_CACHE_BYTES, parameters(), field_packing()),
+        )
+        self._lock = threading.Lock()
+        self._latest: Optional[RunStores] = None
+        self._runs: Dict[str, RunStores] = {}
+        self._valid_times: Dict[str, np.ndarray] = {}
+        # Renders in progress, by tile path
+        self._pending: Dict[str, Future] = {}
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._closed = False
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # -------------------------------
+    # Runs
+    # -------------------------------
+
+    def set_run(self, run: RunStores) -> None:
+        """
+        Serve a run as the latest one and render its low zoom levels.
+
+        Tiles of runs that are no longer archived are removed from the cache.
+
+        Args:
+            run: Stores of the run, as returned by the archive.
+        """
+        with self._lock:
+            self._latest = run
+            self._runs[run.label] = run
+        self._remove_stale_tiles()
+        threading.Thread(
+            target=self._prewarm, args=(run,), name="tile-prewarm", daemon=True
+        ).start()
+
+    def _resolve(self, name: str) -> Optional[RunStores]:
+        """Return the run a request names, or None if it is not available."""
+        if name == LATEST:
+            return self._latest
+        with self._lock:
+            run = self._runs.get(name)
+        if run is not None and self.archive.is_current(run):
+            return run
+        if name not in self.archive:
+            # Dropping the handle lets the archive remove the evicted run
+            with self._lock:
+                self._runs.pop(name, None)
+            return None
+        run = self.archive.get(name)
+        with self._lock:
+            self._runs[name] = run
+        return run
+
+    def valid_times(self, run: RunStores) -> np.ndarray:
+        """Return the valid times of a run's steps, i.e. of its global field."""
+        key = run_key(run)
+        values = self._valid_times.get(key)
+        if values is None:
+            with open_store(run.global_store) as ds:
+                values = ds["valid_time"].values
+            self._valid_times[key] = values
+        return values
+
+    def _remove_stale_tiles(self) -> None:
+        """Remove the cached tiles of run versions that left the archive."""
+        for name in os.listdir(self.cache_dir):
+            if not os.path.isdir(os.path.join(self.archive.root, name)):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                self._valid_times.pop(name, None)
+
+    # -------------------------------
+    # Tiles
+    # -------------------------------
+
+    def _tile_path(
+        self, run: RunStores, layer: str, step: int, z: int, x: int, y: int
+    ) -> str:
+        return os.path.join(
+            self.cache_dir, run_key(run), layer, str(step), str(z), str(x), f"{y}.png"
+        )
+
+    def _render(
+        self, run: RunStores, layer: str, step: int, z: int, x: int, y: int
+    ) -> Future:
+        """Start rendering a tile, or join the render already in progress."""
+        path = self._tile_path(run, layer, step, z, x, y)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                valid_time = self.valid_times(run)[step]
+                future = self._pool.submit(
+                    _render_tile, run, layer, valid_time, z, x, y, path
+                )
+                self._pending[path] = future
+                future.add_done_callback(lambda _: self._pending.pop(path, None))
+        return future
+
+    def tile(
+        self, run: RunStores, layer: str, step: int, z: int, x: int, y: int
+    ) -> bytes:
+        """
+        Return a tile as PNG, from the disk cache or freshly rendered.
+
+        Args:
+            run: Run to draw.
+            layer: Name of the layer, see ``layers``.
+            step: Step index of the run.
+            z: Zoom level.
+            x: Tile column.
+            y: Tile row, counted from the north.
+        """
+        start = time.perf_counter()
+        try:
+            with open(self._tile_path(run, layer, step, z, x, y), "rb") as f:
+                data = f.read()
+            cache = "hit"
+        except FileNotFoundError:
+            data = self._render(run, layer, step, z, x, y).result()
+            cache = "miss"
+        observe("tile_seconds", time.perf_counter() - start, cache=cache)
+        return data
+
+    def _prewarm(self, run: RunStores) -> None:
+        """Render the low zoom tiles of a run unless a newer run replaces it."""
+        start = time.perf_counter()
+        tiles = [
+            (layer, step, z, x, y)
+            for z in range(self.prewarm_zoom + 1)
+            for step in range(len(self.valid_times(run)))
+            for layer in layers()
+            for x in range(2**z)
+            for y in range(2**z)
+        ]
+        # In batches, so that viewers' requests are not queued behind all of them
+        for i in range(0, len(tiles), self.processes):
+            if self._closed or self._latest is not run:
+                return
+            wait(
+                [
+                    self._render(run, *tile)
+                    for tile in tiles[i : i + self.processes]
+                    if not os.path.exists(self._tile_path(run, *tile))
+                ]
+            )
+        logging.info(
+            f"Prewarmed {len(tiles)} tiles of run {run.label} "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+
+    # -------------------------------
+    # HTTP
+    # -------------------------------
+
+    def runs_document(self) -> Dict[str, Any]:
+        """Return the description of the served runs and layers."""
+        latest = self._latest
+        return {
+            "latest": latest.label if latest else None,
+            "runs": self.archive.labels(),
+            "layers": layers(),
+            "valid_times": [
+                str(np.datetime_as_string(value, unit="s"))
+                for value in (self.valid_times(latest) if latest else [])
+            ],
+            "max_zoom": MAX_ZOOM,
+            "tile_url": "/tiles/{run}/{layer}/{step}/{z}/{x}/{y}.png",
+        }
+
+    def start(self, host: str, port: int) -> None:
+        """Start serving in a background thread."""
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), _tile_handler(self)
+        )
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="tile-server", daemon=True
+        ).start()
+        logging.info(f"Serving map tiles on http://{host}:{self._server.server_port}/")
+
+    def close(self) -> None:
+        """Stop serving and shut the render processes down."""
+        self._closed = True
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _tile_handler(server: TileServer) -> type:
+    """Build the request handler of a tile server."""
+
+    class TileHandler(http.server.BaseHTTPRequestHandler):
+        # Keep-alive, so a viewer fetches all its tiles over a few connections
+        protocol_version = "HTTP/1.1"
+
+        def _send(
+            self,
+            status: int,
+            body: bytes = b"",
+            content_type: str = "text/plain",
+            headers: Optional[Dict[str, str]] = None,
+        ) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            try:
+                self._get()
+            except (BrokenPipeError, ConnectionResetError):
+                # Viewers cancel the tiles they panned away from
+                pass
+
+        def _get(self) -> None:
+            path = self.path.split("?", 1)[0]
+            if path == "/runs.json":
+                body = json.dumps(server.runs_document()).encode()
+                self._send(200, body, "application/json")
+                return
+            match = TILE_PATTERN.match(path)
+            if match is None:
+                self._send(404, b"Not found")
+                return
+            run_name, layer = match.group(1), match.group(2)
+            step, z, x, y = (int(value) for value in match.groups()[2:])
+            run = server._resolve(run_name)
+            if (
+                run is None
+                or layer not in layers()
+                or not 0 <= step < len(server.valid_times(run))
+                or not (z <= MAX_ZOOM and x < 2**z and y < 2**z)
+            ):
+                self._send(404, b"No such tile")
+                return
+            etag = f'"{run_key(run)}"'
+            max_age = LATEST_CACHE_SECONDS if run_name == LATEST else RUN_CACHE_SECONDS
+            headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers=headers)
+                return
+            try:
+                body = server.tile(run, layer, step, z, x, y)
+            except Exception as exc:
+                logging.error(f"Failed to render tile {path}: {exc}")
+                self._send(500, b"Tile rendering failed")
+                return
+            self._send(200, body, "image/png", headers)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    return TileHandler